@@ -0,0 +1,300 @@
+"""
+admission.py — PharmaGuard
+Admission control and backpressure for CPU-heavy endpoints.
+
+At most `max_concurrent` heavy requests run at once per worker process;
+up to `max_queue` more wait for a slot for at most `queue_timeout`
+seconds. Anything beyond that is turned away immediately:
+
+    429  queue full — the caller should back off
+    503  waited queue_timeout without getting a slot
+
+Both carry a Retry-After header estimated from recent service times.
+Lightweight endpoints are not wrapped and never wait behind heavy work.
+Admission runs before the request body is read, so rejected uploads are
+never parsed.
+
+The limit is per process: with gunicorn, workers × threads bounds total
+concurrency and this caps how many of those threads may be busy parsing.
+In the Flask app a queued request holds a server thread while it waits,
+so a queue as deep as the thread pool would starve the light endpoints
+(/api/health, /api/drugs) it exists to protect. The sync controller
+therefore fails fast by default (no queue: 429 as soon as every slot is
+busy). Keep slots + PHARMAGUARD_HEAVY_SYNC_QUEUE below the server's
+thread count if you raise it. The ASGI app queues on the event loop,
+where a waiter costs no thread, and uses PHARMAGUARD_HEAVY_QUEUE.
+
+Upload-session creation (POST /api/uploads) is cheap but allocates a
+spool directory and parser state, so it is rate-limited per process by a
+token bucket (RateLimiter): 429 with Retry-After beyond the rate.
+
+Environment:
+    PHARMAGUARD_HEAVY_CONCURRENCY    slots per process (default: CPU count)
+    PHARMAGUARD_HEAVY_QUEUE          waiting requests per process, ASGI app
+                                     (default: 2 × slots)
+    PHARMAGUARD_HEAVY_SYNC_QUEUE     waiting requests per process, Flask app
+                                     (default: 0 — fail fast)
+    PHARMAGUARD_HEAVY_QUEUE_TIMEOUT  seconds a request may wait (default: 10)
+    PHARMAGUARD_UPLOAD_SESSION_RATE  upload sessions created per second per
+                                     process (default: 5; 0 = unlimited)
+    PHARMAGUARD_UPLOAD_SESSION_BURST sessions that may be created at once
+                                     beyond the rate (default: 20)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+HEAVY_CONCURRENCY   = int(os.environ.get("PHARMAGUARD_HEAVY_CONCURRENCY", os.cpu_count() or 2))
+HEAVY_QUEUE         = int(os.environ.get("PHARMAGUARD_HEAVY_QUEUE", 2 * HEAVY_CONCURRENCY))
+HEAVY_SYNC_QUEUE    = int(os.environ.get("PHARMAGUARD_HEAVY_SYNC_QUEUE", 0))
+HEAVY_QUEUE_TIMEOUT = float(os.environ.get("PHARMAGUARD_HEAVY_QUEUE_TIMEOUT", "10"))
+SESSION_RATE        = float(os.environ.get("PHARMAGUARD_UPLOAD_SESSION_RATE", 5))
+SESSION_BURST       = int(os.environ.get("PHARMAGUARD_UPLOAD_SESSION_BURST", 20))
+
+_WAIT_SAMPLES = 1000
+
+
+class AdmissionController:
+    """Counting semaphore with a bounded wait queue and metrics."""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name           = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue      = max(0, max_queue)
+        self.queue_timeout  = queue_timeout
+
+        self._cond   = threading.Condition()
+        self.active  = 0
+        self.waiting = 0
+
+        self.admitted         = 0
+        self.rejected_full    = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth  = 0
+        self._waits           = deque(maxlen=_WAIT_SAMPLES)
+        self._service_ewma    = 1.0
+
+    # ── slot management ───────────────────────
+    def acquire(self) -> tuple:
+        """Return (admitted, reason, waited_seconds); reason is None, 'queue_full' or 'timeout'."""
+        start = time.monotonic()
+        with self._cond:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active   += 1
+                self.admitted += 1
+                self._waits.append(0.0)
+                return True, None, 0.0
+
+            if self.waiting >= self.max_queue:
+                self.rejected_full += 1
+                return False, "queue_full", 0.0
+
+            self.waiting += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.waiting)
+            try:
+                got_slot = self._cond.wait_for(
+                    lambda: self.active < self.max_concurrent, timeout=self.queue_timeout
+                )
+            finally:
+                self.waiting -= 1
+
+            waited = time.monotonic() - start
+            if not got_slot:
+                self.rejected_timeout += 1
+                return False, "timeout", waited
+            self.active   += 1
+            self.admitted += 1
+            self._waits.append(waited)
+            return True, None, waited
+
+    def release(self, service_seconds: float) -> None:
+        with self._cond:
+            self.active -= 1
+            self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_seconds
+            self._cond.notify()
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for a request joining now."""
+        backlog = (self.waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(backlog * self._service_ewma))
+
+    # ── reporting ─────────────────────────────
+    def metrics(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "max_concurrent":      self.max_concurrent,
+                "max_queue":           self.max_queue,
+                "queue_timeout_s":     self.queue_timeout,
+                "active":              self.active,
+                "queue_depth":         self.waiting,
+                "max_queue_depth":     self.max_queue_depth,
+                "admitted":            self.admitted,
+                "rejected_queue_full": self.rejected_full,
+                "rejected_timeout":    self.rejected_timeout,
+                "wait_ms_avg":         round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                "wait_ms_p95":         round(1000 * waits[int(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+                "wait_ms_max":         round(1000 * waits[-1], 2) if waits else 0.0,
+                "service_ms_ewma":     round(1000 * self._service_ewma, 2),
+            }
+
+    def rejection(self, reason: str) -> tuple:
+        """(payload, status, headers) for a request that was not admitted."""
+        status  = 429 if reason == "queue_full" else 503
+        message = (
+            "Server is busy with other analyses. Please retry shortly."
+            if reason == "queue_full" else
+            "Timed out waiting for an analysis slot. Please retry shortly."
+        )
+        retry_after = self.retry_after()
+        return {"error": message, "retry_after": retry_after}, status, {"Retry-After": str(retry_after)}
+
+    # ── Flask integration ─────────────────────
+    def limit(self, view):
+        """Decorator: run `view` only when a slot is available."""
+        from flask import jsonify    # imported here so the ASGI app never loads Flask
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            admitted, reason, _ = self.acquire()
+            if not admitted:
+                payload, status, headers = self.rejection(reason)
+                response = jsonify(payload)
+                response.status_code = status
+                response.headers.update(headers)
+                return response
+            start = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                self.release(time.monotonic() - start)
+        return wrapper
+
+
+class AsyncAdmissionController(AdmissionController):
+    """
+    Event-loop flavour used by the ASGI app: waiters are futures rather
+    than blocked threads, and a released slot is handed directly to the
+    oldest waiter. Same limits, same metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._waiters = deque()
+
+    async def acquire(self) -> tuple:
+        loop  = asyncio.get_running_loop()
+        start = loop.time()
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active   += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return True, None, 0.0
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_full += 1
+            return False, "queue_full", 0.0
+
+        slot = loop.create_future()
+        self._waiters.append(slot)
+        self.waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.waiting)
+        try:
+            await asyncio.wait({slot}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            # Client went away while queued; pass on a slot we were already given.
+            if slot.done():
+                self._hand_over()
+            else:
+                slot.cancel()
+                self._waiters.remove(slot)
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = loop.time() - start
+        if not slot.done():
+            slot.cancel()
+            self._waiters.remove(slot)
+            self.rejected_timeout += 1
+            return False, "timeout", waited
+        # _hand_over() passed its slot to us, so `active` already includes this request
+        self.admitted += 1
+        self._waits.append(waited)
+        return True, None, waited
+
+    def release(self, service_seconds: float) -> None:
+        self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_seconds
+        self._hand_over()
+
+    def _hand_over(self) -> None:
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.active -= 1
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, name: str, rate: float, burst: int):
+        self.name     = name
+        self.rate     = rate
+        self.burst    = max(1, burst)
+        self.admitted = 0
+        self.rejected = 0
+        self._tokens  = float(self.burst)
+        self._stamp   = time.monotonic()
+        self._lock    = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a token if one is available; always True when the rate is 0 (unlimited)."""
+        with self._lock:
+            if self.rate > 0:
+                now          = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp  = now
+                if self._tokens < 1:
+                    self.rejected += 1
+                    return False
+                self._tokens -= 1
+            self.admitted += 1
+            return True
+
+    def rejection(self) -> tuple:
+        """(payload, status, headers) for a request over the rate."""
+        with self._lock:
+            retry_after = max(1, math.ceil((1 - self._tokens) / self.rate))
+        payload = {"error": "Too many requests. Please retry shortly.", "retry_after": retry_after}
+        return payload, 429, {"Retry-After": str(retry_after)}
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"rate_per_s": self.rate, "burst": self.burst,
+                    "admitted": self.admitted, "rejected": self.rejected}
+
+    def limit(self, view):
+        """Flask decorator: run `view` only while under the rate."""
+        from flask import jsonify
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.acquire():
+                payload, status, headers = self.rejection()
+                response = jsonify(payload)
+                response.status_code = status
+                response.headers.update(headers)
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+
+
+heavy          = AdmissionController("heavy", HEAVY_CONCURRENCY, HEAVY_SYNC_QUEUE, HEAVY_QUEUE_TIMEOUT)
+session_starts = RateLimiter("session_starts", SESSION_RATE, SESSION_BURST)
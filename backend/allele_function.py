@@ -0,0 +1,270 @@
+"""
+allele_function.py — PharmaGuard
+Allele-function tables and diplotype → phenotype calling.
+
+Each gene in the knowledge base's `allele_functions` section declares how
+its phenotype is derived, following CPIC:
+
+  activity_score  every allele has an activity value; the diplotype's
+                  phenotype comes from the summed score (CYP2D6, CYP2C9,
+                  DPYD). Copy-number suffixes multiply the value
+                  ("*2x2" → 2 × activity of *2, "xN" counts as 2 copies).
+  function        every allele has a function class (normal, decreased,
+                  no, increased); the phenotype comes from the unordered
+                  pair of classes (CYP2C19, SLCO1B1, TPMT).
+
+Allele definitions are given inline or in a TSV table next to the
+knowledge-base file (see `load_allele_table`, which also accepts CPIC
+allele-functionality exports). Tables with thousands of alleles cost one
+dict lookup per allele per call: the phenotype lookup tables are keyed by
+score or function-class pair, not by allele pair, so they are precomputed
+in full at load time and stay tiny.
+"""
+
+import bisect
+import csv
+import re
+from typing import NamedTuple
+
+# Canonical function classes and how far each is from normal; used to pick
+# the two most consequential alleles when more than two are observed.
+FUNCTION_SEVERITY = {
+    "no":        5,
+    "increased": 4,
+    "decreased": 3,
+    "uncertain": 2,
+    "normal":    1,
+}
+
+_FUNCTION_ALIASES = {
+    "no function":                 "no",
+    "none":                        "no",
+    "decreased function":          "decreased",
+    "reduced":                     "decreased",
+    "reduced function":            "decreased",
+    "possible decreased function": "decreased",
+    "normal function":             "normal",
+    "increased function":          "increased",
+    "uncertain function":          "uncertain",
+    "unknown function":            "uncertain",
+}
+
+_COPY_SUFFIX = re.compile(r"^(?P<base>.+?)\s*[x×](?P<n>\d+|N)$", re.IGNORECASE)
+
+# Header aliases accepted by load_allele_table (lower-cased, first match wins)
+_ALLELE_COLUMNS   = ("allele", "allele/cdna/rsid", "star_allele")
+_ACTIVITY_COLUMNS = ("activity_value", "activity value", "activity value (optional)", "activity")
+_FUNCTION_COLUMNS = (
+    "function", "allele clinical functional status",
+    "allele clinical functional status (required)", "clinical function",
+)
+
+
+class DiplotypeCall(NamedTuple):
+    gene:           str
+    diplotype:      str
+    alleles:        tuple
+    activity_score: float | None
+    phenotype:      str
+
+
+def normalise_function(value: str) -> str:
+    v = (value or "").strip().lower()
+    v = _FUNCTION_ALIASES.get(v, v)
+    if v not in FUNCTION_SEVERITY:
+        raise ValueError(f"Unknown allele function {value!r}")
+    return v
+
+
+def split_copies(allele: str) -> tuple:
+    """'*2x2' → ('*2', 2); '*1xN' → ('*1', 2); '*4' → ('*4', 1)."""
+    m = _COPY_SUFFIX.match(allele)
+    if not m:
+        return allele, 1
+    n = m.group("n")
+    return m.group("base"), 2 if n.upper() == "N" else max(int(n), 1)
+
+
+def load_allele_table(path: str) -> dict:
+    """
+    Read a tab- or comma-separated allele table into
+    {allele: {"function": str, "activity": float | None}}.
+
+    Accepts the simple `allele / activity_value / function` layout used in
+    knowledge_base/alleles/ as well as CPIC allele-functionality exports.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        sample  = f.read(4096)
+        f.seek(0)
+        dialect = csv.excel_tab if "\t" in sample else csv.excel
+        rows    = [r for r in f if r.strip() and not r.startswith("#")]
+    reader = csv.DictReader(rows, dialect=dialect)
+    header = {h.strip().lower(): h for h in reader.fieldnames or []}
+
+    def column(options):
+        return next((header[o] for o in options if o in header), None)
+
+    allele_col   = column(_ALLELE_COLUMNS)
+    activity_col = column(_ACTIVITY_COLUMNS)
+    function_col = column(_FUNCTION_COLUMNS)
+    if allele_col is None or function_col is None:
+        raise ValueError(f"{path}: allele table needs allele and function columns")
+
+    alleles = {}
+    for row in reader:
+        name = (row.get(allele_col) or "").strip()
+        if not name:
+            continue
+        raw_activity = (row.get(activity_col) or "").strip() if activity_col else ""
+        try:
+            activity = float(raw_activity)
+        except ValueError:
+            activity = None
+        alleles[name] = {"function": row[function_col], "activity": activity}
+    return alleles
+
+
+# ──────────────────────────────────────────────
+# Per-gene table
+# ──────────────────────────────────────────────
+class GeneAlleleTable:
+    """Compiled allele definitions and phenotype lookup for one gene."""
+
+    def __init__(self, gene: str, spec: dict, alleles: dict):
+        self.gene      = gene
+        self.method    = spec.get("method", "function")
+        self.reference = spec.get("reference", "*1")
+
+        self.function = {}
+        self.activity = {}
+        for name, d in alleles.items():
+            name = name.strip()
+            self.function[name] = normalise_function(d["function"])
+            if d.get("activity") is not None:
+                self.activity[name] = float(d["activity"])
+        if self.reference not in self.function:
+            raise ValueError(f"{gene}: reference allele {self.reference} is not defined")
+
+        if self.method == "activity_score":
+            missing = [a for a in self.function if a not in self.activity]
+            if missing:
+                raise ValueError(f"{gene}: alleles without activity value: {', '.join(missing[:5])}")
+            bands = sorted(
+                (float(lo), float("inf") if hi is None else float(hi), pheno)
+                for lo, hi, pheno in spec["activity_phenotypes"]
+            )
+            self._band_lows = [b[0] for b in bands]
+            self._bands     = bands
+            values = set(self.activity.values())
+            # every achievable two-allele score, precomputed
+            self._score_table = {
+                round(a + b, 4): self._band(a + b) for a in values for b in values
+            }
+        elif self.method == "function":
+            self._pair_table = {}
+            for key, pheno in spec["function_phenotypes"].items():
+                a, b = (normalise_function(p) for p in key.split("/"))
+                self._pair_table[self._pair_key(a, b)] = pheno
+        else:
+            raise ValueError(f"{gene}: unknown phenotype method {self.method!r}")
+
+    def __len__(self) -> int:
+        return len(self.function)
+
+    def __contains__(self, allele: str) -> bool:
+        return split_copies(allele)[0] in self.function
+
+    @staticmethod
+    def _pair_key(a: str, b: str) -> tuple:
+        return (a, b) if a <= b else (b, a)
+
+    def _band(self, score: float) -> str | None:
+        i = bisect.bisect_right(self._band_lows, score + 1e-9) - 1
+        if i < 0:
+            return None
+        lo, hi, pheno = self._bands[i]
+        return pheno if score <= hi + 1e-9 else None
+
+    def allele_function(self, allele: str) -> str | None:
+        return self.function.get(split_copies(allele)[0])
+
+    def allele_activity(self, allele: str) -> float | None:
+        base, copies = split_copies(allele)
+        value = self.activity.get(base)
+        return None if value is None else value * copies
+
+    def call(self, allele_a: str, allele_b: str) -> DiplotypeCall | None:
+        """Phenotype for one diplotype, or None if either allele is undefined."""
+        fa, fb = self.allele_function(allele_a), self.allele_function(allele_b)
+        if fa is None or fb is None:
+            return None
+
+        score = None
+        if self.method == "activity_score":
+            score = round(self.allele_activity(allele_a) + self.allele_activity(allele_b), 4)
+            phenotype = self._score_table.get(score)
+            if phenotype is None:           # copy-number sums outside the precomputed set
+                phenotype = self._score_table[score] = self._band(score)
+        else:
+            phenotype = self._pair_table.get(self._pair_key(fa, fb))
+        if phenotype is None:
+            return None
+
+        return DiplotypeCall(
+            gene           = self.gene,
+            diplotype      = f"{allele_a}/{allele_b}",
+            alleles        = (allele_a, allele_b),
+            activity_score = score,
+            phenotype      = phenotype,
+        )
+
+
+# ──────────────────────────────────────────────
+# Engine over all genes
+# ──────────────────────────────────────────────
+class AlleleFunctionEngine:
+    """Diplotype calling for every gene with allele-function definitions."""
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+
+    def __contains__(self, gene: str) -> bool:
+        return gene in self.tables
+
+    def allele_count(self) -> int:
+        return sum(len(t) for t in self.tables.values())
+
+    def allele_phenotype(self, gene: str, allele: str, function_phenotypes: dict) -> str | None:
+        """Single-allele phenotype implied by the allele's function class."""
+        table = self.tables.get(gene)
+        if table is None:
+            return None
+        function = table.allele_function(allele)
+        return function_phenotypes.get(function) if function else None
+
+    def call(self, gene: str, variants: list) -> DiplotypeCall | None:
+        """
+        Call a diplotype from a gene's detected variants.
+
+        Each variant contributes `copies` alleles (default 1). When more
+        than two alleles are observed the two furthest from normal function
+        are kept; missing alleles are filled with the reference allele.
+        Returns None when the gene or any chosen allele is undefined, so the
+        caller can fall back to per-variant phenotypes.
+        """
+        table = self.tables.get(gene)
+        if table is None:
+            return None
+
+        observed = []
+        for v in variants:
+            observed.extend([v["allele"]] * max(int(v.get("copies", 1)), 1))
+        if any(a not in table for a in observed):
+            return None
+
+        observed.sort(
+            key=lambda a: (FUNCTION_SEVERITY[table.allele_function(a)], a),
+            reverse=True,
+        )
+        chosen = (observed + [table.reference, table.reference])[:2]
+        return table.call(chosen[0], chosen[1])
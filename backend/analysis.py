@@ -0,0 +1,641 @@
+"""
+analysis.py — PharmaGuard
+Analysis pipeline shared by every front end (Flask app, ASGI app, workers).
+
+Turns parsed variants into per-drug results: gene-level diplotype calls,
+risk, recommendation and explanation, plus the request-level summary and
+interaction warnings. Nothing here touches the web framework, so it can
+run in a worker process as well as inside a request.
+"""
+
+from datetime import datetime, timezone
+
+from risk_engine import evaluate_risk, recommendation
+from llm_explain import explain
+from knowledge_base import LiveTable, current as current_kb
+from allele_function import DiplotypeCall
+from vcf_parser import VCF_WINDOW_FILTER, parse_vcf
+from deadlines import DeadlineExceeded, PARTIAL_HEADERS
+from json_provider import static_text
+from shared_cache import file_hash as sha256_file, parse_digest
+
+PHENO_DISPLAY = {
+    "Poor_Metabolizer": "PM",
+    "Intermediate":     "IM",
+    "Normal":           "NM",
+    "Ultrarapid":       "URM",
+    "Rapid":            "RM",
+    "Reduced_Function": "RF",
+}
+
+# drug=ALL: the whole panel
+ALL_DRUGS = "ALL"
+
+# fields=: response sections a client can select (short name → payload key).
+# Per-drug sections first; risk_assessment is built either way (the summary
+# needs it) and dropped from the results when not selected.
+RESULT_FIELDS = {
+    "risk":           "risk_assessment",
+    "profile":        "pharmacogenomic_profile",
+    "variants":       "pharmacogenomic_profile",     # its detected_variants list
+    "recommendation": "clinical_recommendation",
+    "explanation":    "llm_generated_explanation",
+    "quality":        "quality_metrics",
+}
+PAYLOAD_FIELDS = {
+    "summary":        "summary",
+    "interactions":   "interaction_warnings",
+    "pharmacogenes":  "pharmacogenes",
+}
+
+PHENO_SEVERITY = {
+    "Poor_Metabolizer": 5,
+    "Ultrarapid":       4,
+    "Reduced_Function": 3,
+    "Intermediate":     2,
+    "Rapid":            2,
+    "Normal":           1,
+}
+
+# ──────────────────────────────────────────────
+# Knowledge-base views (data lives in knowledge_base/*.json)
+# ──────────────────────────────────────────────
+ALLELE_PHENOTYPE_MAP = LiveTable("allele_phenotypes")
+
+
+def infer_phenotype(gene: str, star_allele: str, kb=None) -> str:
+    return (kb or current_kb()).infer_phenotype(gene, star_allele)
+
+
+def build_diplotype(variants: list) -> str:
+    if not variants:
+        return "wt/wt"
+    sorted_v = sorted(
+        variants,
+        key=lambda v: PHENO_SEVERITY.get(v.get("phenotype", "Normal"), 1),
+        reverse=True,
+    )
+    alleles = [v["allele"] for v in sorted_v[:2]]
+    if len(alleles) == 1:
+        return f"{alleles[0]}/wt"
+    return f"{alleles[0]}/{alleles[1]}"
+
+
+def select_primary_variant(variants: list) -> dict | None:
+    if not variants:
+        return None
+    return max(
+        variants,
+        key=lambda v: PHENO_SEVERITY.get(v.get("phenotype", "Normal"), 1),
+    )
+
+
+def call_gene(gene: str, gene_variants: list, kb=None) -> DiplotypeCall:
+    """
+    Diplotype and gene-level phenotype for one gene.
+
+    Uses the knowledge base's allele-function tables (activity score or
+    function-pair lookup); genes or alleles without definitions fall back
+    to the two most severe variants and the worst single-allele phenotype.
+    """
+    kb   = kb or current_kb()
+    call = kb.allele_engine.call(gene, gene_variants)
+    if call is not None:
+        return call
+    diplotype = build_diplotype(gene_variants)
+    primary   = select_primary_variant(gene_variants)
+    return DiplotypeCall(
+        gene           = gene,
+        diplotype      = diplotype,
+        alleles        = tuple(diplotype.split("/")),
+        activity_score = None,
+        phenotype      = primary.get("phenotype", "Normal") if primary else "Normal",
+    )
+
+
+def call_genes(variants: list, kb=None) -> dict:
+    """{gene: DiplotypeCall} for every gene with at least one detected variant."""
+    by_gene = {}
+    for v in variants:
+        by_gene.setdefault(v["gene"], []).append(v)
+    return {gene: call_gene(gene, vs, kb) for gene, vs in by_gene.items()}
+
+
+class GeneCalls:
+    """
+    A patient's variants grouped by gene, with each gene's DiplotypeCall
+    made at most once and shared by every drug in the request.
+
+    Grouping is one pass over the variants; calls are made lazily, so
+    genes no requested drug (or interaction rule) needs are never called.
+    """
+
+    def __init__(self, variants: list, kb=None):
+        self.kb        = kb or current_kb()
+        self.variants  = variants
+        self.positions = {}           # gene → indexes into `variants`, in file order
+        self._calls    = {}
+        for i, v in enumerate(variants):
+            self.positions.setdefault(v["gene"], []).append(i)
+
+    def __contains__(self, gene: str) -> bool:
+        return gene in self.positions
+
+    def present(self, genes) -> list:
+        """The genes of `genes` with detected variants, in order of first detection."""
+        found = [g for g in dict.fromkeys(genes) if g in self.positions]
+        found.sort(key=lambda g: self.positions[g][0])
+        return found
+
+    def variants_for(self, genes) -> list:
+        """The variants of `genes`, in file order."""
+        found = self.present(genes)
+        if len(found) == 1:
+            return [self.variants[i] for i in self.positions[found[0]]]
+        return [self.variants[i] for i in sorted(i for g in found for i in self.positions[g])]
+
+    def count(self, genes) -> int:
+        """Number of variants detected in `genes`."""
+        return sum(len(self.positions.get(g, ())) for g in genes)
+
+    def call(self, gene: str) -> DiplotypeCall:
+        """call_gene() for `gene`, made once (wild-type when nothing was detected)."""
+        c = self._calls.get(gene)
+        if c is None:
+            c = self._calls[gene] = call_gene(gene, [self.variants[i] for i in self.positions.get(gene, ())],
+                                              self.kb)
+        return c
+
+    def calls_for(self, genes) -> dict:
+        """{gene: DiplotypeCall} for the genes of `genes` with detected variants."""
+        return {g: self.call(g) for g in self.present(genes)}
+
+    def phenotypes_for(self, genes) -> dict:
+        return {g: self.call(g).phenotype for g in genes if g in self.positions}
+
+
+def gene_phenotypes(variants: list, kb=None) -> dict:
+    """Gene-level phenotype for every gene with detected variants."""
+    return {gene: c.phenotype for gene, c in call_genes(variants, kb).items()}
+
+
+def check_interactions(drug_list: list, phenotypes: dict | None = None, kb=None) -> list:
+    return (kb or current_kb()).interactions.check(drug_list, phenotypes)
+
+
+def interaction_warnings(drug_list: list, genes: GeneCalls, kb=None) -> list:
+    """check_interactions() calling only the genes the matching rules mention."""
+    kb    = kb or current_kb()
+    index = kb.interactions
+    rule_genes = {index.rules[rule_id][0] for rule_id in index.match(drug_list)}
+    return index.check(drug_list, genes.phenotypes_for(rule_genes))
+
+
+def encode_static_blocks(results: list) -> list:
+    """Swap recommendation/explanation text for pre-encoded fragments (serialization only)."""
+    for r in results:
+        rec = r.get("clinical_recommendation")
+        if rec is not None:
+            rec["recommendation_text"] = static_text(rec["recommendation_text"])
+        expl = r.get("llm_generated_explanation")
+        if expl is not None:
+            expl["summary"] = static_text(expl["summary"])
+    return results
+
+
+# ──────────────────────────────────────────────
+# Response builder
+# ──────────────────────────────────────────────
+def build_response(drug: str, all_variants: list, patient_id: str, kb=None,
+                   genes: GeneCalls | None = None, fields: frozenset | None = None,
+                   deadline=None) -> dict:
+    """
+    Result for one drug. `genes` (a GeneCalls over `all_variants`) lets
+    several drugs share the gene-level calls; without it the drug's genes
+    are called here. `fields` (see parse_fields) limits the sections that
+    are built; risk_assessment is always built, the summary needs it.
+    If `deadline` (deadlines.py) has passed when the explanation is due,
+    the result is returned without it, marked partial.
+    """
+    kb             = kb or current_kb()
+    relevant_genes = kb.drug_gene_map.get(drug, ())
+    if genes is None:
+        genes = GeneCalls([v for v in all_variants if v["gene"] in relevant_genes], kb)
+    present        = genes.present(relevant_genes)
+    no_variants    = not present
+
+    def wanted(field: str) -> bool:
+        return fields is None or field in fields
+
+    # Gene-level calls drive the risk: one diplotype phenotype per gene
+    calls     = genes.calls_for(present)
+    risk_data = evaluate_risk(
+        [{"gene": g, "allele": c.diplotype, "phenotype": c.phenotype} for g, c in calls.items()],
+        drug, kb,
+    )
+
+    severity_map = {
+        "Toxic":         "high",
+        "Adjust Dosage": "moderate",
+        "Safe":          "none",
+        "Ineffective":   "moderate",
+    }
+
+    result = {
+        "patient_id": patient_id,
+        "drug":       drug,
+        "timestamp":  datetime.now(timezone.utc).isoformat(),
+        "knowledge_base_version": kb.version,
+        "no_variants_detected": no_variants,
+
+        "risk_assessment": {
+            "risk_label":       risk_data["risk"],
+            "confidence_score": risk_data["confidence"],
+            "severity":         severity_map.get(risk_data["risk"], "none"),
+        },
+    }
+
+    if wanted("profile") or wanted("variants") or wanted("explanation"):
+        if calls:
+            primary_gene = max(calls, key=lambda g: PHENO_SEVERITY.get(calls[g].phenotype, 1))
+        else:
+            primary_gene = relevant_genes[0] if relevant_genes else "Unknown"
+        call = genes.call(primary_gene)
+
+    if wanted("profile") or wanted("variants"):
+        profile = {}
+        if wanted("profile"):
+            profile.update(
+                primary_gene   = primary_gene,
+                diplotype      = call.diplotype,
+                activity_score = call.activity_score,
+                phenotype      = PHENO_DISPLAY.get(call.phenotype, "NM"),
+            )
+        if wanted("variants"):
+            profile["detected_variants"] = genes.variants_for(present)
+        result["pharmacogenomic_profile"] = profile
+
+    if wanted("recommendation"):
+        result["clinical_recommendation"] = {
+            "recommendation_text": recommendation(risk_data["risk"], kb),
+        }
+
+    status = "complete"
+    if wanted("explanation") and not no_variants and deadline is not None and deadline.expired():
+        status = "partial"
+        result["deadline_exceeded_at"] = "explanation"
+    elif wanted("explanation"):
+        if no_variants:
+            explanation = (
+                f"No pharmacogenomic variants relevant to {drug} were detected in this VCF file. "
+                f"Standard metabolic function is assumed for this patient. "
+                f"Standard dosing guidelines apply."
+            )
+        else:
+            explanation = explain(
+                gene      = primary_gene,
+                variant   = call.alleles[0] or "wt",
+                drug      = drug,
+                risk      = risk_data["risk"],
+                phenotype = call.phenotype,
+                kb        = kb,
+            )
+        result["llm_generated_explanation"] = {
+            "summary": explanation,
+        }
+
+    if wanted("quality"):
+        result["quality_metrics"] = {
+            "vcf_parsing_success":     True,
+            "relevant_variants_found": genes.count(present),
+        }
+
+    result["analysis_status"] = status
+    return result
+
+
+def partial_result(drug: str, patient_id: str, kb, step: str) -> dict:
+    """Entry for a drug the deadline left unevaluated (`step`: parse or analysis)."""
+    return {
+        "patient_id": patient_id,
+        "drug":       drug,
+        "timestamp":  datetime.now(timezone.utc).isoformat(),
+        "knowledge_base_version": kb.version,
+        "analysis_status":      "partial",
+        "deadline_exceeded_at": step,
+    }
+
+
+def is_complete(payload: dict) -> bool:
+    return all(r["analysis_status"] == "complete" for r in payload["results"])
+
+
+def response_headers(payload: dict) -> dict:
+    """Extra headers for an analysis response: partial ones must not be cached (deadlines.py)."""
+    return {} if is_complete(payload) else dict(PARTIAL_HEADERS)
+
+
+def select_fields(result: dict, fields: frozenset | None) -> dict:
+    """A full build_response() dict cut down to `fields` (risk_assessment kept, as there)."""
+    if fields is None:
+        return result
+    keep = {"patient_id", "drug", "timestamp", "knowledge_base_version", "no_variants_detected",
+            "risk_assessment", "analysis_status"}
+    keep.update(RESULT_FIELDS[f] for f in fields if f in RESULT_FIELDS)
+    out = {k: v for k, v in result.items() if k in keep}
+    if "pharmacogenomic_profile" in out and "profile" not in fields:
+        out["pharmacogenomic_profile"] = {"detected_variants": result["pharmacogenomic_profile"]["detected_variants"]}
+    elif "pharmacogenomic_profile" in out and "variants" not in fields:
+        out["pharmacogenomic_profile"] = {k: v for k, v in result["pharmacogenomic_profile"].items()
+                                          if k != "detected_variants"}
+    return out
+
+
+# ──────────────────────────────────────────────
+# Request-level pipeline
+# ──────────────────────────────────────────────
+def parse_drug_list(drug_input: str, kb=None) -> tuple:
+    """
+    Normalise a comma-separated drug field; ALL stands for every supported drug.
+
+    Returns (drugs, None) on success or (None, (error_payload, status)).
+    """
+    kb         = kb or current_kb()
+    drug_input = (drug_input or "").strip()
+    if not drug_input:
+        return None, ({"error": "Drug name is required."}, 400)
+    if drug_input.upper() == ALL_DRUGS:
+        return list(kb.supported_drugs), None
+
+    target_drugs = [d.strip().upper() for d in drug_input.split(",") if d.strip()]
+    if not target_drugs:
+        return None, ({"error": "No valid drug names provided."}, 400)
+
+    unsupported = [d for d in target_drugs if d not in kb.drug_gene_map]
+    if unsupported:
+        return None, ({
+            "error":           f"Unsupported drug(s): {', '.join(unsupported)}",
+            "supported_drugs": kb.supported_drugs,
+        }, 400)
+    return target_drugs, None
+
+
+def parse_fields(fields_input: str | None) -> tuple:
+    """
+    Normalise a comma-separated `fields=` value (short names or payload
+    keys, e.g. "risk,summary"). No value means every section.
+
+    Returns (fields, None) — a frozenset of short names, or None for all —
+    or (None, (error_payload, status)).
+    """
+    names = [f.strip().lower() for f in (fields_input or "").split(",") if f.strip()]
+    if not names:
+        return None, None
+    aliases = {"detected_variants": ["variants"]}
+    for name, key in {**RESULT_FIELDS, **PAYLOAD_FIELDS}.items():
+        aliases.setdefault(key, []).append(name)
+    fields  = set()
+    unknown = []
+    for name in names:
+        if name in RESULT_FIELDS or name in PAYLOAD_FIELDS:
+            fields.add(name)
+        elif name in aliases:
+            fields.update(aliases[name])
+        else:
+            unknown.append(name)
+    if unknown:
+        return None, ({
+            "error":            f"Unknown field(s): {', '.join(unknown)}",
+            "supported_fields": [*RESULT_FIELDS, *PAYLOAD_FIELDS],
+        }, 400)
+    return frozenset(fields), None
+
+
+def refresh_phenotypes(variants: list, kb=None) -> list:
+    """Stored variants with per-variant phenotypes re-derived under `kb`."""
+    kb = kb or current_kb()
+    return [{**v, "phenotype": kb.infer_phenotype(v["gene"], v["allele"])} for v in variants]
+
+
+def summarize(results: list, patient_id: str) -> dict:
+    # Drugs cut off by the deadline before evaluation have no risk_assessment
+    return {
+        "total_drugs_analysed": len(results),
+        "partial_count":        sum(1 for r in results if r["analysis_status"] != "complete"),
+        "high_risk_count":      sum(1 for r in results if _severity(r) == "high"),
+        "moderate_risk_count":  sum(1 for r in results if _severity(r) == "moderate"),
+        "safe_count":           sum(1 for r in results if _severity(r) == "none"),
+        "patient_id":           patient_id,
+        "drug_summary": [
+            {
+                "drug":       r["drug"],
+                "risk":       r.get("risk_assessment", {}).get("risk_label"),
+                "confidence": r.get("risk_assessment", {}).get("confidence_score"),
+                "severity":   _severity(r),
+            }
+            for r in results
+        ],
+    }
+
+
+def _severity(result: dict) -> str | None:
+    return result.get("risk_assessment", {}).get("severity")
+
+
+def gene_panel(genes: GeneCalls, target_drugs: list, kb) -> list:
+    """Gene-level section of a panel report: one entry per gene the drugs depend on."""
+    wanted = set(target_drugs)
+    panel  = []
+    for gene in dict.fromkeys(g for drug in target_drugs for g in kb.drug_gene_map[drug]):
+        call = genes.call(gene)
+        panel.append({
+            "gene":           gene,
+            "diplotype":      call.diplotype,
+            "activity_score": call.activity_score,
+            "phenotype":      PHENO_DISPLAY.get(call.phenotype, "NM"),
+            "variants_found": len(genes.positions.get(gene, ())),
+            "drugs":          [d for d in kb.gene_drugs.get(gene, ()) if d in wanted],
+        })
+    return panel
+
+
+def drug_results(all_variants: list, target_drugs: list, patient_id: str, kb,
+                 cache=None, file_hash: str | None = None, genes: GeneCalls | None = None,
+                 fields: frozenset | None = None, deadline=None) -> list:
+    """
+    build_response() for each drug, sharing one GeneCalls so each gene is
+    called once however many drugs depend on it. With a shared cache
+    (shared_cache.py) and the file's hash, drugs already evaluated for this
+    file under this knowledge-base version come from the cache and only the
+    rest are built. Only complete results are cached, so results built for
+    a `fields` subset or cut short by the deadline are not written back.
+    Once `deadline` has passed, drugs not yet built are returned as
+    partial entries.
+    """
+    genes   = genes or GeneCalls(all_variants, kb)
+    cached  = cache.get_results(file_hash, target_drugs, kb) if cache is not None and file_hash else {}
+    now     = datetime.now(timezone.utc).isoformat()
+    results = []
+    fresh   = []
+    for drug in target_drugs:
+        r = cached.get(drug)
+        if r is not None:
+            # Only complete results are cached; entries written before
+            # analysis_status existed lack it
+            r.update(patient_id=patient_id, timestamp=now)
+            r.setdefault("analysis_status", "complete")
+            r = select_fields(r, fields)
+        elif deadline is not None and deadline.expired():
+            r = partial_result(drug, patient_id, kb, "analysis")
+        else:
+            r = build_response(drug, all_variants, patient_id, kb, genes, fields, deadline)
+            fresh.append(r)
+        results.append(r)
+    if cache is not None and file_hash and fields is None:
+        cache.put_results(file_hash, complete_results(fresh), kb)
+    return results
+
+
+def complete_results(results: list) -> list:
+    return [r for r in results if r["analysis_status"] == "complete"]
+
+
+def analyze_variants(all_variants: list, target_drugs: list, patient_id: str, kb=None,
+                     cache=None, file_hash: str | None = None, panel: bool = False,
+                     fields: frozenset | None = None, deadline=None) -> dict:
+    """
+    Full /api/analyze payload for already-parsed variants. Gene calls are
+    made once per gene and shared by the drugs and the interaction check,
+    so the cost follows the genes involved, not the number of drugs.
+    `panel` adds the gene-level "pharmacogenes" section (/api/panel).
+    `fields` (see parse_fields) selects the sections; the others are
+    never computed. `deadline` (deadlines.py) bounds the per-drug work.
+    """
+    kb      = kb or current_kb()
+    genes   = GeneCalls(all_variants, kb)
+    results = drug_results(all_variants, target_drugs, patient_id, kb, cache, file_hash, genes, fields,
+                           deadline)
+
+    if fields is None:
+        # Always return consistent structure regardless of drug count
+        payload = {
+            "results":              results,
+            "summary":              summarize(results, patient_id),
+            "interaction_warnings": interaction_warnings(target_drugs, genes, kb),
+        }
+        if panel:
+            payload["pharmacogenes"] = gene_panel(genes, target_drugs, kb)
+        return payload
+
+    payload = {"results": results}
+    if "summary" in fields:
+        payload["summary"] = summarize(results, patient_id)
+    if "interactions" in fields:
+        payload["interaction_warnings"] = interaction_warnings(target_drugs, genes, kb)
+    if "pharmacogenes" in fields:
+        payload["pharmacogenes"] = gene_panel(genes, target_drugs, kb)
+    if "risk" not in fields:
+        for r in results:
+            r.pop("risk_assessment", None)
+    return payload
+
+
+def unparsed_payload(target_drugs: list, patient_id: str, kb, fields: frozenset | None = None,
+                     step: str = "parse") -> dict:
+    """Payload when the deadline passed before the variants were ready: every drug partial."""
+    results = [partial_result(drug, patient_id, kb, step) for drug in target_drugs]
+    payload = {"results": results}
+    if fields is None or "summary" in fields:
+        payload["summary"] = summarize(results, patient_id)
+    if fields is None or "interactions" in fields:
+        # The rules still apply; without genotypes there is no patient phenotype to report
+        payload["interaction_warnings"] = check_interactions(target_drugs, None, kb)
+    return payload
+
+
+def analyze_profile(profile: dict, target_drugs: list, kb=None, cache=None,
+                    fields: frozenset | None = None, deadline=None) -> dict:
+    """/api/analyze payload from a stored profile (profile_store.py) — no file, no parsing."""
+    kb       = kb or current_kb()
+    variants = profile["detected_variants"]
+    if profile["kb_version"] != kb.version:
+        variants = refresh_phenotypes(variants, kb)
+    return analyze_variants(variants, target_drugs, profile["patient_id"], kb, cache, profile["file_hash"],
+                            fields=fields, deadline=deadline)
+
+
+def analyze_parsed(variants: list, target_drugs: list, patient_id: str, kb=None,
+                   store=None, file_hash: str | None = None, cache=None,
+                   fields: frozenset | None = None, deadline=None, window_filter: bool = False) -> dict:
+    """
+    analyze_variants(), saving the profile and results to `store` and the
+    variants to `cache` under `file_hash` if given. Results built for a
+    `fields` subset, and partial results, are not stored. Variants from a
+    window-mode parse are cached apart and never stored (see analyze_file).
+    """
+    kb = kb or current_kb()
+    if window_filter:
+        store = None
+    key = parse_digest(file_hash, window_filter) if file_hash else file_hash
+    if cache is not None and key:
+        cache.put_variants(key, kb, variants)
+    payload = analyze_variants(variants, target_drugs, patient_id, kb, cache, key, fields=fields,
+                               deadline=deadline)
+    if store is not None:
+        genes = store.save(patient_id, file_hash, variants, kb)
+        if fields is None:
+            store.save_results(patient_id, file_hash, complete_results(payload["results"]), genes, kb)
+    return payload
+
+
+def analyze_file(filepath: str, target_drugs: list, patient_id: str, kb=None,
+                 window_filter: bool | None = None, store=None, cache=None, panel: bool = False,
+                 fields: frozenset | None = None, digest: str | None = None, deadline=None) -> dict:
+    """
+    Parse and analyze one VCF. With a profile store (profile_store.py) the
+    parsed variants and per-drug results are saved under (patient_id, file
+    hash), and an identical file already parsed under this knowledge-base
+    version is not parsed again. With a shared cache (shared_cache.py) the
+    same holds across patients, workers and nodes: variants and per-drug
+    results are looked up by file hash before anything is computed.
+    Results built for a `fields` subset, and partial results, are neither
+    stored nor cached. Window-mode parses (vcf_parser.py) skip records, so
+    they are never stored as the patient's profile and are cached apart
+    from full parses of the same file. `digest` is the file's
+    SHA-256 when the caller already has it. If `deadline` passes while the
+    file is being parsed, every drug comes back partial (see deadlines.py).
+    """
+    kb = kb or current_kb()
+    if window_filter is None:
+        window_filter = VCF_WINDOW_FILTER
+    if window_filter:
+        store = None
+    try:
+        if store is None and cache is None:
+            variants = parse_vcf(filepath, kb, window_filter, deadline=deadline)
+            return analyze_variants(variants, target_drugs, patient_id, kb, panel=panel, fields=fields,
+                                    deadline=deadline)
+
+        digest = digest or sha256_file(filepath)
+        key    = parse_digest(digest, window_filter)
+
+        def parse(path: str) -> list:
+            variants = cache.get_variants(key, kb) if cache is not None else None
+            if variants is None:
+                variants = parse_vcf(path, kb, window_filter, deadline=deadline)
+                if cache is not None:
+                    cache.put_variants(key, kb, variants)
+            return variants
+
+        if store is None:
+            return analyze_variants(parse(filepath), target_drugs, patient_id, kb, cache, key, panel, fields,
+                                    deadline)
+
+        _, genes, variants = store.load_or_parse(patient_id, filepath, kb, parse, digest)
+    except DeadlineExceeded as e:
+        return unparsed_payload(target_drugs, patient_id, kb, fields, e.step)
+
+    payload = analyze_variants(variants, target_drugs, patient_id, kb, cache, digest, panel, fields, deadline)
+    if fields is None:
+        store.save_results(patient_id, digest, complete_results(payload["results"]), genes, kb)
+    return payload
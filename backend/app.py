@@ -2,348 +2,89 @@ import os
 import uuid
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from datetime import datetime, timezone
-from risk_engine import evaluate_risk, recommendation
-from llm_explain import explain
-from drug_gene_map import DRUG_GENE_MAP
-from werkzeug.exceptions import HTTPException
+from knowledge_base import current as current_kb
+from vcf_parser import validate_vcf_content
+from analysis import (
+    encode_static_blocks, parse_drug_list, analyze_file, analyze_profile, parse_fields, response_headers,
+    ALL_DRUGS,
+)
+from deadlines import request_deadline
+from json_provider import FastJSONProvider
+from compression import choose_encoding, init_compression
+from profiling import PROFILE_HEADER, authorized, init_profiling, request_profiles
+from compact_output import compact_payload
+from upload_limits import LimitedRequest, UploadLimitExceeded
+from admission import heavy, session_starts
+from profile_store import PATIENT_TOKEN_HEADER, access_error, profiles
+from shared_cache import cache
+from conditional import (
+    ANALYSIS_CACHE_CONTROL, CATALOGUE_CACHE_CONTROL, analysis_etag, catalogue, match_etag,
+)
+from upload_sessions import UploadSessionError, UploadSessions
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
 app = Flask(__name__)
-CORS(app, origins="*")
+app.request_class = LimitedRequest
+app.json = FastJSONProvider(app)
+CORS(app, origins="*", expose_headers=["ETag"])
+init_profiling(app)        # before compression: see profiling.init_profiling
+init_compression(app)
 
 # ──────────────────────────────────────────────
 # Config
 # ──────────────────────────────────────────────
 UPLOAD_FOLDER  = "uploads"
 MAX_FILE_BYTES = 5 * 1024 * 1024
-app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_BYTES
+MAX_LINE_BYTES = int(os.environ.get("PHARMAGUARD_MAX_LINE_BYTES", 256 * 1024))
+app.config["MAX_CONTENT_LENGTH"]    = MAX_FILE_BYTES
+app.config["MAX_UPLOAD_FILE_BYTES"] = MAX_FILE_BYTES    # enforced while streaming, see upload_limits.py
+app.config["MAX_UPLOAD_LINE_BYTES"] = MAX_LINE_BYTES
+# werkzeug also applies this to its multipart read buffer, which can hold a
+# 64 KB read plus a partial line of file data — keep it well above that.
+app.config["MAX_FORM_MEMORY_SIZE"]  = 1024 * 1024
+app.config["MAX_FORM_PARTS"]        = 16
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-PHENO_DISPLAY = {
-    "Poor_Metabolizer": "PM",
-    "Intermediate":     "IM",
-    "Normal":           "NM",
-    "Ultrarapid":       "URM",
-    "Reduced_Function": "RF",
-}
-
-PHENO_SEVERITY = {
-    "Poor_Metabolizer": 5,
-    "Ultrarapid":       4,
-    "Reduced_Function": 3,
-    "Intermediate":     2,
-    "Normal":           1,
-}
 
 # ──────────────────────────────────────────────
-# Gene-drug interaction pairs
+# Conditional responses (see conditional.py)
 # ──────────────────────────────────────────────
-GENE_DRUG_INTERACTIONS = [
-    (
-        "CYP2D6", "CODEINE", "TRAMADOL",
-        "Both CODEINE and TRAMADOL are CYP2D6 substrates. "
-        "Co-administration amplifies risk in Poor and Ultrarapid metabolisers."
-    ),
-    (
-        "CYP2C19", "CLOPIDOGREL", "OMEPRAZOLE",
-        "OMEPRAZOLE inhibits CYP2C19, further reducing clopidogrel activation "
-        "and increasing cardiovascular risk."
-    ),
-    (
-        "CYP2C9", "WARFARIN", "FLUCONAZOLE",
-        "FLUCONAZOLE is a strong CYP2C9 inhibitor. Combined with warfarin it "
-        "significantly raises bleeding risk."
-    ),
-    (
-        "TPMT", "AZATHIOPRINE", "MERCAPTOPURINE",
-        "Both are TPMT substrates. Concurrent use multiplies myelosuppression risk."
-    ),
-]
-
-# ──────────────────────────────────────────────
-# Allele → Phenotype map
-# ──────────────────────────────────────────────
-ALLELE_PHENOTYPE_MAP = {
-    "CYP2D6": {
-        "*1": "Normal", "*2": "Normal", "*35": "Normal",
-        "*3": "Poor_Metabolizer", "*4": "Poor_Metabolizer",
-        "*5": "Poor_Metabolizer", "*6": "Poor_Metabolizer",
-        "*10": "Intermediate", "*17": "Intermediate",
-        "*41": "Reduced_Function",
-    },
-    "CYP2C19": {
-    "*1":  "Normal",
-    "*2":  "Poor_Metabolizer",
-    "*3":  "Poor_Metabolizer",
-    "*17": "Ultrarapid",
-    "*4":  "Poor_Metabolizer",   # add this
-    "*6":  "Poor_Metabolizer",   # add this
-    "*9":  "Intermediate",       # add this — *9 is intermediate, not normal
-    },
-    "CYP2C9": {
-        "*1": "Normal",
-        "*2": "Intermediate", "*3": "Poor_Metabolizer",
-    },
-    "SLCO1B1": {
-        "*1": "Normal", "*1A": "Normal", "*1B": "Normal",
-        "*5": "Poor_Metabolizer", "*15": "Intermediate",
-    },
-    "TPMT": {
-        "*1": "Normal",
-        "*2": "Poor_Metabolizer", "*3A": "Poor_Metabolizer",
-        "*3B": "Intermediate",   "*3C": "Intermediate",
-    },
-    "DPYD": {
-        "*1": "Normal",
-        "*2A": "Poor_Metabolizer", "*13": "Poor_Metabolizer",
-    },
-}
-
-
-def infer_phenotype(gene: str, star_allele: str) -> str:
-    return ALLELE_PHENOTYPE_MAP.get(gene.upper(), {}).get(star_allele.strip(), "Normal")
-
-
-def build_diplotype(variants: list) -> str:
-    if not variants:
-        return "wt/wt"
-    sorted_v = sorted(
-        variants,
-        key=lambda v: PHENO_SEVERITY.get(v.get("phenotype", "Normal"), 1),
-        reverse=True,
-    )
-    alleles = [v["allele"] for v in sorted_v[:2]]
-    if len(alleles) == 1:
-        return f"{alleles[0]}/wt"
-    return f"{alleles[0]}/{alleles[1]}"
-
-
-def select_primary_variant(variants: list) -> dict | None:
-    if not variants:
-        return None
-    return max(
-        variants,
-        key=lambda v: PHENO_SEVERITY.get(v.get("phenotype", "Normal"), 1),
-    )
-
-
-def check_interactions(drug_list: list) -> list:
-    drug_set = set(drug_list)
-    warnings = []
-    for gene, drug_a, drug_b, message in GENE_DRUG_INTERACTIONS:
-        if drug_a in drug_set and drug_b in drug_set:
-            warnings.append({
-                "gene":    gene,
-                "drugs":   [drug_a, drug_b],
-                "message": message,
-            })
-    return warnings
+def if_none_match(etag: str) -> str | None:
+    """The If-None-Match tag naming the representation this request would get, or None."""
+    return match_etag(request.headers.get("If-None-Match"), etag, choose_encoding(request.accept_encodings))
 
 
-# ──────────────────────────────────────────────
-# VCF Parser
-# ──────────────────────────────────────────────
-def parse_vcf(filepath: str) -> list:
-    variants = []
-    try:
-        with open(filepath, "r", errors="replace") as f:
-            for line in f:
-                if line.startswith("#") or not line.strip():
-                    continue
-                cols = line.strip().split("\t")
-                if len(cols) < 8:
-                    continue
-                rsid = cols[2] if len(cols) > 2 else "."
-                info = cols[7]
-
-                if "GENE=" in info.upper() and "STAR=" in info.upper():
-                    fields = {}
-                    for item in info.split(";"):
-                        if "=" in item:
-                            k, v = item.split("=", 1)
-                            fields[k.strip().upper()] = v.strip()
-                    gene = fields.get("GENE", "").upper()
-                    star = fields.get("STAR", "")
-                    if gene and star:
-                        variants.append({
-                            "gene":      gene,
-                            "allele":    star,
-                            "rsid":      rsid,
-                            "phenotype": infer_phenotype(gene, star),
-                        })
-                    continue
-
-                if "ANN=" in info:
-                    ann_block = info.split("ANN=", 1)[1].split(";")[0]
-                    for entry in ann_block.split(","):
-                        parts = entry.split("|")
-                        if len(parts) >= 4:
-                            gene   = parts[3].strip().upper()
-                            allele = parts[0].strip() or "."
-                            if gene:
-                                variants.append({
-                                    "gene":      gene,
-                                    "allele":    allele,
-                                    "rsid":      rsid,
-                                    "phenotype": infer_phenotype(gene, allele),
-                                })
-                    continue
-
-                if "CSQ=" in info:
-                    csq_block = info.split("CSQ=", 1)[1].split(";")[0]
-                    for entry in csq_block.split(","):
-                        parts = entry.split("|")
-                        if len(parts) >= 2:
-                            allele = parts[0].strip()
-                            gene   = parts[1].strip().upper()
-                            if gene:
-                                variants.append({
-                                    "gene":      gene,
-                                    "allele":    allele,
-                                    "rsid":      rsid,
-                                    "phenotype": infer_phenotype(gene, allele),
-                                })
-    except Exception as e:
-        app.logger.error(f"VCF parse error: {e}")
-    return variants
+def not_modified(tag: str, cache_control: str):
+    # Echo the client's tag: it may name the compressed representation.
+    # compress_response skips 304s, so Vary is set here.
+    headers = {"ETag": tag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    return app.response_class(status=304, headers=headers)
 
 
-# ──────────────────────────────────────────────
-# VCF Validator
-# ──────────────────────────────────────────────
-def validate_vcf_content(filepath: str) -> dict:
-    errors   = []
-    warnings = []
-    has_format_header = False
-    data_lines        = 0
-    parseable_lines   = 0
-
-    try:
-        with open(filepath, "r", errors="replace") as f:
-            for i, line in enumerate(f):
-                if i > 2000:
-                    break
-                line = line.rstrip()
-                if not line:
-                    continue
-                if line.startswith("##fileformat=VCF"):
-                    has_format_header = True
-                    continue
-                if line.startswith("#"):
-                    continue
-                data_lines += 1
-                cols = line.split("\t")
-                if len(cols) < 8:
-                    warnings.append(f"Line {i+1}: fewer than 8 columns.")
-                    continue
-                info = cols[7]
-                if (
-                    ("GENE=" in info.upper() and "STAR=" in info.upper())
-                    or "ANN=" in info
-                    or "CSQ=" in info
-                ):
-                    parseable_lines += 1
-    except Exception as e:
-        errors.append(f"Could not read file: {e}")
-        return {"valid": False, "errors": errors, "warnings": warnings, "stats": {}}
-
-    if not has_format_header:
-        warnings.append("Missing ##fileformat=VCFv4.x header.")
-    if data_lines == 0:
-        errors.append("No data lines found. File appears empty or header-only.")
-    if parseable_lines == 0 and data_lines > 0:
-        errors.append(
-            "No parseable pharmacogenomic variants found. "
-            "INFO fields must contain GENE=/STAR=, ANN=, or CSQ= annotations."
-        )
-
-    return {
-        "valid":    len(errors) == 0,
-        "errors":   errors,
-        "warnings": warnings,
-        "stats": {
-            "total_data_lines":   data_lines,
-            "parseable_variants": parseable_lines,
-        },
-    }
+def catalogue_response(body: bytes, etag: str):
+    tag = if_none_match(etag)
+    if tag:
+        return not_modified(tag, CATALOGUE_CACHE_CONTROL)
+    response = app.response_class(body, mimetype="application/json")
+    response.headers["ETag"]          = etag
+    response.headers["Cache-Control"] = CATALOGUE_CACHE_CONTROL
+    return response
 
 
-# ──────────────────────────────────────────────
-# Response builder
-# ──────────────────────────────────────────────
-def build_response(drug: str, all_variants: list, patient_id: str) -> dict:
-    relevant_genes = DRUG_GENE_MAP.get(drug, [])
-    v_subset       = [v for v in all_variants if v["gene"] in relevant_genes]
-    no_variants    = len(v_subset) == 0
-
-    risk_data = evaluate_risk(v_subset, drug)
-    advice    = recommendation(risk_data["risk"])
-
-    severity_map = {
-        "Toxic":         "high",
-        "Adjust Dosage": "moderate",
-        "Safe":          "none",
-        "Ineffective":   "moderate",
-    }
-
-    primary      = select_primary_variant(v_subset)
-    primary_gene = primary["gene"]      if primary else (relevant_genes[0] if relevant_genes else "Unknown")
-    allele       = primary["allele"]    if primary else None
-    phenotype    = primary["phenotype"] if primary else "Normal"
-    pheno_code   = PHENO_DISPLAY.get(phenotype, "NM")
-
-    gene_variants = [v for v in v_subset if v["gene"] == primary_gene]
-    diplotype     = build_diplotype(gene_variants)
-
-    if primary:
-        explanation = explain(
-            gene      = primary_gene,
-            variant   = allele or "wt",
-            drug      = drug,
-            risk      = risk_data["risk"],
-            phenotype = phenotype,
-        )
+def analysis_response(payload: dict, compact: bool, etag: str | None = None):
+    if compact:
+        response = jsonify(compact_payload(payload))
     else:
-        explanation = (
-            f"No pharmacogenomic variants relevant to {drug} were detected in this VCF file. "
-            f"Standard metabolic function is assumed for this patient. "
-            f"Standard dosing guidelines apply."
-        )
-
-    return {
-        "patient_id": patient_id,
-        "drug":       drug,
-        "timestamp":  datetime.now(timezone.utc).isoformat(),
-        "no_variants_detected": no_variants,
-
-        "risk_assessment": {
-            "risk_label":       risk_data["risk"],
-            "confidence_score": risk_data["confidence"],
-            "severity":         severity_map.get(risk_data["risk"], "none"),
-        },
-
-        "pharmacogenomic_profile": {
-            "primary_gene":      primary_gene,
-            "diplotype":         diplotype,
-            "phenotype":         pheno_code,
-            "detected_variants": v_subset,
-        },
-
-        "clinical_recommendation": {
-            "recommendation_text": advice,
-        },
-
-        "llm_generated_explanation": {
-            "summary": explanation,
-        },
-
-        "quality_metrics": {
-            "vcf_parsing_success":     True,
-            "relevant_variants_found": len(v_subset),
-        },
-
-        "analysis_status": "complete",
-    }
+        encode_static_blocks(payload["results"])
+        response = jsonify(payload)
+    # A deadline-cut payload is not the representation the ETag names (deadlines.py)
+    partial = response_headers(payload)
+    if partial:
+        response.headers.update(partial)
+    elif etag is not None:
+        response.headers["ETag"]          = etag
+        response.headers["Cache-Control"] = ANALYSIS_CACHE_CONTROL
+    return response
 
 
 # ──────────────────────────────────────────────
@@ -361,10 +102,58 @@ def health():
 
 @app.route("/api/drugs")
 def list_drugs():
-    return jsonify({"supported_drugs": sorted(DRUG_GENE_MAP.keys())}), 200
+    kb = current_kb()
+    return catalogue_response(*catalogue("drugs", kb, kb.drug_listing))
+
+
+@app.route("/api/knowledge-base")
+def knowledge_base_info():
+    kb = current_kb()
+    return catalogue_response(*catalogue("knowledge-base", kb, kb.info))
+
+
+@app.route("/api/metrics")
+def metrics():
+    return jsonify({
+        "admission":    {heavy.name: heavy.metrics(), session_starts.name: session_starts.metrics()},
+        "shared_cache": cache.metrics() if cache is not None else None,
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# Request profiling (see profiling.py)
+# ──────────────────────────────────────────────
+def profiling_guard():
+    """None, or the error response when profiling is off or the caller lacks the token."""
+    if request_profiles is None:
+        return jsonify({"error": "Request profiling is disabled."}), 404
+    if not authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({"error": "Missing or wrong X-Profile token."}), 403
+    return None
+
+
+@app.route("/api/admin/profiles")
+def profile_report():
+    error = profiling_guard()
+    if error:
+        return error
+    top = request.args.get("top", 20, type=int)
+    return jsonify(request_profiles.report(top, request.args.get("sort", "own"))), 200
+
+
+@app.route("/api/admin/profiles/<profile_id>")
+def profile_detail(profile_id):
+    error = profiling_guard()
+    if error:
+        return error
+    record = request_profiles.get(profile_id, request.args.get("top", 50, type=int))
+    if record is None:
+        return jsonify({"error": f"No profile '{profile_id}' (only the most recent are kept)."}), 404
+    return jsonify(record), 200
 
 
 @app.route("/api/validate", methods=["POST"])
+@heavy.limit
 def validate_vcf():
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
@@ -372,12 +161,6 @@ def validate_vcf():
     if not file.filename.lower().endswith(".vcf"):
         return jsonify({"error": "File must be a .vcf"}), 400
 
-    file.seek(0, 2)
-    size = file.tell()
-    file.seek(0)
-    if size > MAX_FILE_BYTES:
-        return jsonify({"error": "File exceeds 5 MB limit"}), 413
-
     # UUID filename for safety
     filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.vcf")
     file.save(filepath)
@@ -393,7 +176,19 @@ def validate_vcf():
 
 
 @app.route("/api/analyze", methods=["POST"])
+@heavy.limit
 def analyze():
+    return analyze_upload(request.form.get("drug", ""))
+
+
+@app.route("/api/panel", methods=["POST"])
+@heavy.limit
+def panel():
+    """Whole-panel report: every supported drug (or the `drug` subset) plus gene-level results."""
+    return analyze_upload(request.form.get("drug", "") or ALL_DRUGS, panel=True)
+
+
+def analyze_upload(drug_input: str, panel: bool = False):
     if "file" not in request.files:
         return jsonify({"error": "No VCF file uploaded"}), 400
 
@@ -403,72 +198,214 @@ def analyze():
     if not file.filename.lower().endswith(".vcf"):
         return jsonify({"error": "Invalid file type. Please upload a .vcf file."}), 400
 
-    file.seek(0, 2)
-    if file.tell() > MAX_FILE_BYTES:
-        return jsonify({"error": "File too large. Maximum allowed size is 5 MB."}), 413
-    file.seek(0)
+    kb = current_kb()
 
-    drug_input = request.form.get("drug", "").strip()
-    if not drug_input:
-        return jsonify({"error": "Drug name is required."}), 400
+    target_drugs, error = parse_drug_list(drug_input, kb)
+    if error:
+        return jsonify(error[0]), error[1]
+    fields, error = parse_fields(request.values.get("fields"))
+    if error:
+        return jsonify(error[0]), error[1]
+    deadline, error = request_deadline(request.values.get("deadline_ms"))
+    if error:
+        return jsonify(error[0]), error[1]
 
-    target_drugs = [d.strip().upper() for d in drug_input.split(",") if d.strip()]
-    if not target_drugs:
-        return jsonify({"error": "No valid drug names provided."}), 400
+    # Optional CHROM/POS window pre-filter (see vcf_parser.py)
+    window_flag   = request.form.get("window_filter", request.args.get("window_filter", "")).lower()
+    window_filter = window_flag in ("1", "true", "yes") if window_flag else None
 
-    unsupported = [d for d in target_drugs if d not in DRUG_GENE_MAP]
-    if unsupported:
-        return jsonify({
-            "error":           f"Unsupported drug(s): {', '.join(unsupported)}",
-            "supported_drugs": sorted(DRUG_GENE_MAP.keys()),
-        }), 400
+    # Accept patient ID from form — fallback to generic ID.
+    # Only explicitly identified patients are kept in the profile store,
+    # and only when the request carries the patient token.
+    patient_id = request.form.get("patient_id", "").strip()
+    store      = writable_store() if patient_id else None
+    patient_id = patient_id or "PATIENT_001"
 
-    # Accept patient ID from form — fallback to generic ID
-    patient_id = request.form.get("patient_id", "").strip() or "PATIENT_001"
+    compact = request.args.get("compact", "").lower() in ("1", "true", "yes")
 
     # UUID filename — no path traversal possible
     filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.vcf")
     file.save(filepath)
 
     try:
-        all_variants = parse_vcf(filepath)
-        results      = [build_response(drug, all_variants, patient_id) for drug in target_drugs]
+        payload = analyze_file(filepath, target_drugs, patient_id, kb, window_filter, store, cache, panel, fields,
+                               deadline=deadline)
     finally:
         try:
             os.remove(filepath)
         except OSError:
             pass
 
-    interactions = check_interactions(target_drugs)
-
-    # Always return consistent structure regardless of drug count
-    summary = {
-        "total_drugs_analysed": len(results),
-        "high_risk_count":      sum(1 for r in results if r["risk_assessment"]["severity"] == "high"),
-        "moderate_risk_count":  sum(1 for r in results if r["risk_assessment"]["severity"] == "moderate"),
-        "safe_count":           sum(1 for r in results if r["risk_assessment"]["severity"] == "none"),
-        "patient_id":           patient_id,
-        "drug_summary": [
-            {
-                "drug":       r["drug"],
-                "risk":       r["risk_assessment"]["risk_label"],
-                "confidence": r["risk_assessment"]["confidence_score"],
-                "severity":   r["risk_assessment"]["severity"],
-            }
-            for r in results
-        ],
-    }
+    # POST: no ETag, no conditional handling (conditional.py)
+    return analysis_response(payload, compact)
+
+
+# ──────────────────────────────────────────────
+# Stored patient profiles (see profile_store.py)
+# ──────────────────────────────────────────────
+def patient_access_error():
+    """Error response unless the store is on and the request carries the patient token."""
+    error = access_error(request.headers.get(PATIENT_TOKEN_HEADER))
+    return (jsonify(error[0]), error[1]) if error else None
+
+
+def writable_store():
+    """The profile store if this request may write to it (patient token), else None."""
+    return profiles if access_error(request.headers.get(PATIENT_TOKEN_HEADER)) is None else None
+
+
+def stored_profile(patient_id: str):
+    """(profile, None) or (None, error response) for the patient in the URL."""
+    error = patient_access_error()
+    if error:
+        return None, error
+    profile = profiles.get(patient_id, request.args.get("file_hash"))
+    if profile is None:
+        return None, (jsonify({"error": f"No stored profile for patient '{patient_id}'."}), 404)
+    return profile, None
+
+
+@app.route("/api/patients/<patient_id>", methods=["GET"])
+def patient_profile(patient_id):
+    profile, error = stored_profile(patient_id)
+    if error:
+        return error
+    profile["file_hashes"] = profiles.file_hashes(patient_id)
+    return jsonify(profile), 200
+
+
+@app.route("/api/patients/<patient_id>", methods=["DELETE"])
+def delete_patient_profile(patient_id):
+    error = patient_access_error()
+    if error:
+        return error
+    deleted = profiles.delete(patient_id)
+    if not deleted:
+        return jsonify({"error": f"No stored profile for patient '{patient_id}'."}), 404
+    return jsonify({"patient_id": patient_id, "deleted_profiles": deleted}), 200
+
+
+@app.route("/api/patients/<patient_id>/analyze", methods=["GET", "POST"])
+@heavy.limit
+def analyze_stored(patient_id):
+    """Same payload as /api/analyze, from the stored profile — no upload."""
+    kb = current_kb()
+    target_drugs, error = parse_drug_list(request.values.get("drug", ""), kb)
+    if error:
+        return jsonify(error[0]), error[1]
+    fields, error = parse_fields(request.values.get("fields"))
+    if error:
+        return jsonify(error[0]), error[1]
+    deadline, error = request_deadline(request.values.get("deadline_ms"))
+    if error:
+        return jsonify(error[0]), error[1]
+
+    profile, error = stored_profile(patient_id)
+    if error:
+        return error
+
+    compact = request.args.get("compact", "").lower() in ("1", "true", "yes")
+    etag    = None
+    if request.method != "POST":    # only GET/HEAD are conditional (conditional.py)
+        etag = analysis_etag(kb, profile["file_hash"], target_drugs, profile["patient_id"],
+                             fields=fields, compact=compact)
+        tag  = if_none_match(etag)
+        if tag:
+            return not_modified(tag, ANALYSIS_CACHE_CONTROL)
+
+    payload = analyze_profile(profile, target_drugs, kb, cache, fields, deadline)
+    return analysis_response(payload, compact, etag)
+
+
+# ──────────────────────────────────────────────
+# Chunked upload sessions (see upload_sessions.py)
+# ──────────────────────────────────────────────
+uploads = UploadSessions(os.path.join(UPLOAD_FOLDER, "sessions"))
+
+
+def _int_field(name: str, default: int | None = None) -> int | None:
+    value = request.values.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise UploadSessionError(f"'{name}' must be an integer.")
+
+
+@app.route("/api/uploads", methods=["POST"])
+@session_starts.limit
+def create_upload():
+    window_flag = request.values.get("window_filter", "").lower()
+    session = uploads.create(
+        current_kb(),
+        patient_id     = request.values.get("patient_id", "").strip(),
+        filename       = request.values.get("filename", "").strip(),
+        chunk_size     = _int_field("chunk_size"),
+        window_filter  = window_flag in ("1", "true", "yes") if window_flag else None,
+        max_line_bytes = MAX_LINE_BYTES,
+    )
+    return jsonify(session.status()), 201
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    return jsonify(uploads.get(upload_id).status()), 200
+
+
+@app.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    if not uploads.close(upload_id):
+        return jsonify({"error": f"No upload session '{upload_id}' (finished or expired)."}), 404
+    return jsonify({"upload_id": upload_id, "aborted": True}), 200
 
-    return jsonify({
-        "results":              results,
-        "summary":              summary,
-        "interaction_warnings": interactions,
-    }), 200
+
+@app.route("/api/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+@heavy.limit
+def upload_chunk(upload_id, index):
+    deadline, error = request_deadline(request.args.get("deadline_ms"))
+    if error:
+        return jsonify(error[0]), error[1]
+    data = request.get_data(cache=False)
+    return jsonify(uploads.put_chunk(upload_id, index, data, request.headers.get("X-Chunk-SHA256"), deadline)), 200
+
+
+@app.route("/api/uploads/<upload_id>/finalize", methods=["POST"])
+@heavy.limit
+def finalize_upload(upload_id):
+    kb = uploads.get(upload_id).kb
+    target_drugs, error = parse_drug_list(request.values.get("drug", ""), kb)
+    if error:
+        return jsonify(error[0]), error[1]
+    fields, error = parse_fields(request.values.get("fields"))
+    if error:
+        return jsonify(error[0]), error[1]
+    deadline, error = request_deadline(request.values.get("deadline_ms"))
+    if error:
+        return jsonify(error[0]), error[1]
+    total_chunks = _int_field("total_chunks")
+    if total_chunks is None:
+        return jsonify({"error": "total_chunks is required."}), 400
+
+    payload = uploads.finalize(upload_id, target_drugs, total_chunks, writable_store(), cache, fields, deadline)
+    return analysis_response(payload, request.args.get("compact", "").lower() in ("1", "true", "yes"))
 
 
 # ──────────────────────────────────────────────
 # Error handlers
 # ──────────────────────────────────────────────
+@app.errorhandler(UploadSessionError)
+def handle_upload_session_error(e):
+    return jsonify({"error": e.message}), e.status
+
+@app.errorhandler(UploadLimitExceeded)
+def handle_upload_limit(e):
+    return jsonify({"error": e.description}), 413
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_too_large(e):
+    return jsonify({"error": f"File too large. Maximum allowed size is {MAX_FILE_BYTES // (1024 * 1024)} MB."}), 413
+
 @app.errorhandler(HTTPException)
 def handle_http_error(e):
     return jsonify({"error": e.name, "details": e.description}), e.code
@@ -0,0 +1,669 @@
+"""
+asgi_app.py — PharmaGuard
+Async (ASGI) serving mode with the same routes and JSON contracts as app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+
+In the Flask app every upload occupies a worker thread for as long as the
+client takes to send it. Here uploads are received on the event loop, so
+thousands of slow clients cost a socket and a spooled buffer each rather
+than a thread. Once a body has fully arrived, the CPU-bound part — VCF
+parsing, risk evaluation, JSON encoding and compression — runs in a
+process pool and the loop only forwards the finished bytes.
+
+Upload limits (size, line length) are enforced on the raw body as it is
+received, exactly as in app.py. Admission control (admission.py) applies
+to the process-pool stage: a request queues for a pool slot only after
+its upload is complete, and is turned away with 429/503 when the queue is
+full or the wait times out. The analysis deadline (deadlines.py) starts
+once the upload has arrived, so time queued for a slot counts against it.
+
+Environment:
+    PHARMAGUARD_ASYNC_WORKERS   process-pool size (default: CPU count)
+    PHARMAGUARD_HEAVY_*         admission limits, see admission.py
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from admission import AsyncAdmissionController, HEAVY_QUEUE, HEAVY_QUEUE_TIMEOUT, session_starts
+from analysis import (
+    ALL_DRUGS, parse_drug_list, parse_fields, analyze_file, analyze_profile, encode_static_blocks,
+    response_headers as analysis_headers,
+)
+from compact_output import compact_payload
+from compression import MIN_COMPRESS_BYTES, compress_bytes, encoded_etag, encoding_for_header
+from conditional import (
+    ANALYSIS_CACHE_CONTROL, CATALOGUE_CACHE_CONTROL, analysis_etag, catalogue, match_etag,
+)
+from deadlines import request_deadline
+from json_provider import dumps_bytes
+from knowledge_base import current as current_kb
+from profile_store import PATIENT_TOKEN_HEADER, access_error, profiles
+from profiling import (
+    PROFILE_HEADER, authorized, profiled_job, request_profiles, response_headers, wanted,
+)
+from shared_cache import cache
+from upload_limits import UploadMeter, UploadLimitExceeded
+from upload_sessions import UploadSessionError, UploadSessions
+from vcf_parser import validate_vcf_content
+
+log = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────
+# Config (mirrors app.py)
+# ──────────────────────────────────────────────
+UPLOAD_FOLDER  = "uploads"
+MAX_FILE_BYTES = 5 * 1024 * 1024
+MAX_LINE_BYTES = int(os.environ.get("PHARMAGUARD_MAX_LINE_BYTES", 256 * 1024))
+MAX_FORM_MEMORY_SIZE = 64 * 1024
+MAX_FORM_PARTS       = 16
+ASYNC_WORKERS  = int(os.environ.get("PHARMAGUARD_ASYNC_WORKERS", os.cpu_count() or 2))
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+heavy   = AsyncAdmissionController("heavy", ASYNC_WORKERS, HEAVY_QUEUE, HEAVY_QUEUE_TIMEOUT)
+uploads = UploadSessions(os.path.join(UPLOAD_FOLDER, "sessions"))
+
+_pool = None
+
+
+def _truthy(value: str | None) -> bool:
+    return (value or "").lower() in ("1", "true", "yes")
+
+
+# ──────────────────────────────────────────────
+# Process-pool jobs (run in worker processes)
+# ──────────────────────────────────────────────
+def _warm_worker() -> None:
+    current_kb()
+
+
+def _encode(payload, encoding: str | None) -> tuple:
+    body = dumps_bytes(payload)
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    return compress_bytes(body, encoding), encoding
+
+
+def _with_upload(data: bytes, job):
+    # UUID filename — no path traversal possible
+    filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}.vcf")
+    with open(filepath, "wb") as f:
+        f.write(data)
+    try:
+        return job(filepath)
+    finally:
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+
+def _encode_analysis(payload: dict, compact: bool, encoding: str | None) -> tuple:
+    headers = analysis_headers(payload)
+    if compact:
+        payload = compact_payload(payload)
+    else:
+        encode_static_blocks(payload["results"])
+    return (200, *_encode(payload, encoding), headers)
+
+
+def analyze_job(data: bytes, digest: str, target_drugs: list, patient_id: str, store_profile: bool,
+                window_filter: bool | None, compact: bool, panel: bool, fields: frozenset | None,
+                deadline, encoding: str | None) -> tuple:
+    """Parse + analyze one upload; returns (status, body, content-encoding, extra headers)."""
+    kb      = current_kb()
+    store   = profiles if store_profile else None
+    payload = _with_upload(
+        data, lambda path: analyze_file(path, target_drugs, patient_id, kb, window_filter, store, cache,
+                                        panel, fields, digest, deadline)
+    )
+    return _encode_analysis(payload, compact, encoding)
+
+
+def stored_analyze_job(patient_id: str, file_hash: str | None, target_drugs: list,
+                       compact: bool, fields: frozenset | None, deadline, encoding: str | None) -> tuple:
+    profile = profiles.get(patient_id, file_hash)
+    if profile is None:
+        return (404, *_encode({"error": f"No stored profile for patient '{patient_id}'."}, None), {})
+    return _encode_analysis(analyze_profile(profile, target_drugs, current_kb(), cache, fields, deadline),
+                            compact, encoding)
+
+
+def validate_job(data: bytes, encoding: str | None) -> tuple:
+    result = _with_upload(data, validate_vcf_content)
+    return (200 if result["valid"] else 422, *_encode(result, encoding), {})
+
+
+def counted_job(job, *args) -> tuple:
+    """
+    (job(*args), shared-cache counters it added) — runs in a pool worker,
+    one job at a time, so the parent can fold the counts into /api/metrics.
+    """
+    if cache is None:
+        return job(*args), None
+    before = cache.snapshot()
+    result = job(*args)
+    return result, cache.counts_since(before)
+
+
+async def run_heavy(request: Request, job, *args) -> Response:
+    """Run `job` in the process pool under admission control."""
+    global _pool
+    admitted, reason, _ = await heavy.acquire()
+    if not admitted:
+        payload, status, headers = heavy.rejection(reason)
+        return json_response(payload, status, headers)
+
+    loop     = asyncio.get_running_loop()
+    start    = loop.time()
+    encoding = encoding_for_header(request.headers.get("accept-encoding"))
+    # Profiled inside the worker (profiling.py); a plain submit when profiling is off
+    profile  = request_profiles is not None and wanted(request.headers.get(PROFILE_HEADER))
+    try:
+        if profile:
+            ((status, body, content_encoding, headers), summary), counts = await loop.run_in_executor(
+                _pool, counted_job, profiled_job, job, *args, encoding,
+            )
+        else:
+            (status, body, content_encoding, headers), counts = await loop.run_in_executor(
+                _pool, counted_job, job, *args, encoding,
+            )
+    except BrokenProcessPool:
+        log.exception("Analysis worker died; restarting pool")
+        _pool.shutdown(wait=False)
+        _pool = _new_pool()
+        return json_response({"error": "Internal server error", "details": "analysis worker crashed"}, 500)
+    finally:
+        heavy.release(loop.time() - start)
+
+    if counts:
+        cache.add_counts(counts)
+    response = Response(body, status, headers=headers, media_type="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    if profile:
+        record = request_profiles.add(summary, request.method, request.url.path, status) if summary else None
+        response.headers.update(response_headers(record))
+    return response
+
+
+async def run_admitted(func, *args) -> tuple:
+    """
+    (None, func(*args)) run in the thread pool under the same admission
+    control as run_heavy — for in-process work such as upload-session
+    parsing — or (rejection response, None) when no slot is granted.
+    """
+    admitted, reason, _ = await heavy.acquire()
+    if not admitted:
+        payload, status, headers = heavy.rejection(reason)
+        return json_response(payload, status, headers), None
+    loop  = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        return None, await run_in_threadpool(func, *args)
+    finally:
+        heavy.release(loop.time() - start)
+
+
+def _new_pool() -> ProcessPoolExecutor:
+    # Spawned, not forked: a forked worker would inherit the client sockets
+    # open at that moment and keep those connections from ever closing.
+    return ProcessPoolExecutor(
+        max_workers = ASYNC_WORKERS,
+        mp_context  = multiprocessing.get_context("spawn"),
+        initializer = _warm_worker,
+    )
+
+
+# ──────────────────────────────────────────────
+# Helpers
+# ──────────────────────────────────────────────
+def json_response(payload, status: int = 200, headers: dict | None = None) -> Response:
+    return Response(dumps_bytes(payload), status, headers=headers, media_type="application/json")
+
+
+def if_none_match(request: Request, etag: str) -> str | None:
+    """The If-None-Match tag naming the representation this request would get, or None."""
+    return match_etag(request.headers.get("if-none-match"), etag,
+                      encoding_for_header(request.headers.get("accept-encoding")))
+
+
+def not_modified(tag: str, cache_control: str) -> Response:
+    # Echo the client's tag: it may name the compressed representation
+    headers = {"ETag": tag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    return Response(status_code=304, headers=headers)
+
+
+def tag_response(response: Response, etag: str, cache_control: str) -> Response:
+    """
+    Add the ETag (per content coding) and Cache-Control to a successful
+    response — not to a deadline-cut partial one (deadlines.py).
+    """
+    if response.status_code == 200 and "x-analysis-status" not in response.headers:
+        response.headers["ETag"]          = encoded_etag(etag, response.headers.get("content-encoding"))
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def catalogue_response(request: Request, body: bytes, etag: str) -> Response:
+    tag = if_none_match(request, etag)
+    if tag:
+        return not_modified(tag, CATALOGUE_CACHE_CONTROL)
+    return tag_response(Response(body, media_type="application/json"), etag, CATALOGUE_CACHE_CONTROL)
+
+
+async def read_upload(request: Request) -> tuple:
+    """(form, filename, file bytes); the last two are None without a file part."""
+    form   = await request.form(max_files=1, max_fields=MAX_FORM_PARTS, max_part_size=MAX_FORM_MEMORY_SIZE)
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        return form, None, None
+    return form, upload.filename or "", await upload.read()
+
+
+class UploadLimitMiddleware:
+    """Apply upload_limits.UploadMeter to request bodies while they are received."""
+
+    def __init__(self, app, max_bytes: int, max_line_bytes: int):
+        self.app            = app
+        self.max_bytes      = max_bytes
+        self.max_line_bytes = max_line_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                message = f"File too large. Maximum allowed size is {self.max_bytes // (1024 * 1024)} MB."
+                return await json_response({"error": message}, 413)(scope, receive, send)
+
+        meter = UploadMeter(self.max_bytes, self.max_line_bytes)
+
+        async def metered_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                meter.feed(message.get("body", b""))
+            return message
+
+        await self.app(scope, metered_receive, send)
+
+
+# ──────────────────────────────────────────────
+# Routes
+# ──────────────────────────────────────────────
+async def home(request: Request) -> Response:
+    return json_response({"status": "PharmaGuard Backend is Running", "version": "3.0"})
+
+
+async def health(request: Request) -> Response:
+    return json_response({"status": "healthy"})
+
+
+async def list_drugs(request: Request) -> Response:
+    kb = current_kb()
+    return catalogue_response(request, *catalogue("drugs", kb, kb.drug_listing))
+
+
+async def knowledge_base_info(request: Request) -> Response:
+    kb = current_kb()
+    return catalogue_response(request, *catalogue("knowledge-base", kb, kb.info))
+
+
+async def metrics(request: Request) -> Response:
+    # Hit/miss/write counters include the pool workers' (see counted_job); the
+    # tier sizes are this process's own
+    return json_response({
+        "admission":    {heavy.name: heavy.metrics(), session_starts.name: session_starts.metrics()},
+        "process_pool": {"workers": ASYNC_WORKERS},
+        "shared_cache": cache.metrics() if cache is not None else None,
+    })
+
+
+# ── request profiling (see profiling.py) ──
+def _profiling_guard(request: Request) -> Response | None:
+    if request_profiles is None:
+        return json_response({"error": "Request profiling is disabled."}, 404)
+    if not authorized(request.headers.get(PROFILE_HEADER)):
+        return json_response({"error": "Missing or wrong X-Profile token."}, 403)
+    return None
+
+
+def _top_param(request: Request, default: int) -> int:
+    try:
+        return int(request.query_params.get("top", default))
+    except ValueError:
+        return default
+
+
+async def profile_report(request: Request) -> Response:
+    error = _profiling_guard(request)
+    if error:
+        return error
+    return json_response(request_profiles.report(_top_param(request, 20), request.query_params.get("sort", "own")))
+
+
+async def profile_detail(request: Request) -> Response:
+    error = _profiling_guard(request)
+    if error:
+        return error
+    profile_id = request.path_params["profile_id"]
+    record     = request_profiles.get(profile_id, _top_param(request, 50))
+    if record is None:
+        return json_response({"error": f"No profile '{profile_id}' (only the most recent are kept)."}, 404)
+    return json_response(record)
+
+
+async def validate_vcf(request: Request) -> Response:
+    form, filename, data = await read_upload(request)
+    if data is None:
+        return json_response({"error": "No file uploaded"}, 400)
+    if not filename.lower().endswith(".vcf"):
+        return json_response({"error": "File must be a .vcf"}, 400)
+    return await run_heavy(request, validate_job, data)
+
+
+async def analyze(request: Request) -> Response:
+    return await analyze_upload(request)
+
+
+async def panel(request: Request) -> Response:
+    """Whole-panel report: every supported drug (or the `drug` subset) plus gene-level results."""
+    return await analyze_upload(request, panel=True)
+
+
+async def analyze_upload(request: Request, panel: bool = False) -> Response:
+    form, filename, data = await read_upload(request)
+    if data is None:
+        return json_response({"error": "No VCF file uploaded"}, 400)
+    if filename == "":
+        return json_response({"error": "Empty filename"}, 400)
+    if not filename.lower().endswith(".vcf"):
+        return json_response({"error": "Invalid file type. Please upload a .vcf file."}, 400)
+
+    drug_input = form.get("drug", "") or (ALL_DRUGS if panel else "")
+    target_drugs, error = parse_drug_list(drug_input, current_kb())
+    if error:
+        return json_response(*error)
+    fields, error = parse_fields(form.get("fields", request.query_params.get("fields")))
+    if error:
+        return json_response(*error)
+    deadline, error = request_deadline(form.get("deadline_ms", request.query_params.get("deadline_ms")))
+    if error:
+        return json_response(*error)
+
+    # Optional CHROM/POS window pre-filter (see vcf_parser.py)
+    window_flag   = form.get("window_filter", request.query_params.get("window_filter", "")).lower()
+    window_filter = _truthy(window_flag) if window_flag else None
+
+    # Accept patient ID from form — fallback to generic ID.
+    # Only explicitly identified patients are kept in the profile store,
+    # and only when the request carries the patient token.
+    patient_id    = form.get("patient_id", "").strip()
+    store_profile = bool(patient_id) and _may_store(request)
+    compact       = _truthy(request.query_params.get("compact"))
+    patient_id    = patient_id or "PATIENT_001"
+
+    # POST: no ETag, no conditional handling (conditional.py)
+    digest = await run_in_threadpool(lambda: hashlib.sha256(data).hexdigest())
+    return await run_heavy(
+        request, analyze_job,
+        data, digest, target_drugs, patient_id, store_profile, window_filter, compact, panel, fields, deadline,
+    )
+
+
+# ── stored patient profiles (see profile_store.py) ──
+def _patient_access_error(request: Request) -> Response | None:
+    error = access_error(request.headers.get(PATIENT_TOKEN_HEADER))
+    return json_response(*error) if error else None
+
+
+def _may_store(request: Request) -> bool:
+    """Whether this request may write to the profile store (patient token)."""
+    return access_error(request.headers.get(PATIENT_TOKEN_HEADER)) is None
+
+
+async def patient_profile(request: Request) -> Response:
+    error = _patient_access_error(request)
+    if error:
+        return error
+    patient_id = request.path_params["patient_id"]
+
+    if request.method == "DELETE":
+        deleted = await run_in_threadpool(profiles.delete, patient_id)
+        if not deleted:
+            return json_response({"error": f"No stored profile for patient '{patient_id}'."}, 404)
+        return json_response({"patient_id": patient_id, "deleted_profiles": deleted})
+
+    profile = await run_in_threadpool(profiles.get, patient_id, request.query_params.get("file_hash"))
+    if profile is None:
+        return json_response({"error": f"No stored profile for patient '{patient_id}'."}, 404)
+    profile["file_hashes"] = await run_in_threadpool(profiles.file_hashes, patient_id)
+    return json_response(profile)
+
+
+async def analyze_stored(request: Request) -> Response:
+    """Same payload as /api/analyze, from the stored profile — no upload."""
+    values = dict(request.query_params)
+    if request.method == "POST":
+        values.update(await request.form(max_files=0, max_fields=MAX_FORM_PARTS, max_part_size=MAX_FORM_MEMORY_SIZE))
+    target_drugs, error = parse_drug_list(values.get("drug", ""), current_kb())
+    if error:
+        return json_response(*error)
+    fields, error = parse_fields(values.get("fields"))
+    if error:
+        return json_response(*error)
+    deadline, error = request_deadline(values.get("deadline_ms"))
+    if error:
+        return json_response(*error)
+    error = _patient_access_error(request)
+    if error:
+        return error
+
+    # Resolve "latest" here so the ETag names the profile the job will use
+    patient_id = request.path_params["patient_id"]
+    file_hash  = request.query_params.get("file_hash")
+    if not file_hash:
+        file_hash = next(iter(await run_in_threadpool(profiles.file_hashes, patient_id)), None)
+        if file_hash is None:
+            return json_response({"error": f"No stored profile for patient '{patient_id}'."}, 404)
+    compact = _truthy(request.query_params.get("compact"))
+    etag    = None
+    if request.method != "POST":    # only GET/HEAD are conditional (conditional.py)
+        etag = analysis_etag(current_kb(), file_hash, target_drugs, patient_id, fields=fields, compact=compact)
+        tag  = if_none_match(request, etag)
+        if tag:
+            return not_modified(tag, ANALYSIS_CACHE_CONTROL)
+
+    response = await run_heavy(
+        request, stored_analyze_job, patient_id, file_hash, target_drugs, compact, fields, deadline,
+    )
+    return tag_response(response, etag, ANALYSIS_CACHE_CONTROL) if etag else response
+
+
+# ── chunked upload sessions (see upload_sessions.py) ──
+# Sessions and their parsers live in this process, so chunk parsing runs
+# in the thread pool rather than the process pool (under the same
+# admission control, see run_admitted).
+async def _form_values(request: Request) -> dict:
+    values = dict(request.query_params)
+    values.update(await request.form(max_files=0, max_fields=MAX_FORM_PARTS, max_part_size=MAX_FORM_MEMORY_SIZE))
+    return values
+
+
+def _int_value(values: dict, name: str) -> int | None:
+    value = (values.get(name) or "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise UploadSessionError(f"'{name}' must be an integer.")
+
+
+async def create_upload(request: Request) -> Response:
+    if not session_starts.acquire():
+        return json_response(*session_starts.rejection())
+    values      = await _form_values(request)
+    window_flag = values.get("window_filter", "")
+    session = uploads.create(
+        current_kb(),
+        patient_id     = values.get("patient_id", "").strip(),
+        filename       = values.get("filename", "").strip(),
+        chunk_size     = _int_value(values, "chunk_size"),
+        window_filter  = _truthy(window_flag) if window_flag else None,
+        max_line_bytes = MAX_LINE_BYTES,
+    )
+    return json_response(session.status(), 201)
+
+
+async def upload_session(request: Request) -> Response:
+    upload_id = request.path_params["upload_id"]
+    if request.method == "DELETE":
+        if not uploads.close(upload_id):
+            return json_response({"error": f"No upload session '{upload_id}' (finished or expired)."}, 404)
+        return json_response({"upload_id": upload_id, "aborted": True})
+    return json_response(uploads.get(upload_id).status())
+
+
+async def upload_chunk(request: Request) -> Response:
+    deadline, error = request_deadline(request.query_params.get("deadline_ms"))
+    if error:
+        return json_response(*error)
+    data = await request.body()
+    rejected, status = await run_admitted(
+        uploads.put_chunk,
+        request.path_params["upload_id"], request.path_params["index"], data,
+        request.headers.get("x-chunk-sha256"), deadline,
+    )
+    return rejected or json_response(status)
+
+
+def _finalize_job(upload_id: str, target_drugs: list, total_chunks: int, store_profile: bool,
+                  compact: bool, fields: frozenset | None, deadline, encoding: str | None) -> tuple:
+    store   = profiles if store_profile else None
+    payload = uploads.finalize(upload_id, target_drugs, total_chunks, store, cache, fields, deadline)
+    return _encode_analysis(payload, compact, encoding)
+
+
+async def finalize_upload(request: Request) -> Response:
+    upload_id = request.path_params["upload_id"]
+    values    = await _form_values(request)
+    target_drugs, error = parse_drug_list(values.get("drug", ""), uploads.get(upload_id).kb)
+    if error:
+        return json_response(*error)
+    fields, error = parse_fields(values.get("fields"))
+    if error:
+        return json_response(*error)
+    deadline, error = request_deadline(values.get("deadline_ms"))
+    if error:
+        return json_response(*error)
+    total_chunks = _int_value(values, "total_chunks")
+    if total_chunks is None:
+        return json_response({"error": "total_chunks is required."}, 400)
+
+    encoding = encoding_for_header(request.headers.get("accept-encoding"))
+    rejected, result = await run_admitted(
+        _finalize_job, upload_id, target_drugs, total_chunks, _may_store(request),
+        _truthy(request.query_params.get("compact")), fields, deadline, encoding,
+    )
+    if rejected:
+        return rejected
+    status, body, content_encoding, headers = result
+    response = Response(body, status, headers=headers, media_type="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    return response
+
+
+# ──────────────────────────────────────────────
+# Error handlers
+# ──────────────────────────────────────────────
+async def handle_upload_session_error(request: Request, exc: UploadSessionError) -> Response:
+    return json_response({"error": exc.message}, exc.status)
+
+
+async def handle_too_large(request: Request, exc: UploadLimitExceeded) -> Response:
+    return json_response({"error": exc.description}, 413)
+
+
+async def handle_http_error(request: Request, exc: HTTPException) -> Response:
+    return json_response(
+        {"error": HTTPStatus(exc.status_code).phrase, "details": exc.detail},
+        exc.status_code, exc.headers,
+    )
+
+
+async def handle_server_error(request: Request, exc: Exception) -> Response:
+    log.exception("Unhandled server error")
+    return json_response({"error": "Internal server error", "details": str(exc)}, 500)
+
+
+# ──────────────────────────────────────────────
+# App
+# ──────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(app):
+    global _pool
+    _pool = _new_pool()
+    # Start every worker (and load the knowledge base) before taking traffic.
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(_pool, _warm_worker) for _ in range(ASYNC_WORKERS)))
+    try:
+        yield
+    finally:
+        _pool.shutdown(wait=True, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/", home),
+        Route("/api/health", health),
+        Route("/api/drugs", list_drugs),
+        Route("/api/knowledge-base", knowledge_base_info),
+        Route("/api/metrics", metrics),
+        Route("/api/admin/profiles", profile_report),
+        Route("/api/admin/profiles/{profile_id}", profile_detail),
+        Route("/api/validate", validate_vcf, methods=["POST"]),
+        Route("/api/analyze", analyze, methods=["POST"]),
+        Route("/api/panel", panel, methods=["POST"]),
+        Route("/api/patients/{patient_id}", patient_profile, methods=["GET", "DELETE"]),
+        Route("/api/patients/{patient_id}/analyze", analyze_stored, methods=["GET", "POST"]),
+        Route("/api/uploads", create_upload, methods=["POST"]),
+        Route("/api/uploads/{upload_id}", upload_session, methods=["GET", "DELETE"]),
+        Route("/api/uploads/{upload_id}/chunks/{index:int}", upload_chunk, methods=["PUT"]),
+        Route("/api/uploads/{upload_id}/finalize", finalize_upload, methods=["POST"]),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+                   expose_headers=["ETag"]),
+        Middleware(UploadLimitMiddleware, max_bytes=MAX_FILE_BYTES, max_line_bytes=MAX_LINE_BYTES),
+    ],
+    exception_handlers={
+        UploadSessionError:  handle_upload_session_error,
+        UploadLimitExceeded: handle_too_large,
+        HTTPException:       handle_http_error,
+        Exception:           handle_server_error,
+    },
+    lifespan=lifespan,
+)
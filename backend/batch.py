@@ -0,0 +1,309 @@
+"""
+batch.py — PharmaGuard
+Offline batch analysis of many VCF files, without the HTTP API.
+
+    python batch.py INPUT [INPUT ...] --drugs CODEINE,WARFARIN [options]
+
+INPUT is a directory (searched recursively for *.vcf and *.vcf.gz), a
+glob such as 'cohort/*/sample.vcf.gz', or a single file. Each file is
+analysed exactly as /api/analyze would (same payload). The patient ID is
+the file's path relative to the directory all inputs share, without the
+VCF suffix and with "/" turned into "_": 'cohort/*.vcf' gives the file
+names, 'cohort/*/sample.vcf.gz' gives <dir>_sample. Inputs that would share
+an ID (e.g. P1.vcf next to P1.vcf.gz) are refused before anything runs.
+Files are spread over a process pool and results are streamed out as
+they finish:
+
+    --format ndjson   one JSON object per line: {"file", "patient_id",
+                      "kb_version", "payload"} or {"file", "error"};
+                      written to --output (default: stdout)
+    --format json     one <patient_id>.json file per input in the --output
+                      directory
+    --format arrow    patient × drug table (columnar_export.py) as Arrow
+    --format parquet  IPC or Parquet, written in record batches of
+                      --batch-rows rows; needs pyarrow
+
+Runs are resumable: with --format json, inputs whose output file already
+exists are skipped; with an NDJSON output file, inputs that already have
+a successful line are skipped and new lines are appended (a partial last
+line from an interrupted run is dropped first). Columnar outputs are
+not appendable, so they are always rebuilt: the table is written to
+<output>.partial and renamed into place when the run finishes.
+
+Progress and throughput go to stderr. There is no upload size limit here.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from analysis import analyze_variants, parse_drug_list
+from columnar_export import FORMATS as COLUMNAR_FORMATS, HAS_PYARROW, ColumnarWriter, flatten
+from json_provider import dumps_bytes
+from knowledge_base import current as current_kb
+from vcf_parser import VcfParser, open_vcf
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - optional dependency
+    import json
+    _loads = json.loads
+
+VCF_SUFFIXES = (".vcf", ".vcf.gz", ".vcf.bgz")
+
+
+# ──────────────────────────────────────────────
+# Input discovery
+# ──────────────────────────────────────────────
+def is_vcf(path: str) -> bool:
+    return path.lower().endswith(VCF_SUFFIXES)
+
+
+def strip_vcf_suffix(name: str) -> str:
+    for suffix in sorted(VCF_SUFFIXES, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def patient_ids(paths: list) -> dict:
+    """{path: patient ID} — see the module docstring."""
+    if not paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    return {
+        p: strip_vcf_suffix(os.path.relpath(os.path.abspath(p), root)).replace(os.sep, "_")
+        for p in paths
+    }
+
+
+def id_collisions(ids: dict) -> dict:
+    """{patient ID: [paths]} for IDs more than one input maps to."""
+    paths_by_id = {}
+    for path, patient_id in ids.items():
+        paths_by_id.setdefault(patient_id, []).append(path)
+    return {patient_id: paths for patient_id, paths in paths_by_id.items() if len(paths) > 1}
+
+
+def find_inputs(specs: list) -> list:
+    """Expand directories and globs into a sorted, de-duplicated list of VCF paths."""
+    found = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            for root, _, files in os.walk(spec):
+                found.update(os.path.join(root, f) for f in files if is_vcf(f))
+        elif os.path.isfile(spec):
+            found.add(spec)
+        else:
+            found.update(p for p in glob.iglob(spec, recursive=True) if os.path.isfile(p) and is_vcf(p))
+    return sorted(found)
+
+
+# ──────────────────────────────────────────────
+# Resume support
+# ──────────────────────────────────────────────
+def done_from_ndjson(path: str) -> set:
+    """Files with a successful line in an existing NDJSON output; trims a partial last line."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        good_end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            good_end += len(line)
+            try:
+                record = _loads(line)
+            except ValueError:
+                continue
+            if "payload" in record:
+                done.add(record["file"])
+        f.truncate(good_end)
+    return done
+
+
+def output_path_for(out_dir: str, patient_id: str) -> str:
+    return os.path.join(out_dir, f"{patient_id}.json")
+
+
+# ──────────────────────────────────────────────
+# Worker
+# ──────────────────────────────────────────────
+_job = {}
+
+
+def _init_worker(target_drugs: list, window_filter: bool, transcripts: str | None, fmt: str,
+                 out_dir: str | None) -> None:
+    _job.update(drugs=target_drugs, window_filter=window_filter, transcripts=transcripts,
+                format=fmt, out_dir=out_dir)
+    current_kb()
+
+
+def analyze_one(item: tuple) -> tuple:
+    """(path, patient ID) → (path, NDJSON line / columnar rows / None, error or None)."""
+    kb               = current_kb()
+    path, patient_id = item
+    try:
+        # Parse directly rather than via parse_vcf(), which logs and
+        # swallows read errors — a corrupt file must be reported here.
+        parser = VcfParser(kb, _job["window_filter"], _job["transcripts"])
+        with open_vcf(path) as f:
+            parser.feed_lines(f)
+        payload = analyze_variants(parser.finish(), _job["drugs"], patient_id, kb)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        line  = dumps_bytes({"file": path, "error": error}) if _job["format"] == "ndjson" else None
+        return path, line, error
+
+    if _job["format"] == "json":
+        target = output_path_for(_job["out_dir"], patient_id)
+        tmp    = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps_bytes(payload))
+        os.replace(tmp, target)
+        return path, None, None
+    if _job["format"] in COLUMNAR_FORMATS:
+        return path, flatten(payload, path, kb.version), None
+
+    record = {"file": path, "patient_id": patient_id, "kb_version": kb.version, "payload": payload}
+    return path, dumps_bytes(record), None
+
+
+# ──────────────────────────────────────────────
+# Driver
+# ──────────────────────────────────────────────
+class Progress:
+    """Periodic progress / throughput line on stderr."""
+
+    def __init__(self, total: int, skipped: int, every: float):
+        self.total   = total
+        self.skipped = skipped
+        self.every   = every
+        self.done    = 0
+        self.errors  = 0
+        self.start   = time.monotonic()
+        self._last   = self.start
+
+    def tick(self, error: bool) -> None:
+        self.done   += 1
+        self.errors += error
+        now = time.monotonic()
+        if self.every and now - self._last >= self.every:
+            self._last = now
+            self.report(final=False)
+
+    def report(self, final: bool) -> None:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        rate    = self.done / elapsed
+        line = (
+            f"[batch] {self.done}/{self.total} files  {rate:.1f} files/s  "
+            f"errors {self.errors}  skipped {self.skipped}"
+        )
+        if final:
+            line += f"  elapsed {elapsed:.1f}s"
+        elif rate > 0:
+            line += f"  eta {(self.total - self.done) / rate:.0f}s"
+        print(line, file=sys.stderr, flush=True)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Offline PharmaGuard analysis of VCF / VCF.gz files.")
+    ap.add_argument("inputs", nargs="+", help="directories, globs or files")
+    ap.add_argument("--drugs", required=True, help="comma-separated drug list, as for /api/analyze")
+    ap.add_argument("--format", choices=("ndjson", "json", *COLUMNAR_FORMATS), default="ndjson")
+    ap.add_argument("--output", default="-",
+                    help="NDJSON file ('-' = stdout), a directory for --format json, or the arrow/parquet file")
+    ap.add_argument("--batch-rows", type=int, default=65536, help="rows per arrow/parquet record batch")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--chunksize", type=int, default=8, help="files handed to a worker at a time")
+    ap.add_argument("--window-filter", action="store_true", help="enable CHROM/POS window mode (see vcf_parser.py)")
+    ap.add_argument("--transcripts", choices=("count", "list"),
+                    help="keep a transcript count or list on collapsed ANN/CSQ variants (see vcf_parser.py)")
+    ap.add_argument("--no-resume", action="store_true", help="reprocess inputs that already have output")
+    ap.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines (0 = off)")
+    args = ap.parse_args(argv)
+
+    kb = current_kb()
+    target_drugs, error = parse_drug_list(args.drugs, kb)
+    if error:
+        ap.error(error[0]["error"])
+    if args.format == "json" and args.output == "-":
+        ap.error("--format json needs --output DIRECTORY")
+    columnar = args.format in COLUMNAR_FORMATS
+    if columnar and args.output == "-":
+        ap.error(f"--format {args.format} needs --output FILE")
+    if columnar and not HAS_PYARROW:
+        ap.error(f"--format {args.format} requires the 'pyarrow' package")
+
+    inputs = find_inputs(args.inputs)
+    ids    = patient_ids(inputs)
+    clash  = id_collisions(ids)
+    if clash:
+        ap.error("inputs map to the same patient ID / output file: " +
+                 "; ".join(f"{patient_id} ← {', '.join(paths)}" for patient_id, paths in sorted(clash.items())))
+    if not args.no_resume and not columnar:
+        if args.format == "json":
+            done = {p for p in inputs if os.path.exists(output_path_for(args.output, ids[p]))}
+        elif args.output != "-":
+            done = done_from_ndjson(args.output)
+        else:
+            done = set()
+        todo = [p for p in inputs if p not in done]
+    else:
+        todo = inputs
+
+    table = None
+    if args.format == "json":
+        os.makedirs(args.output, exist_ok=True)
+        sink = None
+    elif columnar:
+        sink  = None
+        table = ColumnarWriter(f"{args.output}.partial", args.format, args.batch_rows)
+    elif args.output == "-":
+        sink = sys.stdout.buffer
+    else:
+        sink = open(args.output, "wb" if args.no_resume else "ab")
+
+    print(
+        f"[batch] {len(inputs)} inputs, {len(todo)} to process, drugs {','.join(target_drugs)}, "
+        f"knowledge base {kb.version}, {args.workers} workers",
+        file=sys.stderr, flush=True,
+    )
+    progress = Progress(len(todo), len(inputs) - len(todo), args.progress_every)
+    try:
+        with Pool(
+            args.workers,
+            initializer=_init_worker,
+            initargs=(target_drugs, args.window_filter, args.transcripts, args.format, args.output),
+        ) as pool:
+            work = [(p, ids[p]) for p in todo]
+            for path, result, error in pool.imap_unordered(analyze_one, work, chunksize=args.chunksize):
+                if result is not None:
+                    if table is not None:
+                        table.add_rows(result)
+                    else:
+                        sink.write(result + b"\n")
+                if error:
+                    print(f"[batch] {path}: {error}", file=sys.stderr, flush=True)
+                progress.tick(error is not None)
+        if table is not None:
+            table.close()
+            os.replace(f"{args.output}.partial", args.output)
+            print(f"[batch] wrote {table.rows} rows in {table.batches} record batches to {args.output}",
+                  file=sys.stderr, flush=True)
+    finally:
+        if sink is not None and sink is not sys.stdout.buffer:
+            sink.close()
+        elif sink is not None:
+            sink.flush()
+    progress.report(final=True)
+    return 1 if progress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
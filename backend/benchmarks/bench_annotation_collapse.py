@@ -0,0 +1,106 @@
+"""
+bench_annotation_collapse.py — PharmaGuard
+ANN/CSQ transcript-collapsing benchmark on synthetic SnpEff / VEP output.
+
+Writes an annotated exome-style VCF in each dialect: N records, each
+annotated against several transcripts of its gene (as SnpEff and VEP
+emit them, one entry per transcript), a share of them in pharmacogenes
+with star-allele annotations. Each file is parsed with every
+`transcripts` mode and analysed for all supported drugs; the report
+shows annotation entries, variants kept, parse time and payload size.
+Run from the backend directory:
+
+    python benchmarks/bench_annotation_collapse.py [records] [transcripts_per_record]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import analyze_variants  # noqa: E402
+from json_provider import dumps_bytes  # noqa: E402
+from knowledge_base import current  # noqa: E402
+from vcf_parser import VcfParser  # noqa: E402
+
+CSQ_FIELDS = "Allele|SYMBOL|Consequence|IMPACT|Gene|Feature_type|Feature|BIOTYPE|EXON|HGVSc"
+PGX_SHARE  = 0.02
+
+
+def _records(kb, n_records: int, per_record: int):
+    rng   = random.Random(11)
+    genes = sorted({g for genes in kb.drug_gene_map.values() for g in genes})
+    stars = {g: sorted(kb.allele_engine.tables[g].function) if g in kb.allele_engine.tables else ["*2"]
+             for g in genes}
+    for i in range(n_records):
+        if rng.random() < PGX_SHARE:
+            gene   = rng.choice(genes)
+            allele = rng.choice(stars[gene])
+        else:
+            gene   = f"GENE{rng.randrange(18_000)}"
+            allele = rng.choice("ACGT")
+        gt = rng.choice(("0/1", "0/1", "1/1"))
+        transcripts = [f"ENST{i:07d}{t:02d}" for t in range(max(1, int(rng.gauss(per_record, per_record / 3))))]
+        yield i, gene, allele, gt, transcripts
+
+
+def write_vcf(path: str, dialect: str, n_records: int, per_record: int) -> None:
+    kb = current()
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n")
+        if dialect == "vep":
+            f.write(f'##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence annotations '
+                    f'from Ensembl VEP. Format: {CSQ_FIELDS}">\n')
+        else:
+            f.write('##INFO=<ID=ANN,Number=.,Type=String,Description="Functional annotations: '
+                    "'Allele | Annotation | Annotation_Impact | Gene_Name | Gene_ID | Feature_Type | "
+                    "Feature_ID | Transcript_BioType | Rank | HGVS.c'\">\n")
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n")
+        for i, gene, allele, gt, transcripts in _records(kb, n_records, per_record):
+            if dialect == "vep":
+                entries = [f"{allele}|{gene}|missense_variant|MODERATE|ENSG{i:08d}|Transcript|{t}|"
+                           f"protein_coding|4/9|c.{100 + i % 900}C>T" for t in transcripts]
+                info = "CSQ=" + ",".join(entries)
+            else:
+                entries = [f"{allele}|missense_variant|MODERATE|{gene}|ENSG{i:08d}|transcript|{t}|"
+                           f"protein_coding|4/9|c.{100 + i % 900}C>T" for t in transcripts]
+                info = "ANN=" + ",".join(entries)
+            f.write(f"chr1\t{1000 + i * 50}\trs{i}\tC\tT\t50\tPASS\tDP=30;{info}\tGT:DP\t{gt}:30\n")
+
+
+def run(path: str, transcripts: str) -> tuple:
+    kb     = current()
+    parser = VcfParser(kb, transcripts=transcripts)
+    t0 = time.perf_counter()
+    with open(path) as f:
+        parser.feed_lines(f)
+    variants = parser.finish()
+    parse_s  = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    payload  = analyze_variants(variants, sorted(kb.drug_gene_map), "BENCH", kb)
+    body     = dumps_bytes(payload)
+    return parse_s, time.perf_counter() - t0, parser.stats, len(variants), len(body)
+
+
+def main(n_records: int = 50_000, per_record: int = 12) -> None:
+    for dialect in ("snpeff", "vep"):
+        fd, path = tempfile.mkstemp(suffix=".vcf")
+        os.close(fd)
+        try:
+            write_vcf(path, dialect, n_records, per_record)
+            print(f"{dialect}: records={n_records} ~{per_record} transcripts/record "
+                  f"size={os.path.getsize(path) / 1e6:.1f} MB")
+            for mode in ("", "count", "list"):
+                parse_s, analyze_s, stats, found, size = run(path, mode)
+                entries = found + stats["collapsed_annotations"]
+                print(f"  transcripts={mode or 'off':<5} parse {parse_s:6.3f}s analyze {analyze_s:6.3f}s "
+                      f"entries={entries} variants={found} payload={size / 1e3:.1f} kB")
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
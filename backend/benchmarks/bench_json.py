@@ -0,0 +1,73 @@
+"""
+bench_json.py — PharmaGuard
+Serialization benchmark for a 6-drug /api/analyze response.
+
+Compares Flask's stock provider (stdlib json, ASCII-escaped, sorted keys)
+with FastJSONProvider (orjson when installed) and with pre-encoded static
+text fragments. Run from the backend directory:
+
+    python benchmarks/bench_json.py [iterations]
+"""
+
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from analysis import build_response, check_interactions, encode_static_blocks, infer_phenotype  # noqa: E402
+from drug_gene_map import DRUG_GENE_MAP  # noqa: E402
+from json_provider import HAS_FRAGMENTS, HAS_ORJSON, dumps_bytes  # noqa: E402
+
+SAMPLE_ALLELES = {
+    "CYP2D6":  ["*4", "*10"],
+    "CYP2C9":  ["*2", "*3"],
+    "CYP2C19": ["*2", "*17"],
+    "SLCO1B1": ["*5"],
+    "TPMT":    ["*3A"],
+    "DPYD":    ["*2A"],
+}
+
+
+def sample_payload() -> dict:
+    variants = [
+        {"gene": g, "allele": a, "rsid": f"rs{1000 + i}", "phenotype": infer_phenotype(g, a)}
+        for i, (g, alleles) in enumerate(SAMPLE_ALLELES.items())
+        for a in alleles
+    ]
+    drugs   = sorted(DRUG_GENE_MAP)
+    results = [build_response(d, variants, "PATIENT_001") for d in drugs]
+    return {"results": results, "summary": {}, "interaction_warnings": check_interactions(drugs)}
+
+
+def stock_flask(obj) -> bytes:
+    return json.dumps(
+        obj, default=DefaultJSONProvider.default, sort_keys=True, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def main(iterations: int = 5000) -> None:
+    payload = sample_payload()
+    fragmented = dict(payload, results=encode_static_blocks(
+        [dict(r, clinical_recommendation=dict(r["clinical_recommendation"]),
+              llm_generated_explanation=dict(r["llm_generated_explanation"]))
+         for r in payload["results"]]
+    ))
+
+    cases = [
+        ("stock flask json", lambda: stock_flask(payload)),
+        ("fast provider",    lambda: dumps_bytes(payload)),
+        ("fast + fragments", lambda: dumps_bytes(fragmented)),
+    ]
+    print(f"orjson={HAS_ORJSON} fragments={HAS_FRAGMENTS} drugs={len(payload['results'])}")
+    print(f"{'mode':<18} {'us/call':>10} {'bytes':>8}")
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=iterations, repeat=3))
+        print(f"{name:<18} {seconds / iterations * 1e6:>10.1f} {len(fn()):>8}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,166 @@
+"""
+bench_slow_clients.py — PharmaGuard
+Slow-client load test: Flask under gunicorn vs the ASGI app under uvicorn.
+
+Starts each server in turn, opens N clients that trickle a multipart
+/api/analyze upload over `--upload-seconds`, and meanwhile sends a fast
+probe upload every 100 ms. Reports how many slow uploads completed and
+the probe latency (requests that exceed `--timeout` count as failed) — with thread-per-request serving the probes queue
+behind the trickling uploads; with the async server they do not. Run
+from the backend directory (needs gunicorn and uvicorn installed):
+
+    python benchmarks/bench_slow_clients.py [--clients 200] [--upload-seconds 5]
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "22\t42130692\trs3892097\tC\tT\t50\tPASS\tGENE=CYP2D6;STAR=*4\tGT\t0/1\n"
+    "10\t94781859\trs4244285\tG\tA\t50\tPASS\tGENE=CYP2C19;STAR=*2\tGT\t0/1\n"
+    "10\t94942290\trs1799853\tC\tT\t50\tPASS\tGENE=CYP2C9;STAR=*2\tGT\t0/1\n"
+) + "".join(
+    f"1\t{1000 + i}\t.\tA\tG\t50\tPASS\tDP=30\tGT\t0/1\n" for i in range(400)
+)
+
+
+def multipart_body(drugs: str) -> tuple:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="drug"\r\n\r\n{drugs}\r\n'
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="s.vcf"\r\n'
+        f"Content-Type: text/plain\r\n\r\n{SAMPLE_VCF}\r\n"
+        f"--{boundary}--\r\n"
+    ).encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+async def post_analyze(port: int, seconds: float, timeout: float, chunks: int = 20) -> tuple:
+    """Send one upload spread over `seconds`; return (status, elapsed), status 0 on failure."""
+    start = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(_post(port, seconds, chunks), timeout)
+    except asyncio.TimeoutError:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+async def _post(port: int, seconds: float, chunks: int) -> int:
+    body, ctype = multipart_body("CODEINE,WARFARIN,CLOPIDOGREL")
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"POST /api/analyze HTTP/1.1\r\nHost: localhost\r\nContent-Type: {ctype}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+        )
+        step = max(1, len(body) // chunks)
+        for i in range(0, len(body), step):
+            writer.write(body[i:i + step])
+            await writer.drain()
+            if seconds:
+                await asyncio.sleep(seconds / chunks)
+        status_line = await reader.readline()
+        await reader.read()
+        writer.close()
+        status = int(status_line.split()[1]) if status_line else 0
+    except (OSError, IndexError, ValueError):
+        status = 0
+    return status
+
+
+async def load(port: int, clients: int, upload_seconds: float, timeout: float) -> dict:
+    slow = [asyncio.create_task(post_analyze(port, upload_seconds, timeout)) for _ in range(clients)]
+    probes = []
+    await asyncio.sleep(0.5)
+    while not all(t.done() for t in slow):
+        probes.append(asyncio.create_task(post_analyze(port, 0, timeout)))
+        await asyncio.sleep(0.1)
+    slow_results  = await asyncio.gather(*slow)
+    probe_results = await asyncio.gather(*probes)
+
+    latencies = sorted(e for s, e in probe_results if s == 200)
+    return {
+        "slow_ok":      sum(1 for s, _ in slow_results if s == 200),
+        "slow_total":   len(slow_results),
+        "slow_status":  dict(Counter(s for s, _ in slow_results)),
+        "slow_wall_s":  max(e for s, e in slow_results if s == 200) if any(s == 200 for s, _ in slow_results) else float("nan"),
+        "probe_ok":     len(latencies),
+        "probe_total":  len(probe_results),
+        "probe_p50_ms": 1000 * statistics.median(latencies) if latencies else float("nan"),
+        "probe_p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else float("nan"),
+        "probe_max_ms": 1000 * latencies[-1] if latencies else float("nan"),
+    }
+
+
+def wait_ready(port: int, timeout: float = 20) -> None:
+    import urllib.request
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def run_mode(name: str, cmd: list, env: dict, port: int, args) -> dict:
+    server = subprocess.Popen(cmd, cwd=BACKEND, env={**os.environ, **env},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        return asyncio.run(load(port, args.clients, args.upload_seconds, args.timeout))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    ap.add_argument("--clients", type=int, default=200)
+    ap.add_argument("--upload-seconds", type=float, default=5.0)
+    ap.add_argument("--timeout", type=float, default=30.0, help="per-request client timeout")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn workers / process-pool size")
+    ap.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    ap.add_argument("--port", type=int, default=8780)
+    args = ap.parse_args()
+
+    env = {
+        "PHARMAGUARD_HEAVY_QUEUE":   str(args.clients * 2),
+        "PHARMAGUARD_ASYNC_WORKERS": str(args.workers),
+    }
+    modes = {
+        f"flask (gunicorn {args.workers}x{args.threads} threads)": [
+            sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{args.port}",
+            "-w", str(args.workers), "--threads", str(args.threads), "--timeout", "120",
+        ],
+        f"asgi (uvicorn + {args.workers}-process pool)": [
+            sys.executable, "-m", "uvicorn", "asgi_app:app", "--port", str(args.port + 1),
+            "--log-level", "warning",
+        ],
+    }
+    print(f"{args.clients} slow clients, each upload spread over {args.upload_seconds:g}s\n")
+    for i, (name, cmd) in enumerate(modes.items()):
+        r = run_mode(name, cmd, env, args.port + i, args)
+        print(name)
+        print(f"  slow uploads ok   {r['slow_ok']}/{r['slow_total']}  (last finished after {r['slow_wall_s']:.1f}s)  status {r['slow_status']}")
+        print(f"  probes ok         {r['probe_ok']}/{r['probe_total']}")
+        print(f"  probe latency     p50 {r['probe_p50_ms']:.0f} ms   p95 {r['probe_p95_ms']:.0f} ms   "
+              f"max {r['probe_max_ms']:.0f} ms\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+bench_startup.py — PharmaGuard
+Cold-start benchmark: import time and first-request latency per entry point.
+
+Every run is a fresh interpreter. For each entry point it reports the
+median over the runs of:
+
+    process   wall time of `python -c "import <module>"`, interpreter start included
+    import    time to import the module inside the process
+    first     first /api/analyze on the sample VCF (Flask test client /
+              Starlette TestClient; for asgi_app this includes starting
+              the process pool, which the lifespan does before traffic)
+    second    the same request again, for comparison
+
+plus which framework / optional packages the import alone pulled in.
+Run from the backend directory:
+
+    python benchmarks/bench_startup.py [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "22\t42128945\trs3892097\tC\tT\t.\tPASS\tGENE=CYP2D6;STAR=*4\tGT\t0/1\n"
+    "10\t94781859\trs4244285\tG\tA\t.\tPASS\tGENE=CYP2C19;STAR=*2\tGT\t0/1\n"
+    "10\t94942290\trs1799853\tC\tT\t.\tPASS\tGENE=CYP2C9;STAR=*2\tGT\t0/1\n"
+)
+
+WATCHED = ("flask", "werkzeug", "starlette", "redis", "pyarrow", "sqlite3")
+
+# Runs in the child; the parent fills in the placeholders.
+CHILD = r"""
+import io, json, sys, time
+sys.path.insert(0, {backend!r})
+t0 = time.perf_counter()
+import {module} as target
+t1 = time.perf_counter()
+loaded = [m for m in {watched!r} if m in sys.modules]
+data = open({vcf!r}, "rb").read()
+form = {{"drug": "CODEINE,CLOPIDOGREL,WARFARIN"}}
+times = []
+if "{module}" == "app":
+    client = target.app.test_client()
+    for _ in range(2):
+        t = time.perf_counter()
+        r = client.post("/api/analyze", data={{**form, "file": (io.BytesIO(data), "s.vcf")}})
+        assert r.status_code == 200, r.data
+        times.append(time.perf_counter() - t)
+else:
+    from starlette.testclient import TestClient
+    t = time.perf_counter()
+    with TestClient(target.app) as client:
+        for i in range(2):
+            r = client.post("/api/analyze", data=form, files={{"file": ("s.vcf", data)}})
+            assert r.status_code == 200, r.text
+            times.append(time.perf_counter() - t)
+            t = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "first": times[0], "second": times[1], "loaded": loaded}}))
+"""
+
+
+def _env() -> dict:
+    return {**os.environ, "PHARMAGUARD_PROFILE_DB": "off", "PHARMAGUARD_ASYNC_WORKERS": "2"}
+
+
+def process_ms(module: str) -> float:
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=BACKEND, env=_env(), check=True)
+    return 1000 * (time.perf_counter() - t)
+
+
+def request_run(module: str, vcf: str) -> dict:
+    code = CHILD.format(module=module, vcf=vcf, watched=WATCHED, backend=BACKEND)
+    if module == "asgi_app":
+        # The process pool spawns workers, which re-import __main__: keep the
+        # script importable by running it from a file behind a main guard.
+        fd, script = tempfile.mkstemp(suffix=".py")
+        with os.fdopen(fd, "w") as f:
+            f.write("if __name__ == '__main__':\n" + "".join(f"    {line}\n" for line in code.splitlines()))
+        try:
+            out = subprocess.run([sys.executable, script], cwd=BACKEND, env=_env(), check=True,
+                                 capture_output=True, text=True).stdout
+        finally:
+            os.remove(script)
+    else:
+        out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=_env(), check=True,
+                             capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(runs: int = 5) -> None:
+    fd, vcf = tempfile.mkstemp(suffix=".vcf")
+    with os.fdopen(fd, "w") as f:
+        f.write(SAMPLE_VCF)
+    try:
+        baseline = statistics.median(process_ms("os") for _ in range(runs))
+        print(f"bare interpreter {baseline:6.1f} ms")
+        for module in ("app", "asgi_app"):
+            proc    = statistics.median(process_ms(module) for _ in range(runs))
+            samples = [request_run(module, vcf) for _ in range(runs)]
+            med     = {k: 1000 * statistics.median(s[k] for s in samples) for k in ("import", "first", "second")}
+            print(f"{module:<9} process {proc:6.1f} ms  import {med['import']:6.1f} ms  "
+                  f"first {med['first']:7.1f} ms  second {med['second']:6.1f} ms  "
+                  f"loads {','.join(samples[0]['loaded']) or '-'}")
+    finally:
+        os.remove(vcf)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
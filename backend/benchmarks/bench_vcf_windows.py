@@ -0,0 +1,73 @@
+"""
+bench_vcf_windows.py — PharmaGuard
+Window-mode benchmark on a synthetic whole-genome-style VCF.
+
+Writes a coordinate-sorted VCF with N background records spread over
+chr1–chr22 plus the sample's pharmacogene records at their real GRCh38
+positions, then parses it with and without window mode. Run from the
+backend directory:
+
+    python benchmarks/bench_vcf_windows.py [records]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import current  # noqa: E402
+from vcf_parser import VcfParser  # noqa: E402
+
+CHROM_LEN = 250_000_000
+
+
+def write_vcf(path: str, n_records: int) -> None:
+    kb  = current()
+    rng = random.Random(7)
+    pgx = [(int(v.chrom), v.pos, v.ref, v.alt, v.key) for v in kb.star_index.by_pos.values()]
+    per_chrom = max(1, n_records // 22)
+    with open(path, "w") as f:
+        f.write("##fileformat=VCFv4.2\n")
+        for c in range(1, 23):
+            f.write(f"##contig=<ID=chr{c},length={CHROM_LEN}>\n")
+        f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n")
+        for c in range(1, 23):
+            rows = [(p, "A", "G", ".") for p in sorted(rng.sample(range(1, CHROM_LEN), per_chrom))]
+            rows += [(p, r, a, k) for ch, p, r, a, k in pgx if ch == c]
+            for pos, ref, alt, rsid in sorted(rows):
+                f.write(f"chr{c}\t{pos}\t{rsid}\t{ref}\t{alt}\t50\tPASS\t"
+                        f"DP=31;AF=0.5;MQ=60;QD=12.1;FS=0.0;SOR=0.7\tGT:DP\t0/1:31\n")
+
+
+def run(path: str, window_filter: bool) -> tuple:
+    parser = VcfParser(window_filter=window_filter)
+    t0 = time.perf_counter()
+    with open(path) as f:
+        parser.feed_lines(f)
+    variants = parser.finish()
+    return time.perf_counter() - t0, parser.stats, len(variants)
+
+
+def main(n_records: int = 1_000_000) -> None:
+    fd, path = tempfile.mkstemp(suffix=".vcf")
+    os.close(fd)
+    try:
+        write_vcf(path, n_records)
+        print(f"records={n_records} size={os.path.getsize(path) / 1e6:.1f} MB")
+        for window_filter in (False, True):
+            seconds, stats, found = run(path, window_filter)
+            line = f"window_filter={window_filter!s:<5} {seconds:7.3f}s variants={found}"
+            if window_filter:
+                skipped = stats["outside_windows"] / max(stats["records"], 1)
+                line += (f" records_seen={stats['records']} skipped={skipped:.2%}"
+                         f" early_exit={stats['early_exit']}")
+            print(line)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,115 @@
+"""
+columnar_export.py — PharmaGuard
+Columnar (Arrow IPC / Parquet) export of analysis results.
+
+Each /api/analyze payload is flattened to one row per patient × drug:
+
+    patient_id, source_file, drug, risk_label, confidence_score, severity,
+    primary_gene, diplotype, phenotype, activity_score,
+    no_variants_detected, kb_version
+
+Rows are buffered column-wise and flushed as a record batch every
+`batch_rows` rows, so memory is bounded by one batch no matter how large
+the cohort is. Used by `batch.py --format arrow|parquet`.
+
+Requires the optional `pyarrow` package, which is imported when the
+first writer is created rather than with this module.
+"""
+
+from importlib.util import find_spec
+
+HAS_PYARROW = find_spec("pyarrow") is not None
+
+pa = pq = None
+
+
+def _load_pyarrow() -> None:
+    global pa, pq
+    if pa is None:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+COLUMNS = (
+    ("patient_id",           "string"),
+    ("source_file",          "string"),
+    ("drug",                 "string"),
+    ("risk_label",           "string"),
+    ("confidence_score",     "float64"),
+    ("severity",             "string"),
+    ("primary_gene",         "string"),
+    ("diplotype",            "string"),
+    ("phenotype",            "string"),
+    ("activity_score",       "float64"),
+    ("no_variants_detected", "bool"),
+    ("kb_version",           "string"),
+)
+
+FORMATS = ("arrow", "parquet")
+
+
+def flatten(payload: dict, source_file: str, kb_version: str) -> list:
+    """One row tuple (in COLUMNS order) per drug result."""
+    rows = []
+    for r in payload["results"]:
+        risk    = r["risk_assessment"]
+        profile = r["pharmacogenomic_profile"]
+        rows.append((
+            r["patient_id"],
+            source_file,
+            r["drug"],
+            risk["risk_label"],
+            risk["confidence_score"],
+            risk["severity"],
+            profile["primary_gene"],
+            profile["diplotype"],
+            profile["phenotype"],
+            profile["activity_score"],
+            r["no_variants_detected"],
+            kb_version,
+        ))
+    return rows
+
+
+class ColumnarWriter:
+    """Incremental writer: add_rows() any number of times, then close()."""
+
+    def __init__(self, path: str, fmt: str, batch_rows: int = 65536, compression: str = "zstd"):
+        if not HAS_PYARROW:
+            raise RuntimeError("Columnar export requires the 'pyarrow' package.")
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown columnar format '{fmt}' (expected one of {', '.join(FORMATS)})")
+        _load_pyarrow()
+        self.schema     = pa.schema([(name, pa.type_for_alias(typ)) for name, typ in COLUMNS])
+        self.batch_rows = batch_rows
+        self.rows       = 0
+        self.batches    = 0
+        self._columns   = [[] for _ in COLUMNS]
+
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa.ipc.new_file(path, self.schema, options=options)
+
+    def add_rows(self, rows: list) -> None:
+        for row in rows:
+            for column, value in zip(self._columns, row):
+                column.append(value)
+        if len(self._columns[0]) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        pending = len(self._columns[0])
+        if not pending:
+            return
+        arrays = [pa.array(col, type=field.type) for col, field in zip(self._columns, self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.rows    += pending
+        self.batches += 1
+        self._columns = [[] for _ in COLUMNS]
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
@@ -0,0 +1,100 @@
+"""
+compact_output.py — PharmaGuard
+Compact representation of /api/analyze payloads (`?compact=1`).
+
+The full payload repeats the patient ID in every result, embeds the same
+recommendation/explanation paragraphs for every drug that shares a risk
+label or phenotype, and copies a gene's variants into every drug that uses
+that gene. Compact mode lifts those into one-time dictionary sections:
+
+    {
+      "format":     "compact/v1",
+      "patient_id": "PATIENT_001",
+      "texts":      {"t0": "...", "t1": "..."},
+      "variants":   [{...}, {...}],
+      "results": [
+        {
+          "drug": "CODEINE",
+          "clinical_recommendation":   {"recommendation_key": "t0"},
+          "llm_generated_explanation": {"summary_key": "t1"},
+          "pharmacogenomic_profile":   {..., "detected_variant_ids": [0, 1]},
+          ...
+        }
+      ],
+      ...
+    }
+"""
+
+from json_provider import static_text
+
+COMPACT_FORMAT = "compact/v1"
+
+
+class _Interner:
+    """Assigns stable, first-seen-order keys to repeated values."""
+
+    def __init__(self, make_key):
+        self._make_key = make_key
+        self._ids      = {}
+        self.values    = []
+
+    def key(self, value, identity=None):
+        identity = value if identity is None else identity
+        idx = self._ids.get(identity)
+        if idx is None:
+            idx = self._ids[identity] = len(self.values)
+            self.values.append(value)
+        return self._make_key(idx)
+
+
+def _frozen(value):
+    """Hashable stand-in for a JSON value (variants carry a `transcripts` list in list mode)."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _frozen(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_frozen(v) for v in value)
+    return value
+
+
+def _variant_identity(v: dict) -> tuple:
+    return _frozen(v)
+
+
+def compact_payload(payload: dict) -> dict:
+    """Return the compact form of a full analysis payload (the input is not modified)."""
+    texts    = _Interner(lambda i: f"t{i}")
+    variants = _Interner(lambda i: i)
+
+    compact_results = []
+    # Sections left out with fields= (analysis.parse_fields) stay out
+    for r in payload["results"]:
+        compact = {k: v for k, v in r.items() if k != "patient_id"}
+        if "clinical_recommendation" in r:
+            compact["clinical_recommendation"] = {
+                "recommendation_key": texts.key(r["clinical_recommendation"]["recommendation_text"]),
+            }
+        if "llm_generated_explanation" in r:
+            compact["llm_generated_explanation"] = {
+                "summary_key": texts.key(r["llm_generated_explanation"]["summary"]),
+            }
+        profile = r.get("pharmacogenomic_profile")
+        if profile is not None:
+            compact["pharmacogenomic_profile"] = {k: v for k, v in profile.items() if k != "detected_variants"}
+            if "detected_variants" in profile:
+                compact["pharmacogenomic_profile"]["detected_variant_ids"] = [
+                    variants.key(v, _variant_identity(v)) for v in profile["detected_variants"]
+                ]
+        compact_results.append(compact)
+
+    results = payload["results"]
+    out = {
+        **{k: v for k, v in payload.items() if k not in ("results", "summary")},
+        "format":     COMPACT_FORMAT,
+        "patient_id": results[0]["patient_id"] if results else None,
+        "texts":      {f"t{i}": static_text(t) for i, t in enumerate(texts.values)},
+        "variants":   variants.values,
+        "results":    compact_results,
+    }
+    if "summary" in payload:
+        out["summary"] = {k: v for k, v in payload["summary"].items() if k != "patient_id"}
+    return out
@@ -0,0 +1,109 @@
+"""
+compression.py — PharmaGuard
+Negotiated response compression (brotli / gzip) for JSON API responses.
+
+Brotli is used only when the optional `brotli` package is installed and the
+client prefers it at least as much as gzip; gzip comes from the standard
+library and is always available. Small bodies are sent uncompressed because
+the framing overhead outweighs the saving.
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL         = 6
+BROTLI_QUALITY     = 5
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/csv"}
+
+
+def choose_encoding(accept_encodings) -> str | None:
+    """Pick the best supported content-coding from an Accept-Encoding header."""
+    br_q   = accept_encodings.quality("br") if brotli is not None else 0
+    gzip_q = accept_encodings.quality("gzip")
+    if br_q > 0 and br_q >= gzip_q:
+        return "br"
+    if gzip_q > 0:
+        return "gzip"
+    return None
+
+
+class _AcceptEncoding:
+    """Accept-Encoding q-values with werkzeug's `quality()` rule: exact coding, else `*`."""
+
+    def __init__(self, header: str):
+        self._q = {}
+        for item in header.split(","):
+            coding, *params = item.split(";")
+            coding = coding.strip().lower()
+            if not coding:
+                continue
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        q = min(max(float(value), 0.0), 1.0)
+                    except ValueError:
+                        q = 0.0
+            self._q[coding] = q
+
+    def quality(self, coding: str) -> float:
+        return self._q.get(coding, self._q.get("*", 0.0))
+
+
+def encoding_for_header(accept_encoding: str | None) -> str | None:
+    """
+    `choose_encoding` for a raw Accept-Encoding header value (non-Flask
+    callers). Parsed here rather than with werkzeug so the ASGI app never
+    has to import it.
+    """
+    return choose_encoding(_AcceptEncoding(accept_encoding or ""))
+
+
+def encoded_etag(etag: str, encoding: str | None) -> str:
+    """The entity tag of the `encoding`-compressed representation (see conditional.py)."""
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response):
+    """`after_request` hook: compress eligible responses in place."""
+    from flask import request    # Flask-only path; see encoding_for_header
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    response.set_data(compress_bytes(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    if "ETag" in response.headers:
+        response.headers["ETag"] = encoded_etag(response.headers["ETag"], encoding)
+    return response
+
+
+def init_compression(app) -> None:
+    app.after_request(compress_response)
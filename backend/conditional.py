@@ -0,0 +1,110 @@
+"""
+conditional.py — PharmaGuard
+ETags, If-None-Match and Cache-Control for stored-profile analyses and
+the knowledge-base catalogue endpoints.
+
+An analysis is fully determined by its inputs, so its ETag is derived
+from them rather than from the response body:
+
+    knowledge-base version + file content hash (SHA-256) + normalised
+    drug list + the options that shape the payload (patient ID, fields,
+    compact, panel, window filter, parser transcript mode)
+
+which lets a repeat GET of /api/patients/<id>/analyze be answered 304 Not
+Modified before anything is evaluated. The tag is weak (W/"…"): the
+payload's `timestamp` is the time the client's copy was produced, so two
+responses under one tag are equivalent but not byte-identical; a 304
+tells the client to keep its copy. Only GET and HEAD are conditional —
+POST responses (/api/analyze, /api/panel, and the POST form of the
+stored-profile route) carry no ETag and ignore If-None-Match.
+
+Catalogue documents (/api/drugs, /api/knowledge-base) are serialized once
+per loaded knowledge base and tagged with a hash of the bytes.
+
+Responses compressed by compression.py carry the coding in their tag
+("<tag>-gzip", "<tag>-br") so each representation has its own ETag. If-None-Match matches the tag of the representation the request
+would get — the coded one for the negotiated coding, or the plain one,
+which small uncompressed bodies carry — so a client that cannot decode
+gzip never gets a 304 for a gzip copy. 304s carry Vary: Accept-Encoding
+like the responses they stand for.
+
+Analysis results are patient data: they are marked `private` so only the
+client's own cache may keep them, never a shared proxy.
+
+Environment:
+    PHARMAGUARD_CATALOGUE_MAX_AGE  seconds shared caches may serve /api/drugs
+                                   and /api/knowledge-base (default: 300)
+    PHARMAGUARD_ANALYSIS_MAX_AGE   seconds a client may reuse an analysis
+                                   without revalidating (default: 0 — always
+                                   revalidate with If-None-Match)
+"""
+
+import hashlib
+import os
+
+from compression import encoded_etag
+from json_provider import dumps_bytes
+from vcf_parser import VCF_TRANSCRIPTS
+
+# ──────────────────────────────────────────────
+# Config
+# ──────────────────────────────────────────────
+CATALOGUE_MAX_AGE = int(os.environ.get("PHARMAGUARD_CATALOGUE_MAX_AGE", 300))
+ANALYSIS_MAX_AGE  = int(os.environ.get("PHARMAGUARD_ANALYSIS_MAX_AGE", 0))
+
+CATALOGUE_CACHE_CONTROL = f"public, max-age={CATALOGUE_MAX_AGE}"
+ANALYSIS_CACHE_CONTROL  = f"private, max-age={ANALYSIS_MAX_AGE}" if ANALYSIS_MAX_AGE > 0 else "private, no-cache"
+
+
+def make_etag(*parts, weak: bool = False) -> str:
+    """Entity tag over `parts` (str or bytes); strong unless `weak`."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\x00")
+    return f'{"W/" if weak else ""}"{h.hexdigest()[:32]}"'
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def analysis_etag(kb, file_hash: str, target_drugs: list, patient_id: str, **options) -> str:
+    """ETag of an analysis payload, from its inputs (see module docstring)."""
+    shaping = ";".join(f"{k}={sorted(v) if isinstance(v, frozenset) else v}" for k, v in sorted(options.items()))
+    return make_etag("analysis/v1", kb.version, file_hash, ",".join(target_drugs), patient_id,
+                     VCF_TRANSCRIPTS, shaping, weak=True)
+
+
+def match_etag(if_none_match: str | None, etag: str, encoding: str | None = None) -> str | None:
+    """
+    The tag in an If-None-Match header that names a representation of
+    `etag` this request would be served (weak comparison): the plain one,
+    or the `encoding`-compressed one (compression.py). None if no tag
+    matches; "*" matches anything.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    current = {_opaque(etag), _opaque(encoded_etag(etag, encoding))}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if _opaque(tag) in current:
+            return tag
+    return None
+
+
+# ──────────────────────────────────────────────
+# Catalogue documents
+# ──────────────────────────────────────────────
+_catalogue = {}     # name → (kb, body, etag)
+
+
+def catalogue(name: str, kb, build) -> tuple:
+    """(body, etag) for a document derived from `kb`, built and serialized once per loaded KB."""
+    entry = _catalogue.get(name)
+    if entry is None or entry[0] is not kb:
+        body  = dumps_bytes(build())
+        entry = _catalogue[name] = (kb, body, make_etag(body))
+    return entry[1], entry[2]
@@ -0,0 +1,88 @@
+"""
+deadlines.py — PharmaGuard
+Per-request analysis deadlines.
+
+Every analysis request gets a time budget: PHARMAGUARD_ANALYSIS_DEADLINE
+seconds by default, or the request's own `deadline_ms` field / query
+parameter (capped at PHARMAGUARD_ANALYSIS_DEADLINE_MAX). The Deadline
+object travels with the request through parsing (checked every
+DEADLINE_CHECK_LINES lines), per-drug evaluation (checked before each
+drug) and explanation generation (checked before each explanation).
+
+When it runs out the pipeline stops where it is and the response carries
+what was finished: completed drugs as usual, the rest as entries with
+`"analysis_status": "partial"` and `deadline_exceeded_at` naming the step
+(parse, analysis or explanation). A deadline hit while parsing leaves no
+trustworthy variants, so every drug is partial. Partial results are never
+cached or stored, and their responses are marked `no-store` with
+`X-Analysis-Status: partial`.
+
+Chunked uploads (upload_sessions.py) are parsed as chunks arrive, each
+chunk PUT under its own deadline (`deadline_ms` query parameter); one
+that runs out abandons the session's parse, and its finalize answers
+every drug partial.
+
+The clock starts once the upload has been received; in the ASGI app time
+spent queued for a process-pool slot counts against it. Deadlines use
+time.monotonic(), which is system-wide, so they keep their meaning when
+handed to a worker process on the same host.
+
+Environment:
+    PHARMAGUARD_ANALYSIS_DEADLINE      default budget in seconds (default: 30; 0 = none)
+    PHARMAGUARD_ANALYSIS_DEADLINE_MAX  largest budget a request may ask for (default: 120)
+"""
+
+import os
+import time
+
+# ──────────────────────────────────────────────
+# Config
+# ──────────────────────────────────────────────
+ANALYSIS_DEADLINE     = float(os.environ.get("PHARMAGUARD_ANALYSIS_DEADLINE", 30))
+ANALYSIS_DEADLINE_MAX = float(os.environ.get("PHARMAGUARD_ANALYSIS_DEADLINE_MAX", 120))
+DEADLINE_CHECK_LINES  = 4096
+
+PARTIAL_HEADERS = {"Cache-Control": "no-store", "X-Analysis-Status": "partial"}
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed during `step`."""
+
+    def __init__(self, step: str):
+        super().__init__(f"analysis deadline exceeded during {step}")
+        self.step = step
+
+
+class Deadline:
+    """A time.monotonic() instant by which one request's analysis must be done."""
+
+    def __init__(self, seconds: float):
+        self.budget  = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def check(self, step: str) -> None:
+        if time.monotonic() >= self.expires:
+            raise DeadlineExceeded(step)
+
+
+def request_deadline(deadline_ms: str | None) -> tuple:
+    """
+    The Deadline for a request from its `deadline_ms` value (None or "" for
+    the default). Returns (deadline or None, None) or (None, (error_payload, status)).
+    """
+    value = (deadline_ms or "").strip()
+    if not value:
+        return (Deadline(ANALYSIS_DEADLINE) if ANALYSIS_DEADLINE > 0 else None), None
+    try:
+        seconds = float(value) / 1000
+    except ValueError:
+        seconds = 0.0
+    if not seconds > 0:
+        return None, ({"error": "deadline_ms must be a positive number of milliseconds."}, 400)
+    return Deadline(min(seconds, ANALYSIS_DEADLINE_MAX)), None
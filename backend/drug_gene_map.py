@@ -1,8 +1,9 @@
-DRUG_GENE_MAP = {
-    "CODEINE": ["CYP2D6"],
-    "WARFARIN": ["CYP2C9"],
-    "CLOPIDOGREL": ["CYP2C19"],
-    "SIMVASTATIN": ["SLCO1B1"],
-    "AZATHIOPRINE": ["TPMT"],
-    "FLUOROURACIL": ["DPYD"]
-}
\ No newline at end of file
+"""
+drug_gene_map.py — PharmaGuard
+Drug → pharmacogene map. The data lives in the knowledge-base file
+(see knowledge_base.py); this name is a live view of the current version.
+"""
+
+from knowledge_base import LiveTable
+
+DRUG_GENE_MAP = LiveTable("drug_gene_map")
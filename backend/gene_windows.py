@@ -0,0 +1,52 @@
+"""
+gene_windows.py — PharmaGuard
+Genomic windows around the supported pharmacogenes.
+
+Compiled from the knowledge base's `gene_windows` section (GRCh38, padded
+to include upstream promoter variants such as CYP2C19*17). Used by the
+VCF parser to discard records by CHROM/POS before INFO is touched, and to
+stop reading coordinate-sorted files once past the last window.
+"""
+
+import bisect
+
+from star_caller import normalise_chrom
+
+
+class GeneWindows:
+    """Per-chromosome sorted interval table with O(log n) containment checks."""
+
+    def __init__(self, spec: dict):
+        self.assembly = spec.get("assembly", "GRCh38")
+        by_chrom = {}
+        for gene, w in spec.get("genes", {}).items():
+            chrom = normalise_chrom(str(w["chrom"]))
+            by_chrom.setdefault(chrom, []).append((int(w["start"]), int(w["end"]), gene.upper()))
+
+        self.windows = {c: sorted(ws) for c, ws in by_chrom.items()}
+
+        # Overlapping windows are merged so containment is a single bisect.
+        self._merged = {}
+        for chrom, ws in self.windows.items():
+            merged = []
+            for start, end, _ in ws:
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._merged[chrom] = ([m[0] for m in merged], [m[1] for m in merged])
+
+        self.last_end = {c: ends[-1] for c, (_, ends) in self._merged.items()}
+        self.chroms   = frozenset(self.windows)
+
+    def __bool__(self) -> bool:
+        return bool(self.windows)
+
+    def contains(self, chrom: str, pos: int) -> bool:
+        """`chrom` must already be normalised (see star_caller.normalise_chrom)."""
+        merged = self._merged.get(chrom)
+        if merged is None:
+            return False
+        starts, ends = merged
+        i = bisect.bisect_right(starts, pos) - 1
+        return i >= 0 and pos <= ends[i]
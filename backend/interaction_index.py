@@ -0,0 +1,96 @@
+"""
+interaction_index.py — PharmaGuard
+Precomputed index over gene-mediated drug-interaction rules.
+
+Rules are tuples in one of two shapes:
+
+    (gene, drug_a, drug_b, message)          # pair rule
+    (gene, (drug_a, drug_b, drug_c), message) # N-way rule
+
+Every drug mentioned by a rule is given one bit, and every rule stores the
+bitmask of the drugs it needs. Each rule is filed under a single "anchor"
+drug (the one with the fewest rules at build time), so checking a
+medication list only looks at the rules anchored on drugs actually present
+and tests each candidate with one mask comparison — the cost follows the
+matched/candidate rules, not the size of the table.
+"""
+
+
+def _normalise_rule(rule: tuple) -> tuple:
+    if len(rule) == 4:
+        gene, drug_a, drug_b, message = rule
+        drugs = (drug_a, drug_b)
+    elif len(rule) == 3 and not isinstance(rule[1], str):
+        gene, drugs, message = rule
+    else:
+        raise ValueError(f"Malformed interaction rule: {rule!r}")
+    drugs = tuple(dict.fromkeys(d.strip().upper() for d in drugs))
+    if len(drugs) < 2:
+        raise ValueError(f"Interaction rule needs at least two drugs: {rule!r}")
+    return gene.strip().upper(), drugs, message
+
+
+class InteractionIndex:
+    """Drug → rule index with bitset matching for multi-drug rules."""
+
+    def __init__(self, rules):
+        self.rules     = [_normalise_rule(r) for r in rules]
+        self.drug_bits = {}
+        self.masks     = []
+        self.by_drug   = {}
+
+        for gene, drugs, _ in self.rules:
+            mask = 0
+            for d in drugs:
+                bit = self.drug_bits.get(d)
+                if bit is None:
+                    bit = self.drug_bits[d] = 1 << len(self.drug_bits)
+                mask |= bit
+            self.masks.append(mask)
+
+        for rule_id, (_, drugs, _) in enumerate(self.rules):
+            anchor = min(drugs, key=lambda d: len(self.by_drug.get(d, ())))
+            self.by_drug.setdefault(anchor, []).append(rule_id)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, drug_list) -> list:
+        """Return the ids of all rules fully covered by `drug_list`, in table order."""
+        drug_bits = self.drug_bits
+        present   = [d for d in dict.fromkeys(drug_list) if d in drug_bits]
+        med_mask  = 0
+        for d in present:
+            med_mask |= drug_bits[d]
+
+        matched = []
+        for d in present:
+            for rule_id in self.by_drug.get(d, ()):
+                mask = self.masks[rule_id]
+                if mask & med_mask == mask:
+                    matched.append(rule_id)
+        matched.sort()
+        return matched
+
+    def check(self, drug_list, phenotypes: dict | None = None) -> list:
+        """
+        Return interaction warnings for a medication list.
+
+        When `phenotypes` ({gene: phenotype}) is given, each warning also
+        reports the patient's phenotype for the shared gene and is marked
+        `escalated` only if that phenotype is known and non-Normal.
+        """
+        warnings = []
+        for rule_id in self.match(drug_list):
+            gene, drugs, message = self.rules[rule_id]
+            warning = {
+                "gene":    gene,
+                "drugs":   list(drugs),
+                "message": message,
+            }
+            if phenotypes is not None:
+                phenotype = phenotypes.get(gene, "Normal")
+                warning["patient_phenotype"] = phenotype
+                warning["escalated"]         = phenotype != "Normal"
+            warnings.append(warning)
+        return warnings
@@ -0,0 +1,120 @@
+"""
+json_provider.py — PharmaGuard
+High-performance JSON serialization for the Flask app.
+
+Uses orjson when it is installed and falls back to the standard library
+encoder otherwise, so the app behaves identically in both cases:
+keys are sorted, output is compact UTF-8.
+
+Static text blocks (clinical recommendations, explanation templates) are
+identical across thousands of responses. `static_text()` wraps such a
+string so that its encoded bytes are produced once and spliced into every
+later response verbatim (requires orjson >= 3.9.10 for `orjson.Fragment`;
+older versions and the stdlib fallback simply encode the string).
+
+Flask is imported only when `FastJSONProvider` is first used (or a value
+needs Flask's fallback encoder), so non-Flask callers — the ASGI app,
+batch tools, pool workers — start without it.
+"""
+
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_FRAGMENT = getattr(orjson, "Fragment", None)
+
+HAS_ORJSON    = orjson is not None
+HAS_FRAGMENTS = _FRAGMENT is not None
+
+if HAS_ORJSON:
+    _ORJSON_OPTS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+
+# ──────────────────────────────────────────────
+# Encoding helpers
+# ──────────────────────────────────────────────
+def _stdlib_default(obj):
+    # Types neither encoder handles natively: Flask's rules (dates, Decimal, UUID, ...)
+    from flask.json.provider import DefaultJSONProvider
+    return DefaultJSONProvider.default(obj)
+
+
+def dumps_bytes(obj) -> bytes:
+    """Serialize `obj` to compact, key-sorted UTF-8 JSON bytes."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, default=_stdlib_default, option=_ORJSON_OPTS)
+    return json.dumps(
+        obj,
+        default=_stdlib_default,
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+@lru_cache(maxsize=2048)
+def _encoded_text(text: str):
+    return _FRAGMENT(dumps_bytes(text))
+
+
+def static_text(text: str):
+    """
+    Return a serializer-ready stand-in for a static string.
+
+    With fragment support the string is encoded once per process and the
+    cached bytes are reused; otherwise the string is returned unchanged.
+    Only use this on values that are about to be serialized — the returned
+    object is not a `str`.
+    """
+    if not HAS_FRAGMENTS or not isinstance(text, str):
+        return text
+    return _encoded_text(text)
+
+
+# ──────────────────────────────────────────────
+# Flask provider
+# ──────────────────────────────────────────────
+def _fast_provider_class():
+    from flask.json.provider import DefaultJSONProvider
+
+    class FastJSONProvider(DefaultJSONProvider):
+        """Flask JSON provider backed by orjson with a stdlib fallback."""
+
+        ensure_ascii = False
+
+        def dumps(self, obj, **kwargs) -> str:
+            if HAS_ORJSON and not kwargs:
+                return dumps_bytes(obj).decode("utf-8")
+            kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+            return super().dumps(obj, **kwargs)
+
+        def loads(self, s, **kwargs):
+            if HAS_ORJSON and not kwargs:
+                return orjson.loads(s)
+            return super().loads(s, **kwargs)
+
+        def response(self, *args, **kwargs):
+            pretty = (self.compact is None and self._app.debug) or self.compact is False
+            if pretty and not HAS_ORJSON:
+                return super().response(*args, **kwargs)
+            obj = self._prepare_response_obj(args, kwargs)
+            if pretty:
+                # Debug output stays with orjson too: the stdlib encoder
+                # cannot serialize the static_text() fragments
+                body = orjson.dumps(obj, default=_stdlib_default, option=_ORJSON_OPTS | orjson.OPT_INDENT_2)
+            else:
+                body = dumps_bytes(obj)
+            return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+    return FastJSONProvider
+
+
+def __getattr__(name: str):
+    if name == "FastJSONProvider":
+        globals()[name] = cls = _fast_provider_class()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,162 @@
+"""
+kb_diff.py — PharmaGuard
+What changed between two knowledge-base versions, at the granularity that
+stored results depend on.
+
+`self_contained(kb)` turns a compiled snapshot back into knowledge-base
+JSON with every external allele table inlined, so an old version can be
+recompiled later without its files (profile_store.py keeps one per
+version). `diff(old, new)` compares two compiled snapshots and returns a
+`KbDiff` of the entries that differ:
+
+    drugs            drug → gene map or drug-specific explanation text changed
+    alleles          gene → alleles whose single-allele phenotype, function
+                     or activity value changed
+    genes            genes whose diplotype → phenotype rules changed
+    drug_phenotypes  drug → gene-level phenotypes whose (risk, confidence)
+                     changed, including changes inherited from the generic table
+    risk_labels      risk labels whose recommendation or action text changed
+    text_genes       genes whose explanation text (gene role) changed
+    text_phenotypes  phenotypes whose explanation text changed
+
+A stored patient × drug result can only change if it touches one of these
+entries; reevaluate.py recomputes exactly those results. Interaction rules
+are payload-level and not stored per drug, so they are only reported.
+Changes to allele definitions or gene windows alter what the parser calls
+from raw genotypes and need the original file (`requires_reparse`).
+"""
+
+import copy
+from dataclasses import dataclass, field
+
+RISK_LABELS = ("Toxic", "Adjust Dosage", "Ineffective", "Safe")
+
+
+@dataclass
+class KbDiff:
+    old_version:         str
+    new_version:         str
+    drugs:               set  = field(default_factory=set)
+    alleles:             dict = field(default_factory=dict)
+    genes:               set  = field(default_factory=set)
+    drug_phenotypes:     dict = field(default_factory=dict)
+    risk_labels:         set  = field(default_factory=set)
+    text_genes:          set  = field(default_factory=set)
+    text_phenotypes:     set  = field(default_factory=set)
+    interactions_changed: bool = False
+    requires_reparse:    bool = False
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.drugs or self.alleles or self.genes or self.drug_phenotypes or self.risk_labels
+            or self.text_genes or self.text_phenotypes or self.interactions_changed
+            or self.requires_reparse
+        )
+
+    def summary(self) -> dict:
+        return {
+            "old_version":          self.old_version,
+            "new_version":          self.new_version,
+            "drugs":                sorted(self.drugs),
+            "alleles":              {g: sorted(a) for g, a in sorted(self.alleles.items())},
+            "genes":                sorted(self.genes),
+            "drug_phenotypes":      {d: sorted(p) for d, p in sorted(self.drug_phenotypes.items())},
+            "risk_labels":          sorted(self.risk_labels),
+            "text_genes":           sorted(self.text_genes),
+            "text_phenotypes":      sorted(self.text_phenotypes),
+            "interactions_changed": self.interactions_changed,
+            "requires_reparse":     self.requires_reparse,
+        }
+
+
+# ──────────────────────────────────────────────
+# Snapshots
+# ──────────────────────────────────────────────
+def self_contained(kb) -> dict:
+    """Knowledge-base JSON for `kb` with external allele tables inlined."""
+    data = copy.deepcopy(kb.raw)
+    for gene, spec in data.get("allele_functions", {}).items():
+        table = kb.allele_engine.tables[gene.strip().upper()]
+        spec.pop("table", None)
+        spec["alleles"] = {
+            allele: {"function": function, "activity": table.activity.get(allele)}
+            for allele, function in table.function.items()
+        }
+    return data
+
+
+# ──────────────────────────────────────────────
+# Diff
+# ──────────────────────────────────────────────
+def _changed_keys(old: dict, new: dict) -> set:
+    return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+
+def _gene_rules(table) -> tuple | None:
+    if table is None:
+        return None
+    if table.method == "activity_score":
+        return (table.method, table.reference, tuple(table._bands))
+    return (table.method, table.reference, tuple(sorted(table._pair_table.items())))
+
+
+def _allele_facts(kb, gene: str, allele: str) -> tuple:
+    table = kb.allele_engine.tables.get(gene)
+    return (
+        kb.infer_phenotype(gene, allele),
+        table.function.get(allele) if table else None,
+        table.activity.get(allele) if table else None,
+    )
+
+
+def diff(old, new) -> KbDiff:
+    d = KbDiff(old.version, new.version)
+
+    # Drug → gene map and drug-specific explanation text
+    d.drugs |= _changed_keys(dict(old.drug_gene_map), dict(new.drug_gene_map))
+    d.drugs |= _changed_keys(
+        {k: dict(v) for k, v in old.drug_consequence.items()},
+        {k: dict(v) for k, v in new.drug_consequence.items()},
+    )
+
+    # Allele-level phenotype / function / activity
+    genes = old.allele_phenotypes.keys() | new.allele_phenotypes.keys() \
+        | old.allele_engine.tables.keys() | new.allele_engine.tables.keys()
+    for gene in genes:
+        alleles = set(old.allele_phenotypes.get(gene, ())) | set(new.allele_phenotypes.get(gene, ()))
+        for kb in (old, new):
+            table = kb.allele_engine.tables.get(gene)
+            if table is not None:
+                alleles |= table.function.keys()
+        changed = {a for a in alleles if _allele_facts(old, gene, a) != _allele_facts(new, gene, a)}
+        if changed:
+            d.alleles[gene] = changed
+        if _gene_rules(old.allele_engine.tables.get(gene)) != _gene_rules(new.allele_engine.tables.get(gene)):
+            d.genes.add(gene)
+
+    # Risk tables: compare each drug's effective table (drug-specific or generic)
+    for drug in old.drug_gene_map.keys() | new.drug_gene_map.keys():
+        changed = _changed_keys(
+            dict(old.drug_risk.get(drug, old.generic_risk)),
+            dict(new.drug_risk.get(drug, new.generic_risk)),
+        )
+        if changed:
+            d.drug_phenotypes[drug] = changed
+
+    # Recommendation and explanation text
+    labels = set(RISK_LABELS) | old.recommendations.keys() | new.recommendations.keys()
+    d.risk_labels = {
+        label for label in labels
+        if old.recommendations.get(label, old.default_recommendation)
+        != new.recommendations.get(label, new.default_recommendation)
+    }
+    d.risk_labels |= _changed_keys(dict(old.risk_action), dict(new.risk_action))
+    d.text_genes       = _changed_keys(dict(old.gene_role), dict(new.gene_role))
+    d.text_phenotypes  = _changed_keys(dict(old.phenotype_desc), dict(new.phenotype_desc))
+
+    d.interactions_changed = old.interaction_rules != new.interaction_rules
+    d.requires_reparse = (
+        old.raw.get("allele_definitions") != new.raw.get("allele_definitions")
+        or old.raw.get("gene_windows") != new.raw.get("gene_windows")
+    )
+    return d
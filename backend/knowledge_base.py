@@ -0,0 +1,280 @@
+"""
+knowledge_base.py — PharmaGuard
+Versioned pharmacogenomic knowledge base, compiled into lookup tables.
+
+All clinical data — drug → gene map, allele → phenotype map, allele-function
+tables, per-drug risk tables, interaction rules, recommendation text and
+explanation templates — lives in a JSON file (default:
+knowledge_base/pharmaguard_kb.json) plus any allele tables it references.
+The file is validated and compiled once into a `KnowledgeBase` snapshot:
+frozen tuples for gene lists, a reverse gene → drugs index, a pre-sorted
+drug list, a prebuilt `InteractionIndex`, an `AlleleFunctionEngine` and the
+`StarAlleleIndex` used to call star alleles from raw genotypes, and the
+`GeneWindows` table used to skip records outside the pharmacogenes.
+
+Hot reload: `current()` re-checks the file's mtime at most every
+KB_RELOAD_SECONDS and, if it changed, compiles the new file and swaps the
+module-level snapshot reference in one assignment. Requests that already
+hold the old snapshot finish with it; a file that fails to load is logged
+and the previous snapshot stays active. Update the file by writing a new
+one and renaming it over the old path so readers never see a partial file.
+
+Environment:
+    PHARMAGUARD_KB                 path to the knowledge-base JSON file
+    PHARMAGUARD_KB_RELOAD_SECONDS  mtime check interval (0 disables reload)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from allele_function import AlleleFunctionEngine, GeneAlleleTable, load_allele_table
+from gene_windows import GeneWindows
+from interaction_index import InteractionIndex
+from star_caller import StarAlleleIndex
+
+log = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────
+# Config
+# ──────────────────────────────────────────────
+KB_SCHEMA         = 1
+DEFAULT_KB_PATH   = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "knowledge_base", "pharmaguard_kb.json")
+KB_PATH           = os.environ.get("PHARMAGUARD_KB", DEFAULT_KB_PATH)
+KB_RELOAD_SECONDS = float(os.environ.get("PHARMAGUARD_KB_RELOAD_SECONDS", "5"))
+
+REQUIRED_SECTIONS = (
+    "kb_version", "drug_gene_map", "allele_phenotypes", "drug_risk",
+    "generic_phenotype_risk", "interactions", "recommendations", "templates",
+)
+
+
+class KnowledgeBaseError(ValueError):
+    """Raised when a knowledge-base file is missing sections or malformed."""
+
+
+# ──────────────────────────────────────────────
+# Compiled snapshot
+# ──────────────────────────────────────────────
+def _upper_keys(d: dict) -> dict:
+    return {k.strip().upper(): v for k, v in d.items()}
+
+
+def _risk_table(table: dict) -> MappingProxyType:
+    return MappingProxyType({pheno: (risk, float(conf)) for pheno, (risk, conf) in table.items()})
+
+
+class KnowledgeBase:
+    """Immutable, compiled view of one knowledge-base file version."""
+
+    def __init__(self, data: dict, source: str = "<memory>", mtime: float | None = None):
+        missing = [s for s in REQUIRED_SECTIONS if s not in data]
+        if missing:
+            raise KnowledgeBaseError(f"Knowledge base is missing sections: {', '.join(missing)}")
+        if data.get("schema", KB_SCHEMA) != KB_SCHEMA:
+            raise KnowledgeBaseError(f"Unsupported knowledge-base schema {data.get('schema')!r}")
+
+        self.version = str(data["kb_version"])
+        self.source  = source
+        self.mtime   = mtime
+        self.raw     = data
+
+        self.drug_gene_map = MappingProxyType({
+            drug: tuple(g.strip().upper() for g in genes)
+            for drug, genes in _upper_keys(data["drug_gene_map"]).items()
+        })
+        self.supported_drugs = tuple(sorted(self.drug_gene_map))
+
+        gene_drugs = {}
+        for drug, genes in self.drug_gene_map.items():
+            for gene in genes:
+                gene_drugs.setdefault(gene, []).append(drug)
+        self.gene_drugs = MappingProxyType({g: tuple(ds) for g, ds in gene_drugs.items()})
+
+        self.allele_phenotypes = MappingProxyType({
+            gene: MappingProxyType({a.strip(): p for a, p in alleles.items()})
+            for gene, alleles in _upper_keys(data["allele_phenotypes"]).items()
+        })
+        self.allele_function_phenotypes = MappingProxyType(
+            dict(data.get("allele_function_phenotypes", {}))
+        )
+        self.allele_engine = AlleleFunctionEngine(self._compile_allele_tables(
+            data.get("allele_functions", {}),
+            os.path.dirname(os.path.abspath(source)) if mtime is not None else os.getcwd(),
+        ))
+
+        self.star_index   = StarAlleleIndex(data.get("allele_definitions", {}))
+        self.gene_windows = GeneWindows(data.get("gene_windows", {}))
+
+        self.drug_risk = MappingProxyType({
+            drug: _risk_table(table) for drug, table in _upper_keys(data["drug_risk"]).items()
+        })
+        self.generic_risk = _risk_table(data["generic_phenotype_risk"])
+
+        self.interaction_rules = tuple(
+            (r["gene"], tuple(r["drugs"]), r["message"]) for r in data["interactions"]
+        )
+        self.interactions = InteractionIndex(self.interaction_rules)
+
+        self.recommendations        = MappingProxyType(dict(data["recommendations"]))
+        self.default_recommendation = data.get(
+            "default_recommendation",
+            "Consult current CPIC guidelines for dosing recommendations specific to this genetic variant.",
+        )
+
+        templates = data["templates"]
+        self.gene_role        = MappingProxyType(_upper_keys(templates.get("gene_role", {})))
+        self.phenotype_desc   = MappingProxyType({
+            k: tuple(v) for k, v in templates.get("phenotype_desc", {}).items()
+        })
+        self.drug_consequence = MappingProxyType({
+            drug: MappingProxyType(table)
+            for drug, table in _upper_keys(templates.get("drug_consequence", {})).items()
+        })
+        self.risk_action      = MappingProxyType(dict(templates.get("risk_action", {})))
+
+    @staticmethod
+    def _compile_allele_tables(specs: dict, base_dir: str) -> dict:
+        tables = {}
+        for gene, spec in _upper_keys(specs).items():
+            alleles = dict(spec.get("alleles", {}))
+            if "table" in spec:
+                alleles.update(load_allele_table(os.path.join(base_dir, spec["table"])))
+            tables[gene] = GeneAlleleTable(gene, spec, alleles)
+        return tables
+
+    def __repr__(self) -> str:
+        return f"<KnowledgeBase {self.version} drugs={len(self.drug_gene_map)} source={self.source!r}>"
+
+    def infer_phenotype(self, gene: str, star_allele: str) -> str:
+        """Single-allele phenotype: explicit map first, then the allele's function class."""
+        gene, star_allele = gene.upper(), star_allele.strip()
+        phenotype = self.allele_phenotypes.get(gene, {}).get(star_allele)
+        if phenotype is None:
+            phenotype = self.allele_engine.allele_phenotype(
+                gene, star_allele, self.allele_function_phenotypes
+            )
+        return phenotype or "Normal"
+
+    def drug_listing(self) -> dict:
+        """
+        /api/drugs payload: the supported drugs, each drug's genes, and what
+        identifies a record as belonging to a gene — windows, defining
+        rsIDs and positions — so clients can drop other records before
+        uploading (frontend/src/vcfFilter.worker.js).
+        """
+        genes = {}
+
+        def entry(gene: str) -> dict:
+            return genes.setdefault(gene, {"windows": [], "rsids": [], "positions": []})
+
+        for gene in self.gene_drugs:
+            entry(gene)
+        for chrom, windows in self.gene_windows.windows.items():
+            for start, end, gene in windows:
+                entry(gene)["windows"].append([chrom, start, end])
+        for dv in self.star_index.by_pos.values():
+            entry(dv.gene)["positions"].append(f"{dv.chrom}:{dv.pos}")
+            if dv.key.lower().startswith("rs"):
+                entry(dv.gene)["rsids"].append(dv.key.lower())
+        return {
+            "supported_drugs": self.supported_drugs,
+            "drug_genes":      {drug: list(g) for drug, g in self.drug_gene_map.items()},
+            "gene_filter":     genes,
+        }
+
+    def info(self) -> dict:
+        return {
+            "kb_version":        self.version,
+            "source":            os.path.basename(self.source),
+            "drugs":             len(self.drug_gene_map),
+            "genes":             len(self.allele_phenotypes),
+            "allele_phenotypes": sum(len(a) for a in self.allele_phenotypes.values()),
+            "allele_functions":  self.allele_engine.allele_count(),
+            "defining_variants": len(self.star_index),
+            "interaction_rules": len(self.interactions),
+        }
+
+
+# ──────────────────────────────────────────────
+# Loading and hot reload
+# ──────────────────────────────────────────────
+def load(path: str = KB_PATH) -> KnowledgeBase:
+    """Read, validate and compile a knowledge-base file."""
+    mtime = os.stat(path).st_mtime
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return KnowledgeBase(data, source=path, mtime=mtime)
+
+
+_lock        = threading.Lock()
+_current     = load(KB_PATH)
+_next_check  = time.monotonic() + KB_RELOAD_SECONDS
+
+
+def reload(path: str | None = None, force: bool = False) -> KnowledgeBase:
+    """
+    Recompile the knowledge base if its file changed (or `force` is set)
+    and atomically make it the current snapshot. On failure the previous
+    snapshot is kept and returned.
+    """
+    global _current
+    with _lock:
+        path = path or _current.source
+        try:
+            if not force and os.stat(path).st_mtime == _current.mtime and path == _current.source:
+                return _current
+            fresh = load(path)
+        except Exception as e:
+            log.error(f"Knowledge base reload failed, keeping {_current.version}: {e}")
+            return _current
+        if fresh.version != _current.version:
+            log.info(f"Knowledge base {_current.version} -> {fresh.version}")
+        _current = fresh
+        return _current
+
+
+def current() -> KnowledgeBase:
+    """Return the active snapshot, reloading it first if the file changed."""
+    global _next_check
+    if KB_RELOAD_SECONDS > 0 and time.monotonic() >= _next_check:
+        _next_check = time.monotonic() + KB_RELOAD_SECONDS
+        return reload()
+    return _current
+
+
+def set_current(kb: KnowledgeBase) -> None:
+    """Install an already compiled snapshot (used by tools and tests)."""
+    global _current
+    with _lock:
+        _current = kb
+
+
+class LiveTable(Mapping):
+    """
+    Read-only mapping that always reflects the current snapshot.
+
+    Backs the legacy module-level names (DRUG_GENE_MAP, DRUG_RISK_MAP, ...)
+    so existing imports keep working across reloads. Hot paths should take
+    one `current()` snapshot per request instead.
+    """
+
+    def __init__(self, attr: str):
+        self._attr = attr
+
+    def __getitem__(self, key):
+        return getattr(current(), self._attr)[key]
+
+    def __iter__(self):
+        return iter(getattr(current(), self._attr))
+
+    def __len__(self):
+        return len(getattr(current(), self._attr))
+
+    def __repr__(self) -> str:
+        return f"LiveTable({self._attr!r})"
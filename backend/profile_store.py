@@ -0,0 +1,385 @@
+"""
+profile_store.py — PharmaGuard
+Persistent store of parsed pharmacogenomic profiles (SQLite).
+
+A patient's genotype does not change, so once a VCF has been parsed its
+variants and per-gene calls are kept, keyed by (patient_id, file hash).
+Later drug queries for that patient are answered from the store without
+an upload, and re-uploading an identical file skips parsing.
+
+Each profile records the knowledge-base version it was parsed under;
+variants parsed under a different version are not reused (star-allele
+calls and phenotypes come from the knowledge base). Per-drug results are
+stored alongside, tagged with the version that produced them, and small
+index tables (alleles and gene phenotypes per profile) let reevaluate.py
+find exactly the results a knowledge-base change affects. A
+self-contained copy of every knowledge-base version that produced stored
+data is kept so the change can be diffed later.
+
+The store holds patient genotypes, so it is off unless a database path
+is configured, and the endpoints that read or delete stored profiles
+(/api/patients/<id>, /api/patients/<id>/analyze) answer only requests
+carrying the configured X-Patient-Token; without a token they stay shut.
+Writes need the token too: an upload with a patient_id but without it
+is analysed and not stored, so it cannot replace the patient's profile.
+
+Environment:
+    PHARMAGUARD_PROFILE_DB      database path (default: none — the store
+                                is disabled; "off" also disables it)
+    PHARMAGUARD_PATIENT_TOKEN   value X-Patient-Token must carry for the
+                                patient endpoints (default: none — they
+                                answer 403)
+"""
+
+import hmac
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from analysis import call_genes, select_primary_variant
+from allele_function import split_copies
+from json_provider import dumps_bytes
+from kb_diff import self_contained
+from shared_cache import file_hash
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - optional dependency
+    import json
+    _loads = json.loads
+
+PROFILE_DB           = os.environ.get("PHARMAGUARD_PROFILE_DB", "")
+PATIENT_TOKEN        = os.environ.get("PHARMAGUARD_PATIENT_TOKEN", "")
+PATIENT_TOKEN_HEADER = "X-Patient-Token"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    patient_id  TEXT NOT NULL,
+    file_hash   TEXT NOT NULL,
+    kb_version  TEXT NOT NULL,
+    stored_at   TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    variants    BLOB NOT NULL,
+    genes       BLOB NOT NULL,
+    PRIMARY KEY (patient_id, file_hash)
+);
+CREATE INDEX IF NOT EXISTS profiles_by_patient ON profiles (patient_id, updated_at);
+
+CREATE TABLE IF NOT EXISTS profile_alleles (
+    patient_id  TEXT NOT NULL,
+    file_hash   TEXT NOT NULL,
+    gene        TEXT NOT NULL,
+    allele      TEXT NOT NULL,
+    PRIMARY KEY (patient_id, file_hash, gene, allele)
+);
+CREATE INDEX IF NOT EXISTS profile_alleles_by_allele ON profile_alleles (gene, allele);
+
+CREATE TABLE IF NOT EXISTS profile_genes (
+    patient_id  TEXT NOT NULL,
+    file_hash   TEXT NOT NULL,
+    gene        TEXT NOT NULL,
+    phenotype   TEXT NOT NULL,
+    PRIMARY KEY (patient_id, file_hash, gene)
+);
+CREATE INDEX IF NOT EXISTS profile_genes_by_phenotype ON profile_genes (gene, phenotype);
+
+CREATE TABLE IF NOT EXISTS results (
+    patient_id   TEXT NOT NULL,
+    file_hash    TEXT NOT NULL,
+    drug         TEXT NOT NULL,
+    kb_version   TEXT NOT NULL,
+    risk_label   TEXT NOT NULL,
+    primary_gene TEXT NOT NULL,
+    phenotype    TEXT NOT NULL,
+    result       BLOB NOT NULL,
+    PRIMARY KEY (patient_id, file_hash, drug)
+);
+CREATE INDEX IF NOT EXISTS results_by_drug    ON results (drug);
+CREATE INDEX IF NOT EXISTS results_by_label   ON results (risk_label);
+CREATE INDEX IF NOT EXISTS results_by_gene    ON results (primary_gene, phenotype);
+CREATE INDEX IF NOT EXISTS results_by_version ON results (kb_version);
+
+CREATE TABLE IF NOT EXISTS kb_snapshots (
+    kb_version  TEXT PRIMARY KEY,
+    data        BLOB NOT NULL
+);
+"""
+
+
+def gene_profile(variants: list, kb) -> dict:
+    """{gene: {diplotype, phenotype, activity_score, primary_allele}} for stored variants."""
+    genes = {}
+    for gene, call in call_genes(variants, kb).items():
+        primary = select_primary_variant([v for v in variants if v["gene"] == gene])
+        genes[gene] = {
+            "diplotype":      call.diplotype,
+            "phenotype":      call.phenotype,
+            "activity_score": call.activity_score,
+            "primary_allele": primary["allele"] if primary else None,
+        }
+    return genes
+
+
+class ProfileStore:
+    """Thread-safe SQLite profile store; one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path   = path
+        self._local = threading.local()
+        self._known_kb_versions = set()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── writes ────────────────────────────────
+    def save(self, patient_id: str, file_hash: str, variants: list, kb) -> dict:
+        """Store (or replace) a parsed profile; returns its per-gene calls."""
+        now   = datetime.now(timezone.utc).isoformat()
+        genes = gene_profile(variants, kb)
+        key   = (patient_id, file_hash)
+        alleles = {(v["gene"], v["allele"]) for v in variants}
+        alleles |= {(gene, split_copies(allele)[0]) for gene, allele in alleles}
+        with self._conn() as conn:
+            self._remember_kb(conn, kb)
+            conn.execute(
+                """
+                INSERT INTO profiles (patient_id, file_hash, kb_version, stored_at, updated_at, variants, genes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (patient_id, file_hash) DO UPDATE SET
+                    kb_version = excluded.kb_version,
+                    updated_at = excluded.updated_at,
+                    variants   = excluded.variants,
+                    genes      = excluded.genes
+                """,
+                (*key, kb.version, now, now, dumps_bytes(variants), dumps_bytes(genes)),
+            )
+            conn.execute("DELETE FROM profile_alleles WHERE patient_id = ? AND file_hash = ?", key)
+            conn.executemany(
+                "INSERT INTO profile_alleles VALUES (?, ?, ?, ?)",
+                [(*key, gene, allele) for gene, allele in sorted(alleles)],
+            )
+            conn.execute("DELETE FROM profile_genes WHERE patient_id = ? AND file_hash = ?", key)
+            conn.executemany(
+                "INSERT INTO profile_genes VALUES (?, ?, ?, ?)",
+                [(*key, gene, call["phenotype"]) for gene, call in genes.items()],
+            )
+        return genes
+
+    def save_results(self, patient_id: str, file_hash: str, results: list, genes: dict, kb) -> None:
+        """
+        Store per-drug results (build_response dicts) produced under `kb`.
+        The version lives in its own column only, so re-tagging an
+        unaffected result is a plain UPDATE; results() puts it back.
+        """
+        rows = []
+        for r in results:
+            r    = {k: v for k, v in r.items() if k != "knowledge_base_version"}
+            gene = r["pharmacogenomic_profile"]["primary_gene"]
+            rows.append((
+                patient_id, file_hash, r["drug"], kb.version,
+                r["risk_assessment"]["risk_label"], gene,
+                genes.get(gene, {}).get("phenotype", "Normal"),
+                dumps_bytes(r),
+            ))
+        with self._conn() as conn:
+            self._remember_kb(conn, kb)
+            conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_results(self, keys: list) -> None:
+        """Drop stored results by (patient_id, file_hash, drug)."""
+        with self._conn() as conn:
+            conn.executemany("DELETE FROM results WHERE patient_id = ? AND file_hash = ? AND drug = ?", keys)
+
+    def retag(self, old_version: str, new_version: str, profiles: bool = True) -> tuple:
+        """
+        Mark everything still tagged `old_version` as valid under
+        `new_version` (used once the affected rows have been recomputed).
+        Returns (results, profiles) rows updated.
+        """
+        with self._conn() as conn:
+            n_results = conn.execute(
+                "UPDATE results SET kb_version = ? WHERE kb_version = ?", (new_version, old_version),
+            ).rowcount
+            n_profiles = conn.execute(
+                "UPDATE profiles SET kb_version = ? WHERE kb_version = ?", (new_version, old_version),
+            ).rowcount if profiles else 0
+        return n_results, n_profiles
+
+    def load_or_parse(self, patient_id: str, filepath: str, kb, parse, digest: str | None = None) -> tuple:
+        """
+        (file hash, per-gene calls, variants) for this file: from the store,
+        or `parse(filepath)` saved for next time. Pass `digest` if the file
+        hash is already known.
+        """
+        digest = digest or file_hash(filepath)
+        row    = self._conn().execute(
+            "SELECT variants, genes FROM profiles WHERE patient_id = ? AND file_hash = ? AND kb_version = ?",
+            (patient_id, digest, kb.version),
+        ).fetchone()
+        if row is not None:
+            return digest, _loads(row["genes"]), _loads(row["variants"])
+        variants = parse(filepath)
+        return digest, self.save(patient_id, digest, variants, kb), variants
+
+    def _remember_kb(self, conn, kb) -> None:
+        if kb.version in self._known_kb_versions:
+            return
+        conn.execute(
+            "INSERT OR IGNORE INTO kb_snapshots (kb_version, data) VALUES (?, ?)",
+            (kb.version, dumps_bytes(self_contained(kb))),
+        )
+        self._known_kb_versions.add(kb.version)
+
+    def delete(self, patient_id: str) -> int:
+        with self._conn() as conn:
+            for table in ("results", "profile_alleles", "profile_genes"):
+                conn.execute(f"DELETE FROM {table} WHERE patient_id = ?", (patient_id,))
+            return conn.execute("DELETE FROM profiles WHERE patient_id = ?", (patient_id,)).rowcount
+
+    # ── reads ─────────────────────────────────
+    def get(self, patient_id: str, file_hash: str | None = None) -> dict | None:
+        """A stored profile — the most recently updated one unless `file_hash` is given."""
+        if file_hash:
+            row = self._conn().execute(
+                "SELECT * FROM profiles WHERE patient_id = ? AND file_hash = ?",
+                (patient_id, file_hash),
+            ).fetchone()
+        else:
+            row = self._conn().execute(
+                "SELECT * FROM profiles WHERE patient_id = ? ORDER BY updated_at DESC LIMIT 1",
+                (patient_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "patient_id":        row["patient_id"],
+            "file_hash":         row["file_hash"],
+            "kb_version":        row["kb_version"],
+            "stored_at":         row["stored_at"],
+            "updated_at":        row["updated_at"],
+            "genes":             _loads(row["genes"]),
+            "detected_variants": _loads(row["variants"]),
+        }
+
+    def results(self, patient_id: str, file_hash: str) -> list:
+        """Stored per-drug results for one profile, each tagged with its knowledge-base version."""
+        rows = self._conn().execute(
+            "SELECT kb_version, result FROM results WHERE patient_id = ? AND file_hash = ? ORDER BY drug",
+            (patient_id, file_hash),
+        ).fetchall()
+        return [{**_loads(r["result"]), "knowledge_base_version": r["kb_version"]} for r in rows]
+
+    def kb_snapshot(self, kb_version: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT data FROM kb_snapshots WHERE kb_version = ?", (kb_version,),
+        ).fetchone()
+        return _loads(row["data"]) if row else None
+
+    def stored_versions(self) -> dict:
+        """{kb_version: stored result count}."""
+        rows = self._conn().execute("SELECT kb_version, COUNT(*) AS n FROM results GROUP BY kb_version")
+        return {r["kb_version"]: r["n"] for r in rows}
+
+    def affected_results(self, kb_version: str, d, drug_genes: dict) -> set:
+        """
+        (patient_id, file_hash, drug) of results stored under `kb_version`
+        that a knowledge-base diff (kb_diff.KbDiff) can change. `drug_genes`
+        maps each drug to the genes it depends on in either version.
+        """
+        conn = self._conn()
+        keys = set()
+
+        def add(sql: str, *params) -> None:
+            keys.update(tuple(r) for r in conn.execute(sql, (kb_version, *params)))
+
+        base = "SELECT r.patient_id, r.file_hash, r.drug FROM results r"
+        for drug in d.drugs:
+            add(f"{base} WHERE r.kb_version = ? AND r.drug = ?", drug)
+        for label in d.risk_labels:
+            add(f"{base} WHERE r.kb_version = ? AND r.risk_label = ?", label)
+        for gene in d.text_genes:
+            add(f"{base} WHERE r.kb_version = ? AND r.primary_gene = ?", gene)
+        for phenotype in d.text_phenotypes:
+            add(f"{base} WHERE r.kb_version = ? AND r.phenotype = ?", phenotype)
+
+        for drug, genes in drug_genes.items():
+            # Diplotype rules also decide the reference call of genes with no
+            # variants, so a rule change touches every result for the drug.
+            if d.genes & set(genes):
+                add(f"{base} WHERE r.kb_version = ? AND r.drug = ?", drug)
+                continue
+            for gene in genes:
+                for allele in d.alleles.get(gene, ()):
+                    add(
+                        f"{base} JOIN profile_alleles a USING (patient_id, file_hash) "
+                        "WHERE r.kb_version = ? AND r.drug = ? AND a.gene = ? AND a.allele = ?",
+                        drug, gene, allele,
+                    )
+                for phenotype in d.drug_phenotypes.get(drug, ()):
+                    add(
+                        f"{base} JOIN profile_genes g USING (patient_id, file_hash) "
+                        "WHERE r.kb_version = ? AND r.drug = ? AND g.gene = ? AND g.phenotype = ?",
+                        drug, gene, phenotype,
+                    )
+        return keys
+
+    def affected_profiles(self, kb_version: str, d) -> list:
+        """(patient_id, file_hash) of profiles under `kb_version` whose calls a diff can change."""
+        conn = self._conn()
+        keys = set()
+        for gene in d.genes:
+            keys.update(tuple(r) for r in conn.execute(
+                "SELECT p.patient_id, p.file_hash FROM profiles p JOIN profile_genes g USING (patient_id, file_hash) "
+                "WHERE p.kb_version = ? AND g.gene = ?", (kb_version, gene),
+            ))
+        for gene, alleles in d.alleles.items():
+            for allele in alleles:
+                keys.update(tuple(r) for r in conn.execute(
+                    "SELECT p.patient_id, p.file_hash FROM profiles p JOIN profile_alleles a USING (patient_id, file_hash) "
+                    "WHERE p.kb_version = ? AND a.gene = ? AND a.allele = ?", (kb_version, gene, allele),
+                ))
+        return sorted(keys)
+
+    def file_hashes(self, patient_id: str) -> list:
+        rows = self._conn().execute(
+            "SELECT file_hash FROM profiles WHERE patient_id = ? ORDER BY updated_at DESC",
+            (patient_id,),
+        ).fetchall()
+        return [r["file_hash"] for r in rows]
+
+
+def open_store(path: str | None = PROFILE_DB) -> ProfileStore | None:
+    if not path or path.lower() == "off":
+        return None
+    return ProfileStore(path)
+
+
+profiles = open_store()
+
+
+def access_error(token: str | None) -> tuple | None:
+    """
+    None if a request carrying `token` (its X-Patient-Token header) may
+    read, write or delete stored profiles, else (error_payload, status).
+    Uploads without it are analysed but not stored.
+    """
+    if profiles is None:
+        return {"error": "Patient profile store is disabled."}, 404
+    if not PATIENT_TOKEN:
+        return {"error": "Patient endpoints are disabled: no PHARMAGUARD_PATIENT_TOKEN is configured."}, 403
+    if not hmac.compare_digest((token or "").encode(), PATIENT_TOKEN.encode()):
+        return {"error": f"Missing or wrong {PATIENT_TOKEN_HEADER}."}, 403
+    return None
@@ -0,0 +1,303 @@
+"""
+profiling.py — PharmaGuard
+Opt-in per-request profiling: cProfile plus the tracemalloc peak for one
+request, and an aggregated hot-function report over recent requests.
+
+    PHARMAGUARD_PROFILING=header   profile requests that send
+                                   `X-Profile: 1` (or the configured token)
+    PHARMAGUARD_PROFILING=all      profile a PHARMAGUARD_PROFILING_SAMPLE
+                                   share of requests
+    off (default)                  nothing is installed: no hooks, no
+                                   header checks, and the admin endpoints
+                                   answer 404
+
+A profiled response carries X-Profile-Id, X-Profile-Wall-Ms,
+X-Profile-Cpu-Ms and X-Profile-Peak-KB. The full record is available from
+the admin endpoints:
+
+    GET /api/admin/profiles?top=20&sort=own|cumulative   hot functions
+                                                         across recent requests
+    GET /api/admin/profiles/<id>?top=50                  one request
+
+Each record also splits the time into pipeline phases (parse, analysis,
+explain, encode, compress — the cumulative time of the functions in
+PHASES); wall time well above CPU time points at I/O or waiting.
+
+tracemalloc is process-wide, so one request per process is profiled at a
+time; a request that asks while another is being profiled is served
+normally and answered `X-Profile: busy`. In the ASGI app the profiled
+span is the process-pool job (parse, analysis, encoding, compression),
+measured inside the worker.
+
+Records keep each request's PROFILE_ENTRIES hottest functions, so the
+aggregated report is exact for the functions that matter and a lower
+bound for the long tail.
+
+Environment:
+    PHARMAGUARD_PROFILING          off | header | all (default: off)
+    PHARMAGUARD_PROFILING_TOKEN    value X-Profile must carry, for profiled
+                                   requests and the admin endpoints
+                                   (default: none — X-Profile: 1, open report)
+    PHARMAGUARD_PROFILING_SAMPLE   share of requests profiled in `all` mode (default: 1.0)
+    PHARMAGUARD_PROFILING_KEEP     recent request profiles kept (default: 100)
+"""
+
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+# ──────────────────────────────────────────────
+# Config
+# ──────────────────────────────────────────────
+PROFILING        = os.environ.get("PHARMAGUARD_PROFILING", "off").lower() or "off"
+PROFILING_TOKEN  = os.environ.get("PHARMAGUARD_PROFILING_TOKEN", "")
+PROFILING_SAMPLE = float(os.environ.get("PHARMAGUARD_PROFILING_SAMPLE", 1.0))
+PROFILING_KEEP   = int(os.environ.get("PHARMAGUARD_PROFILING_KEEP", 100))
+PROFILE_HEADER   = "X-Profile"
+PROFILE_ENTRIES  = 150
+REPORT_TOP_MAX   = 500
+ADMIN_PREFIX     = "/api/admin/"
+
+if PROFILING not in ("off", "header", "all"):
+    raise ValueError(f"PHARMAGUARD_PROFILING must be off, header or all, not {PROFILING!r}")
+ENABLED = PROFILING != "off"
+
+# phase → (file, function) whose cumulative time is that phase
+PHASES = {
+    "parse":    ("vcf_parser.py",   "parse_vcf"),
+    "analysis": ("analysis.py",     "analyze_variants"),
+    "explain":  ("llm_explain.py",  "explain"),
+    "encode":   ("json_provider.py", "dumps_bytes"),
+    "compress": ("compression.py",  "compress_bytes"),
+}
+_PHASE_OF = {where: phase for phase, where in PHASES.items()}
+
+# One profiled request per process: tracemalloc and its peak are process-wide
+_slot = threading.Lock()
+
+
+def wanted(header_value: str | None) -> bool:
+    """Should this request be profiled? `header_value` is its X-Profile header."""
+    if PROFILING == "all":
+        return random.random() < PROFILING_SAMPLE
+    if PROFILING == "header" and header_value:
+        return header_value == PROFILING_TOKEN if PROFILING_TOKEN else header_value.lower() in ("1", "true", "yes")
+    return False
+
+
+def authorized(header_value: str | None) -> bool:
+    """May this caller read the admin report?"""
+    return not PROFILING_TOKEN or header_value == PROFILING_TOKEN
+
+
+# ──────────────────────────────────────────────
+# One profiled span
+# ──────────────────────────────────────────────
+class RequestProfile:
+    """cProfile + tracemalloc peak + wall/CPU time over one span of work in this thread."""
+
+    def __init__(self):
+        # Imported here, not at module level: nothing profiling-related is
+        # loaded unless a request is actually profiled
+        import cProfile
+        self._profile = cProfile.Profile()
+        self._running = False
+        self.summary  = None
+
+    def start(self) -> bool:
+        """Begin profiling; False (and nothing started) if another span holds the slot."""
+        import tracemalloc
+        if not _slot.acquire(blocking=False):
+            return False
+        self._own_trace = not tracemalloc.is_tracing()
+        if self._own_trace:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        self._running = True
+        self._wall    = time.perf_counter()
+        self._cpu     = time.thread_time()
+        self._profile.enable()
+        return True
+
+    def stop(self) -> dict:
+        """End profiling and summarize (idempotent)."""
+        import tracemalloc
+        if not self._running:
+            return self.summary
+        self._profile.disable()
+        wall = time.perf_counter() - self._wall
+        cpu  = time.thread_time() - self._cpu
+        peak = tracemalloc.get_traced_memory()[1]
+        if self._own_trace:
+            tracemalloc.stop()
+        self._running = False
+        _slot.release()
+
+        phases, functions = _summarize(self._profile)
+        self.summary = {
+            "wall_ms":   round(wall * 1000, 3),
+            "cpu_ms":    round(cpu * 1000, 3),
+            "peak_kb":   round(peak / 1024, 1),
+            "phases":    phases,
+            "functions": functions,
+        }
+        return self.summary
+
+
+def _summarize(profile) -> tuple:
+    """(phases {name: ms}, {function label: [calls, own ms, cumulative ms]} for the hottest entries)."""
+    import pstats
+    phases = {}
+    rows   = []
+    for (filename, lineno, name), (_, ncalls, tottime, cumtime, _) in pstats.Stats(profile).stats.items():
+        base  = os.path.basename(filename)
+        phase = _PHASE_OF.get((base, name))
+        if phase is not None:
+            phases[phase] = phases.get(phase, 0.0) + cumtime * 1000
+        label = name if filename == "~" else f"{base}:{lineno}({name})"
+        rows.append((label, ncalls, tottime * 1000, cumtime * 1000))
+
+    rows.sort(key=lambda r: r[2], reverse=True)
+    hot = rows[:PROFILE_ENTRIES]
+    # plus the heaviest callers, whose own time is small
+    seen = {r[0] for r in hot}
+    hot += [r for r in sorted(rows, key=lambda r: r[3], reverse=True)[:PROFILE_ENTRIES // 3] if r[0] not in seen]
+    functions = {label: [ncalls, round(own, 3), round(cum, 3)] for label, ncalls, own, cum in hot}
+    return {k: round(v, 3) for k, v in phases.items()}, functions
+
+
+def profiled_job(job, *args) -> tuple:
+    """(job(*args), summary or None) — runs a process-pool job under a RequestProfile."""
+    profile = RequestProfile()
+    if not profile.start():
+        return job(*args), None
+    try:
+        result = job(*args)
+    finally:
+        summary = profile.stop()
+    return result, summary
+
+
+# ──────────────────────────────────────────────
+# Recent profiles and the aggregated report
+# ──────────────────────────────────────────────
+class ProfileLog:
+    """The last `keep` request profiles, in memory."""
+
+    def __init__(self, keep: int = PROFILING_KEEP):
+        self._records = deque(maxlen=keep)
+        self._lock    = threading.Lock()
+
+    def add(self, summary: dict, method: str, path: str, status: int) -> dict:
+        record = {
+            "id":          uuid.uuid4().hex[:16],
+            "method":      method,
+            "path":        path,
+            "status":      status,
+            "profiled_at": datetime.now(timezone.utc).isoformat(),
+            **summary,
+        }
+        with self._lock:
+            self._records.append(record)
+        return record
+
+    def get(self, profile_id: str, top: int = 50) -> dict | None:
+        with self._lock:
+            record = next((r for r in self._records if r["id"] == profile_id), None)
+        if record is None:
+            return None
+        return {**record, "functions": _top(
+            ({"function": f, "calls": c, "own_ms": own, "cumulative_ms": cum}
+             for f, (c, own, cum) in record["functions"].items()), top, "own")}
+
+    def report(self, top: int = 20, sort: str = "own") -> dict:
+        """Hot functions summed over the kept profiles, plus a line per request."""
+        with self._lock:
+            records = list(self._records)
+        merged = {}
+        for r in records:
+            for label, (calls, own, cum) in r["functions"].items():
+                m = merged.get(label)
+                if m is None:
+                    m = merged[label] = {"function": label, "calls": 0, "own_ms": 0.0,
+                                         "cumulative_ms": 0.0, "requests": 0}
+                m["calls"]         += calls
+                m["own_ms"]        += own
+                m["cumulative_ms"] += cum
+                m["requests"]      += 1
+        for m in merged.values():
+            m["own_ms"]        = round(m["own_ms"], 3)
+            m["cumulative_ms"] = round(m["cumulative_ms"], 3)
+        return {
+            "mode":      PROFILING,
+            "profiles":  len(records),
+            "sort":      sort,
+            "functions": _top(merged.values(), top, sort),
+            "recent":    [{k: v for k, v in r.items() if k != "functions"} for r in reversed(records)],
+        }
+
+
+def _top(rows, top: int, sort: str) -> list:
+    key = "cumulative_ms" if sort == "cumulative" else "own_ms"
+    return sorted(rows, key=lambda r: r[key], reverse=True)[:max(1, min(top, REPORT_TOP_MAX))]
+
+
+def response_headers(record: dict | None) -> dict:
+    if record is None:
+        return {PROFILE_HEADER: "busy"}
+    return {
+        "X-Profile-Id":      record["id"],
+        "X-Profile-Wall-Ms": str(record["wall_ms"]),
+        "X-Profile-Cpu-Ms":  str(record["cpu_ms"]),
+        "X-Profile-Peak-KB": str(record["peak_kb"]),
+    }
+
+
+request_profiles = ProfileLog() if ENABLED else None
+
+
+# ──────────────────────────────────────────────
+# Flask hooks
+# ──────────────────────────────────────────────
+def _start_request_profile() -> None:
+    from flask import g, request    # Flask-only path
+    if not request.path.startswith(ADMIN_PREFIX) and wanted(request.headers.get(PROFILE_HEADER)):
+        profile = RequestProfile()
+        g.request_profile = profile if profile.start() else None
+
+
+def _finish_request_profile(response):
+    from flask import g, request
+    if "request_profile" not in g:
+        return response
+    profile = g.pop("request_profile")
+    record  = None
+    if profile is not None:
+        record = request_profiles.add(profile.stop(), request.method, request.path, response.status_code)
+    response.headers.update(response_headers(record))
+    return response
+
+
+def _abandon_request_profile(exc) -> None:
+    from flask import g
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        profile.stop()
+
+
+def init_profiling(app) -> None:
+    """
+    Register the per-request hooks — only when profiling is enabled. Call
+    before init_compression so compression is inside the profiled span
+    (after_request hooks run in reverse order of registration).
+    """
+    if not ENABLED:
+        return
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_abandon_request_profile)
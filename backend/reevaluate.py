@@ -0,0 +1,116 @@
+"""
+reevaluate.py — PharmaGuard
+Bring stored results up to date after a knowledge-base change, without
+re-parsing any VCF.
+
+    python reevaluate.py [--db profiles.db] [--dry-run]
+
+Every stored result is tagged with the knowledge-base version that
+produced it. For each older version found in the store, its saved
+snapshot is recompiled and diffed against the current knowledge base
+(kb_diff.py), the index tables in profile_store.py pick out the
+patient × drug results the changed entries can reach, and only those are
+recomputed from the stored variants. Everything else is re-tagged with
+the current version in one UPDATE, so a one-line table change costs a
+handful of indexed queries plus the affected results.
+
+Profiles whose stored calls depend on a changed allele or diplotype rule
+get their per-variant phenotypes and gene calls refreshed as well.
+Changes to allele definitions or gene windows alter what the parser
+calls from raw genotypes; those versions are reported and left alone —
+the files have to be uploaded again.
+"""
+
+import argparse
+import sys
+import time
+
+from analysis import build_response, refresh_phenotypes
+from json_provider import dumps_bytes
+from kb_diff import diff
+from knowledge_base import KnowledgeBase, current as current_kb
+from profile_store import PROFILE_DB, gene_profile, open_store
+
+
+def reevaluate_version(store, old_version: str, kb, dry_run: bool = False) -> dict:
+    """Recompute the results stored under `old_version` that differ under `kb`."""
+    data = store.kb_snapshot(old_version)
+    if data is None:
+        return {"old_version": old_version, "error": "no knowledge-base snapshot stored for this version"}
+    old = KnowledgeBase(data, source=f"<snapshot {old_version}>")
+    d   = diff(old, kb)
+    report = {"diff": d.summary()}
+    if d.requires_reparse:
+        report["skipped"] = "allele definitions or gene windows changed; files must be re-uploaded"
+        return report
+
+    drug_genes = {
+        drug: set(old.drug_gene_map.get(drug, ())) | set(kb.drug_gene_map.get(drug, ()))
+        for drug in old.drug_gene_map.keys() | kb.drug_gene_map.keys()
+    }
+    results  = store.affected_results(old_version, d, drug_genes)
+    profiles = store.affected_profiles(old_version, d)
+    report.update(affected_results=len(results), affected_profiles=len(profiles))
+    if dry_run:
+        return report
+
+    # Refresh stored calls first so recomputed results read current variants
+    for patient_id, digest in profiles:
+        variants = refresh_phenotypes(store.get(patient_id, digest)["detected_variants"], kb)
+        store.save(patient_id, digest, variants, kb)
+
+    by_profile = {}
+    for patient_id, digest, drug in results:
+        by_profile.setdefault((patient_id, digest), []).append(drug)
+
+    removed = []
+    for (patient_id, digest), drugs in by_profile.items():
+        profile  = store.get(patient_id, digest)
+        variants = profile["detected_variants"]
+        if profile["kb_version"] != kb.version:
+            variants = refresh_phenotypes(variants, kb)
+        genes = profile["genes"] if profile["kb_version"] == kb.version else gene_profile(variants, kb)
+        removed += [(patient_id, digest, drug) for drug in drugs if drug not in kb.drug_gene_map]
+        fresh = [build_response(drug, variants, patient_id, kb) for drug in drugs if drug in kb.drug_gene_map]
+        store.save_results(patient_id, digest, fresh, genes, kb)
+    store.delete_results(removed)
+
+    retagged_results, retagged_profiles = store.retag(old_version, kb.version)
+    report.update(removed_results=len(removed), retagged_results=retagged_results,
+                  retagged_profiles=retagged_profiles)
+    return report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Re-evaluate stored PharmaGuard results after a knowledge-base change.")
+    ap.add_argument("--db", default=PROFILE_DB, help="profile store path (default: PHARMAGUARD_PROFILE_DB)")
+    ap.add_argument("--dry-run", action="store_true", help="report the diff and affected counts only")
+    args = ap.parse_args(argv)
+
+    store = open_store(args.db)
+    if store is None:
+        ap.error("no profile store: pass --db or set PHARMAGUARD_PROFILE_DB")
+    kb = current_kb()
+
+    start   = time.perf_counter()
+    reports = {}
+    for version, count in sorted(store.stored_versions().items()):
+        if version == kb.version:
+            continue
+        print(f"[reevaluate] {count} results stored under {version}, current {kb.version}",
+              file=sys.stderr, flush=True)
+        reports[version] = reevaluate_version(store, version, kb, args.dry_run)
+
+    elapsed = time.perf_counter() - start
+    sys.stdout.buffer.write(dumps_bytes({
+        "knowledge_base_version": kb.version,
+        "dry_run":                args.dry_run,
+        "versions":               reports,
+        "elapsed_s":              round(elapsed, 3),
+    }) + b"\n")
+    failed = any("error" in r or "skipped" in r for r in reports.values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+shared_cache.py — PharmaGuard
+Two-tier cache of parsed variants and per-drug results, shared between
+workers and nodes.
+
+Entries are keyed by the uploaded file's content hash (SHA-256 of its
+bytes, the same key as profile_store.py) and the knowledge-base version,
+plus the drug for results:
+
+    <prefix>:v1:<kb version>:<sha256>:variants
+    <prefix>:v1:<kb version>:<sha256>:result:<drug>
+
+The hash is tagged with the parse options that change the variants:
+`+window` for window-mode parses (parse_digest), which skip records,
+and `+<mode>` for the transcript modes (see vcf_parser.py).
+so a repeat upload of the same file is not parsed again and only drugs
+not yet evaluated for it are computed, whichever worker or node the
+request lands on. A new knowledge-base version simply misses; old
+entries age out. A cached result is shared by every patient ID the file
+is uploaded under: its patient_id and timestamp are replaced on each hit.
+
+Lookups go through an in-process L1 (LRU with a byte budget and a short
+TTL) in front of the shared L2. Both hold encoded bytes, never live
+objects, so callers are free to mutate what they get back. Values are
+orjson-encoded and zlib-compressed above CACHE_COMPRESS_BYTES, behind a
+one-byte format tag.
+
+L2 backends, chosen by PHARMAGUARD_CACHE_URL:
+
+    redis://host:6379/0   any server speaking the Redis protocol (needs
+                          the optional `redis` package); entries are
+                          written with SET EX, and eviction beyond the
+                          TTL is the server's maxmemory-policy
+                          (allkeys-lru recommended)
+    memory://             in-process stand-in with the same interface,
+                          TTL and LRU eviction — for single-process
+                          deployments, development and tests
+    "" / off              no cache (default)
+
+A failing L2 never fails a request: errors are logged, the L2 is skipped
+for CACHE_RETRY_SECONDS, and lookups fall back to L1 and recomputation.
+
+Environment:
+    PHARMAGUARD_CACHE_URL          L2 backend (see above)
+    PHARMAGUARD_CACHE_TTL          L2 entry lifetime in seconds (default: 7 days)
+    PHARMAGUARD_CACHE_MAX_BYTES    memory:// byte budget (default: 256 MB)
+    PHARMAGUARD_CACHE_L1_BYTES     per-process L1 byte budget in front of redis://
+                                   (default: 32 MB; 0 disables L1)
+    PHARMAGUARD_CACHE_L1_TTL       L1 entry lifetime in seconds (default: 300)
+    PHARMAGUARD_CACHE_PREFIX       key prefix (default: pharmaguard)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from json_provider import dumps_bytes
+from vcf_parser import VCF_TRANSCRIPTS
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - optional dependency
+    import json
+    _loads = json.loads
+
+log = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────
+# Config
+# ──────────────────────────────────────────────
+CACHE_URL            = os.environ.get("PHARMAGUARD_CACHE_URL", "")
+CACHE_TTL            = int(os.environ.get("PHARMAGUARD_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_BYTES      = int(os.environ.get("PHARMAGUARD_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+CACHE_L1_BYTES       = int(os.environ.get("PHARMAGUARD_CACHE_L1_BYTES", 32 * 1024 * 1024))
+CACHE_L1_TTL         = float(os.environ.get("PHARMAGUARD_CACHE_L1_TTL", 300))
+CACHE_PREFIX         = os.environ.get("PHARMAGUARD_CACHE_PREFIX", "pharmaguard")
+CACHE_COMPRESS_BYTES = 512
+CACHE_RETRY_SECONDS  = 30
+
+_RAW  = b"\x01"
+_ZLIB = b"\x02"
+
+
+def file_hash(filepath: str) -> str:
+    """SHA-256 of the uploaded file's bytes."""
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_digest(digest: str, window_filter: bool) -> str:
+    """Cache identity of a parse of the file `digest`: window-mode parses skip records, so they are keyed apart."""
+    return f"{digest}+window" if window_filter else digest
+
+
+def encode(value) -> bytes:
+    data = dumps_bytes(value)
+    if len(data) >= CACHE_COMPRESS_BYTES:
+        packed = zlib.compress(data, 1)
+        if len(packed) < len(data):
+            return _ZLIB + packed
+    return _RAW + data
+
+
+def decode(blob: bytes):
+    tag, data = blob[:1], blob[1:]
+    if tag == _ZLIB:
+        data = zlib.decompress(data)
+    elif tag != _RAW:
+        raise ValueError(f"unknown cache entry format {tag!r}")
+    return _loads(data)
+
+
+# ──────────────────────────────────────────────
+# Backends
+# ──────────────────────────────────────────────
+class MemoryBackend:
+    """In-process LRU of bytes with a TTL and a byte budget (L1, and the memory:// L2)."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl       = ttl
+        self.bytes     = 0
+        self.evictions = 0
+        self._entries  = OrderedDict()      # key → (expires, blob)
+        self._lock     = threading.Lock()
+
+    def get_many(self, keys: list) -> list:
+        now = time.monotonic()
+        out = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] < now:
+                    self._drop(key)
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                out.append(entry[1] if entry else None)
+        return out
+
+    def set_many(self, items: dict, ttl: float | None = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            for key, blob in items.items():
+                if len(blob) > self.max_bytes:
+                    continue
+                if key in self._entries:
+                    self._drop(key)
+                self._entries[key] = (expires, blob)
+                self.bytes += len(blob)
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        self.bytes -= len(self._entries.pop(key)[1])
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.bytes, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """L2 on a Redis-protocol server (redis-py client; MGET reads, pipelined SET EX writes)."""
+
+    name = "redis"
+
+    def __init__(self, client, ttl: int):
+        self.client = client
+        self.ttl    = ttl
+
+    @classmethod
+    def from_url(cls, url: str, ttl: int) -> "RedisBackend":
+        # Imported on first use: redis-py is optional and slow to import
+        try:
+            import redis
+            from redis.backoff import NoBackoff
+            from redis.retry import Retry
+        except ImportError:  # pragma: no cover - optional dependency
+            raise RuntimeError("PHARMAGUARD_CACHE_URL is a redis:// URL but the 'redis' package is not installed")
+        # Fail fast and let SharedCache back off, rather than retrying inside a request
+        client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0,
+                                      retry=Retry(NoBackoff(), 0))
+        return cls(client, ttl)
+
+    def get_many(self, keys: list) -> list:
+        return self.client.mget(keys)
+
+    def set_many(self, items: dict, ttl: float | None = None) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, blob in items.items():
+            pipe.set(key, blob, ex=int(self.ttl if ttl is None else ttl))
+        pipe.execute()
+
+    def metrics(self) -> dict:
+        return {}
+
+
+# ──────────────────────────────────────────────
+# Two-tier cache
+# ──────────────────────────────────────────────
+class SharedCache:
+    """L1 (in-process) in front of a shared L2 backend; both may be None."""
+
+    def __init__(self, l2, l1: MemoryBackend | None = None, prefix: str = CACHE_PREFIX):
+        self.l1     = l1
+        self.l2     = l2
+        self.prefix = f"{prefix}:v1"
+        self._l2_down_until = 0.0
+        self._lock  = threading.Lock()
+        self.counts = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "writes": 0, "l2_errors": 0}
+
+    def _content(self, digest: str) -> str:
+        # Variant dicts carry transcript details in the non-default parser modes
+        return f"{digest}+{VCF_TRANSCRIPTS}" if VCF_TRANSCRIPTS else digest
+
+    def variants_key(self, digest: str, kb) -> str:
+        return f"{self.prefix}:{kb.version}:{self._content(digest)}:variants"
+
+    def result_key(self, digest: str, drug: str, kb) -> str:
+        return f"{self.prefix}:{kb.version}:{self._content(digest)}:result:{drug}"
+
+    # ── raw tiers ─────────────────────────────
+    def _l2_ok(self) -> bool:
+        return self.l2 is not None and time.monotonic() >= self._l2_down_until
+
+    def _l2_failed(self, e: Exception) -> None:
+        self._l2_down_until = time.monotonic() + CACHE_RETRY_SECONDS
+        self._count("l2_errors")
+        log.warning(f"Shared cache ({self.l2.name}) unavailable, bypassing it for "
+                    f"{CACHE_RETRY_SECONDS}s: {e}")
+
+    def _count(self, name: str, n: int = 1) -> None:
+        if n:
+            with self._lock:
+                self.counts[name] += n
+
+    def get_many(self, keys: list) -> list:
+        """Encoded entries for `keys` (None where missing), filling L1 from L2."""
+        blobs = self.l1.get_many(keys) if self.l1 is not None else [None] * len(keys)
+        self._count("l1_hits", sum(b is not None for b in blobs))
+        missing = [i for i, b in enumerate(blobs) if b is None]
+        if missing and self._l2_ok():
+            try:
+                found = self.l2.get_many([keys[i] for i in missing])
+            except Exception as e:
+                self._l2_failed(e)
+                found = [None] * len(missing)
+            fill = {}
+            for i, blob in zip(missing, found):
+                if blob is not None:
+                    blobs[i] = fill[keys[i]] = blob
+            self._count("l2_hits", len(fill))
+            if fill and self.l1 is not None:
+                self.l1.set_many(fill)
+        self._count("misses", sum(b is None for b in blobs))
+        return blobs
+
+    def set_many(self, values: dict) -> None:
+        """Encode and write `values` ({key: object}) to both tiers."""
+        if not values:
+            return
+        items = {key: encode(value) for key, value in values.items()}
+        if self.l1 is not None:
+            self.l1.set_many(items)
+        if self._l2_ok():
+            try:
+                self.l2.set_many(items)
+            except Exception as e:
+                self._l2_failed(e)
+        self._count("writes", len(items))
+
+    # ── typed access ──────────────────────────
+    def get_variants(self, digest: str, kb) -> list | None:
+        blob = self.get_many([self.variants_key(digest, kb)])[0]
+        return decode(blob) if blob is not None else None
+
+    def put_variants(self, digest: str, kb, variants: list) -> None:
+        self.set_many({self.variants_key(digest, kb): variants})
+
+    def get_results(self, digest: str, drugs: list, kb) -> dict:
+        """{drug: build_response dict} for the drugs already evaluated for this file."""
+        blobs = self.get_many([self.result_key(digest, drug, kb) for drug in drugs])
+        return {drug: decode(blob) for drug, blob in zip(drugs, blobs) if blob is not None}
+
+    def put_results(self, digest: str, results: list, kb) -> None:
+        self.set_many({self.result_key(digest, r["drug"], kb): r for r in results})
+
+    def snapshot(self) -> dict:
+        """The hit/miss/write counters, for counts_since()."""
+        with self._lock:
+            return dict(self.counts)
+
+    def counts_since(self, snapshot: dict) -> dict:
+        now = self.snapshot()
+        return {name: now[name] - snapshot.get(name, 0) for name in now}
+
+    def add_counts(self, counts: dict) -> None:
+        """Fold in counters from another process (the ASGI app's pool workers)."""
+        for name, n in counts.items():
+            if name in self.counts:
+                self._count(name, n)
+
+    def metrics(self) -> dict:
+        counts = self.snapshot()
+        return {
+            "backend": self.l2.name if self.l2 is not None else None,
+            **counts,
+            "l1": self.l1.metrics() if self.l1 is not None else None,
+            "l2": self.l2.metrics() if self.l2 is not None else None,
+        }
+
+
+def open_cache(url: str | None = CACHE_URL) -> SharedCache | None:
+    if not url or url.lower() == "off":
+        return None
+    if url.startswith("memory://"):
+        return SharedCache(MemoryBackend(CACHE_MAX_BYTES, CACHE_TTL))     # already in-process: no L1
+    if not url.startswith(("redis://", "rediss://", "unix://")):
+        raise ValueError(f"Unsupported PHARMAGUARD_CACHE_URL scheme: {url!r}")
+    l1 = MemoryBackend(CACHE_L1_BYTES, CACHE_L1_TTL) if CACHE_L1_BYTES > 0 else None
+    return SharedCache(RedisBackend.from_url(url, CACHE_TTL), l1)
+
+
+cache = open_cache()
@@ -0,0 +1,121 @@
+"""
+star_caller.py — PharmaGuard
+Star-allele calling from raw genotypes, for VCFs without GENE=/STAR=,
+ANN= or CSQ= annotations.
+
+The knowledge base's `allele_definitions` section lists the defining
+variants of each supported star allele (GRCh38 coordinates and rsIDs).
+They are compiled into two hash indexes:
+
+    (chrom, pos, ref, alt) → defining variant
+    rsID                   → defining variant
+
+so each VCF record costs one dict lookup. Observed alt copies are
+collected per gene and assembled into star alleles when the sample is
+finished: the most specific definitions (most defining variants) are
+matched first and consume the copies they use, so a sample carrying both
+CYP2D6 100C>T and 1846G>A is called *4 rather than *10 + *4.
+"""
+
+from typing import NamedTuple
+
+
+class DefiningVariant(NamedTuple):
+    key:   str     # rsID, or chrom:pos:ref:alt when no rsID is known
+    gene:  str
+    chrom: str
+    pos:   int
+    ref:   str
+    alt:   str
+
+
+def normalise_chrom(chrom: str) -> str:
+    chrom = chrom.strip()
+    if chrom[:3].lower() == "chr":
+        chrom = chrom[3:]
+    return chrom.upper()
+
+
+class StarAlleleIndex:
+    """Compiled lookup tables for genotype-based star-allele calling."""
+
+    def __init__(self, spec: dict):
+        self.assembly = spec.get("assembly", "GRCh38")
+        self.by_pos   = {}
+        self.by_rsid  = {}
+        self.alleles  = {}     # gene → [(allele, (variant keys...)), ...] most specific first
+
+        for key, v in spec.get("variants", {}).items():
+            dv = DefiningVariant(
+                key   = key,
+                gene  = v["gene"].strip().upper(),
+                chrom = normalise_chrom(str(v["chrom"])),
+                pos   = int(v["pos"]),
+                ref   = v["ref"].upper(),
+                alt   = v["alt"].upper(),
+            )
+            self.by_pos[(dv.chrom, dv.pos, dv.ref, dv.alt)] = dv
+            if key.lower().startswith("rs"):
+                self.by_rsid[key.lower()] = dv
+
+        known = {dv.key for dv in self.by_pos.values()}
+        for gene, defs in spec.get("alleles", {}).items():
+            gene = gene.strip().upper()
+            compiled = []
+            for allele, keys in defs.items():
+                missing = [k for k in keys if k not in known]
+                if missing:
+                    raise ValueError(f"{gene} {allele}: undefined variants {', '.join(missing)}")
+                compiled.append((allele, tuple(keys)))
+            compiled.sort(key=lambda a: len(a[1]), reverse=True)
+            self.alleles[gene] = compiled
+
+    def __len__(self) -> int:
+        return len(self.by_pos)
+
+    def lookup(self, chrom: str, pos: int, ref: str, alt: str, rsid: str = ".") -> DefiningVariant | None:
+        """Match one ALT allele of a record by position first, then by rsID."""
+        dv = self.by_pos.get((normalise_chrom(chrom), pos, ref.upper(), alt.upper()))
+        if dv is None and rsid and rsid != ".":
+            for rs in rsid.split(";"):
+                dv = self.by_rsid.get(rs.strip().lower())
+                if dv is not None and dv.alt == alt.upper():
+                    break
+                dv = None
+        return dv
+
+    def new_sample(self) -> "SampleGenotypes":
+        return SampleGenotypes(self)
+
+
+class SampleGenotypes:
+    """Accumulates observed defining variants for one sample."""
+
+    def __init__(self, index: StarAlleleIndex):
+        self.index    = index
+        self.observed = {}     # gene → {variant key: copies}
+
+    def __bool__(self) -> bool:
+        return bool(self.observed)
+
+    def add(self, dv: DefiningVariant, copies: int) -> None:
+        gene_obs = self.observed.setdefault(dv.gene, {})
+        gene_obs[dv.key] = min(2, gene_obs.get(dv.key, 0) + copies)
+
+    def call(self) -> list:
+        """
+        Assemble star alleles: [(gene, allele, (variant keys...), copies), ...].
+
+        Observed variants that no definition fully covers are left uncalled.
+        """
+        calls = []
+        for gene, obs in self.observed.items():
+            remaining = dict(obs)
+            for allele, keys in self.index.alleles.get(gene, ()):
+                copies = min(remaining.get(k, 0) for k in keys)
+                if copies <= 0:
+                    continue
+                for k in keys:
+                    remaining[k] -= copies
+                calls.append((gene, allele, keys, copies))
+        return calls
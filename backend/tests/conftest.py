@@ -0,0 +1,56 @@
+"""
+Shared test setup. The backend modules are flat and read their
+configuration at import time, so the path and environment are set here,
+before any test module imports them.
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# No shared cache, profile store, profiling or transcript details unless a test asks
+for name in ("PHARMAGUARD_CACHE_URL", "PHARMAGUARD_PROFILE_DB", "PHARMAGUARD_PROFILING",
+             "PHARMAGUARD_VCF_TRANSCRIPTS"):
+    os.environ.pop(name, None)
+
+SAMPLE_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "22\t42128945\trs3892097\tC\tT\t.\tPASS\tGENE=CYP2D6;STAR=*4\tGT\t0/1\n"
+    "10\t94781859\trs4244285\tG\tA\t.\tPASS\tGENE=CYP2C19;STAR=*2\tGT\t1/1\n"
+)
+
+
+@pytest.fixture
+def sample_vcf() -> bytes:
+    return SAMPLE_VCF.encode()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in a scratch directory: the apps write uploads/ relative to the cwd."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("uploads", exist_ok=True)
+    return tmp_path
+
+
+@pytest.fixture
+def flask_client(workdir):
+    import app
+    return app.app.test_client()
+
+
+@pytest.fixture
+def patient_store(tmp_path, monkeypatch, flask_client):
+    """A profile store behind the Flask app, with the patient token "s3cret"."""
+    import app
+    import profile_store
+    store = profile_store.ProfileStore(str(tmp_path / "profiles.db"))
+    monkeypatch.setattr(profile_store, "profiles", store)
+    monkeypatch.setattr(profile_store, "PATIENT_TOKEN", "s3cret")
+    monkeypatch.setattr(app, "profiles", store)
+    return store
@@ -0,0 +1,67 @@
+"""Every endpoint that parses or analyzes goes through admission control (admission.py)."""
+
+import time
+
+import pytest
+
+import admission
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    monkeypatch.setattr(admission.heavy, "acquire", lambda: (False, "queue_full", 0.0))
+
+
+@pytest.mark.parametrize("method, path", [
+    ("POST", "/api/analyze"),
+    ("POST", "/api/panel"),
+    ("POST", "/api/validate"),
+    ("GET",  "/api/patients/P1/analyze?drug=CODEINE"),
+    ("PUT",  "/api/uploads/u1/chunks/0"),
+    ("POST", "/api/uploads/u1/finalize"),
+])
+def test_heavy_endpoints_are_admission_controlled(flask_client, saturated, method, path):
+    r = flask_client.open(path, method=method)
+    assert r.status_code == 429
+
+
+def test_asgi_upload_session_routes_are_admission_controlled(workdir, saturated, monkeypatch):
+    import asgi_app
+    from starlette.testclient import TestClient
+
+    async def reject():
+        return False, "queue_full", 0.0
+    monkeypatch.setattr(asgi_app.heavy, "acquire", reject)
+    session = asgi_app.uploads.create(asgi_app.current_kb(), "", "s.vcf")
+    client  = TestClient(asgi_app.app)      # no lifespan: the process pool is not needed
+    assert client.put(f"/api/uploads/{session.id}/chunks/0", content=b"x").status_code == 429
+    r = client.post(f"/api/uploads/{session.id}/finalize", data={"drug": "CODEINE", "total_chunks": "1"})
+    assert r.status_code == 429
+
+
+def test_sync_controller_fails_fast_instead_of_holding_threads():
+    assert admission.heavy.max_queue == 0
+    controller = admission.AdmissionController("t", 1, admission.HEAVY_SYNC_QUEUE, 10)
+    assert controller.acquire()[0]
+    start = time.monotonic()
+    assert controller.acquire()[:2] == (False, "queue_full")
+    assert time.monotonic() - start < 1
+
+
+def test_rate_limiter_allows_a_burst_then_rejects():
+    limiter = admission.RateLimiter("t", 0.01, 2)
+    assert [limiter.acquire() for _ in range(3)] == [True, True, False]
+    payload, status, headers = limiter.rejection()
+    assert status == 429 and int(headers["Retry-After"]) >= 1
+    unlimited = admission.RateLimiter("t", 0, 1)
+    assert all(unlimited.acquire() for _ in range(5))
+
+
+def test_upload_session_creation_is_rate_limited(flask_client, workdir, monkeypatch):
+    import asgi_app
+    from starlette.testclient import TestClient
+    monkeypatch.setattr(admission.session_starts, "acquire", lambda: False)
+    for client in (flask_client, TestClient(asgi_app.app)):
+        r = client.post("/api/uploads", data={"filename": "s.vcf"})
+        assert r.status_code == 429
+        assert "Retry-After" in r.headers
@@ -0,0 +1,82 @@
+import pytest
+
+from allele_function import AlleleFunctionEngine, GeneAlleleTable, split_copies
+from knowledge_base import current as current_kb
+
+ACTIVITY_SPEC = {
+    "method": "activity_score",
+    "activity_phenotypes": [[0, 0, "Poor_Metabolizer"], [0.25, 1.0, "Intermediate"],
+                            [1.25, 2.25, "Normal"], [2.5, None, "Ultrarapid"]],
+}
+ACTIVITY_ALLELES = {
+    "*1":  {"function": "normal function", "activity": 1.0},
+    "*4":  {"function": "no function", "activity": 0.0},
+    "*10": {"function": "decreased function", "activity": 0.25},
+    "*41": {"function": "decreased", "activity": 0.5},
+}
+FUNCTION_SPEC = {
+    "method": "function",
+    "function_phenotypes": {"normal/normal": "Normal", "no/normal": "Intermediate", "no/no": "Poor_Metabolizer"},
+}
+FUNCTION_ALLELES = {"*1": {"function": "normal"}, "*2": {"function": "no function"}, "*3": {"function": "none"}}
+
+
+@pytest.fixture
+def engine():
+    return AlleleFunctionEngine({
+        "CYP2D6": GeneAlleleTable("CYP2D6", ACTIVITY_SPEC, ACTIVITY_ALLELES),
+        "CYP2C19": GeneAlleleTable("CYP2C19", FUNCTION_SPEC, FUNCTION_ALLELES),
+    })
+
+
+@pytest.mark.parametrize("a, b, score, phenotype", [
+    ("*1", "*1", 2.0, "Normal"),
+    ("*4", "*4", 0.0, "Poor_Metabolizer"),
+    ("*4", "*10", 0.25, "Intermediate"),
+    ("*10", "*41", 0.75, "Intermediate"),
+    ("*1", "*1x2", 3.0, "Ultrarapid"),      # copy number multiplies the activity
+    ("*1xN", "*4", 2.0, "Normal"),
+])
+def test_activity_score_phenotypes(engine, a, b, score, phenotype):
+    call = engine.tables["CYP2D6"].call(a, b)
+    assert (call.activity_score, call.phenotype) == (score, phenotype)
+
+
+@pytest.mark.parametrize("a, b, phenotype", [
+    ("*1", "*1", "Normal"), ("*2", "*1", "Intermediate"), ("*1", "*3", "Intermediate"), ("*2", "*3", "Poor_Metabolizer"),
+])
+def test_function_pair_phenotypes_are_unordered(engine, a, b, phenotype):
+    call = engine.tables["CYP2C19"].call(a, b)
+    assert (call.activity_score, call.phenotype) == (None, phenotype)
+
+
+def test_engine_keeps_the_two_most_severe_alleles_and_fills_the_reference(engine):
+    variants = [{"allele": "*1"}, {"allele": "*4"}, {"allele": "*41"}]
+    assert engine.call("CYP2D6", variants).alleles == ("*4", "*41")
+    assert engine.call("CYP2D6", [{"allele": "*4", "copies": 2}]).diplotype == "*4/*4"
+    assert engine.call("CYP2D6", [{"allele": "*10"}]).diplotype == "*10/*1"
+
+
+def test_undefined_alleles_fall_back(engine):
+    assert engine.call("CYP2D6", [{"allele": "*999"}]) is None
+    assert engine.call("VKORC1", [{"allele": "*1"}]) is None
+
+
+def test_tables_are_validated():
+    with pytest.raises(ValueError):
+        GeneAlleleTable("X", ACTIVITY_SPEC, {"*1": {"function": "normal"}})     # no activity value
+    with pytest.raises(ValueError):
+        GeneAlleleTable("X", FUNCTION_SPEC, {"*2": {"function": "no"}})         # no reference allele
+    with pytest.raises(ValueError):
+        GeneAlleleTable("X", FUNCTION_SPEC, {"*1": {"function": "sideways"}})
+
+
+def test_split_copies():
+    assert [split_copies(a) for a in ("*2x2", "*1xN", "*4", "*2×3")] == [("*2", 2), ("*1", 2), ("*4", 1), ("*2", 3)]
+
+
+def test_knowledge_base_genes_use_their_declared_method():
+    engine = current_kb().allele_engine
+    assert engine.call("CYP2D6", [{"allele": "*4"}, {"allele": "*10"}]).activity_score == 0.25
+    assert engine.call("CYP2C19", [{"allele": "*2", "copies": 2}]).phenotype == "Poor_Metabolizer"
+    assert engine.call("CYP2C19", [{"allele": "*2"}]).activity_score is None
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import batch
+from batch import id_collisions, patient_ids
+
+
+def _write(path, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_flat_directory_keeps_file_names():
+    ids = patient_ids(["cohort/P1.vcf", "cohort/P2.vcf.gz"])
+    assert ids == {"cohort/P1.vcf": "P1", "cohort/P2.vcf.gz": "P2"}
+
+
+def test_same_file_name_in_different_directories_gets_distinct_ids():
+    ids = patient_ids(["cohort/A/sample.vcf.gz", "cohort/B/sample.vcf.gz"])
+    assert ids == {"cohort/A/sample.vcf.gz": "A_sample", "cohort/B/sample.vcf.gz": "B_sample"}
+    assert not id_collisions(ids)
+
+
+def test_json_outputs_do_not_overwrite_each_other(tmp_path, sample_vcf):
+    for name in ("A", "B"):
+        _write(str(tmp_path / "cohort" / name / "sample.vcf"), sample_vcf)
+    out = str(tmp_path / "out")
+    args = [str(tmp_path / "cohort" / "*" / "sample.vcf"), "--drugs", "CODEINE", "--format", "json",
+            "--output", out, "--workers", "1", "--progress-every", "0"]
+    assert batch.main(args) == 0
+    assert sorted(os.listdir(out)) == ["A_sample.json", "B_sample.json"]
+
+
+def test_colliding_inputs_are_refused(tmp_path, sample_vcf):
+    _write(str(tmp_path / "P1.vcf"), sample_vcf)
+    _write(str(tmp_path / "P1.vcf.bgz"), sample_vcf)
+    with pytest.raises(SystemExit) as exc:
+        batch.main([str(tmp_path), "--drugs", "CODEINE", "--format", "json", "--output", str(tmp_path / "out")])
+    assert exc.value.code == 2
+    assert not os.path.exists(tmp_path / "out")
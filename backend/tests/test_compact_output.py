@@ -0,0 +1,34 @@
+import io
+
+import vcf_parser
+from compact_output import compact_payload
+
+ANN_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "##INFO=<ID=ANN,Number=.,Type=String,Description=\"Functional annotations: 'Allele | Annotation | "
+    "Annotation_Impact | Gene_Name | Gene_ID | Feature_Type | Feature_ID | Transcript_BioType | Rank | HGVS.c'\">\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "chr22\t42128945\trs3892097\tC\tT\t50\tPASS\tANN="
+    "*4|missense_variant|MODERATE|CYP2D6|ENSG1|transcript|ENST01|protein_coding|4/9|c.1C>T,"
+    "*4|missense_variant|MODERATE|CYP2D6|ENSG1|transcript|ENST02|protein_coding|4/9|c.1C>T\tGT\t0/1\n"
+)
+
+
+def test_variants_are_shared_between_results():
+    variant = {"gene": "CYP2D6", "allele": "*4"}
+    payload = {"results": [
+        {"patient_id": "P", "drug": d, "pharmacogenomic_profile": {"detected_variants": [dict(variant)]}}
+        for d in ("CODEINE", "TRAMADOL")
+    ]}
+    out = compact_payload(payload)
+    assert out["variants"] == [variant]
+    assert [r["pharmacogenomic_profile"]["detected_variant_ids"] for r in out["results"]] == [[0], [0]]
+
+
+def test_compact_output_with_transcript_lists(flask_client, monkeypatch):
+    monkeypatch.setattr(vcf_parser, "VCF_TRANSCRIPTS", "list")
+    r = flask_client.post("/api/analyze?compact=1",
+                          data={"drug": "CODEINE", "file": (io.BytesIO(ANN_VCF.encode()), "a.vcf")})
+    assert r.status_code == 200
+    variants = r.get_json()["variants"]
+    assert [v["transcripts"] for v in variants] == [["ENST01", "ENST02"]]
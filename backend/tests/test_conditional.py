@@ -0,0 +1,88 @@
+import io
+
+import pytest
+
+from conditional import match_etag
+
+ETAG = '"abc"'
+
+
+@pytest.mark.parametrize("header, encoding, expected", [
+    ('"abc-gzip"', "gzip", '"abc-gzip"'),
+    ('W/"abc-gzip"', "gzip", 'W/"abc-gzip"'),
+    ('"abc"', "gzip", '"abc"'),                # small bodies are sent uncompressed
+    ('"abc"', None, '"abc"'),
+    ('"abc-gzip"', None, None),               # client cannot decode the copy it names
+    ('"abc-gzip"', "br", None),
+    ('"other", "abc-br"', "br", '"abc-br"'),
+    ("*", None, ETAG),
+    (None, "gzip", None),
+])
+def test_match_etag_names_the_selected_representation(header, encoding, expected):
+    assert match_etag(header, ETAG, encoding) == expected
+
+
+def test_flask_gzip_tag_is_not_revalidated_without_gzip(flask_client):
+    first = flask_client.get("/api/drugs", headers={"Accept-Encoding": "gzip"})
+    tag   = first.headers["ETag"]
+    assert first.headers["Content-Encoding"] == "gzip" and tag.endswith('-gzip"')
+
+    cached = flask_client.get("/api/drugs", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == tag
+    assert cached.headers["Vary"] == "Accept-Encoding"
+
+    plain = flask_client.get("/api/drugs", headers={"Accept-Encoding": "identity", "If-None-Match": tag})
+    assert plain.status_code == 200
+    assert "Content-Encoding" not in plain.headers
+
+
+def test_asgi_gzip_tag_is_not_revalidated_without_gzip(workdir):
+    import asgi_app
+    from starlette.testclient import TestClient
+    client = TestClient(asgi_app.app)
+    tag    = client.get("/api/drugs").headers["ETag"][:-1] + '-gzip"'
+
+    cached = client.get("/api/drugs", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+    assert cached.status_code == 304
+    assert "Accept-Encoding" in cached.headers["Vary"]
+
+    plain = client.get("/api/drugs", headers={"Accept-Encoding": "identity", "If-None-Match": tag})
+    assert plain.status_code == 200
+
+
+def test_post_analysis_is_never_conditional(flask_client, sample_vcf):
+    for path in ("/api/analyze", "/api/panel"):
+        r = flask_client.post(path, headers={"If-None-Match": "*"},
+                              data={"drug": "CODEINE", "file": (io.BytesIO(sample_vcf), "s.vcf")})
+        assert r.status_code == 200
+        assert "ETag" not in r.headers
+
+
+def test_asgi_post_analysis_is_never_conditional(workdir, sample_vcf, monkeypatch):
+    import asgi_app
+    from starlette.testclient import TestClient
+
+    async def run_inline(request, job, *args):
+        status, body, _, headers = job(*args, None)
+        return asgi_app.Response(body, status, headers=headers, media_type="application/json")
+    monkeypatch.setattr(asgi_app, "run_heavy", run_inline)
+    r = TestClient(asgi_app.app).post("/api/analyze", headers={"If-None-Match": "*"},
+                                      data={"drug": "CODEINE"}, files={"file": ("s.vcf", sample_vcf)})
+    assert r.status_code == 200
+    assert "etag" not in r.headers
+
+
+def test_stored_analysis_is_conditional_on_get_only(flask_client, patient_store, sample_vcf):
+    token = {"X-Patient-Token": "s3cret"}
+    flask_client.post("/api/analyze", headers=token,
+                      data={"drug": "CODEINE", "patient_id": "P1", "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    url   = "/api/patients/P1/analyze?drug=CODEINE"
+    first = flask_client.get(url, headers=token)
+    tag   = first.headers["ETag"]
+    assert first.status_code == 200 and tag.startswith('W/"')
+
+    assert flask_client.get(url, headers={**token, "If-None-Match": tag}).status_code == 304
+    posted = flask_client.post(url, headers={**token, "If-None-Match": tag})
+    assert posted.status_code == 200
+    assert "ETag" not in posted.headers
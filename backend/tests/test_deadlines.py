@@ -0,0 +1,118 @@
+"""
+Per-request deadlines (deadlines.py): when the budget runs out the
+response carries what was finished, the rest marked partial with the step
+it stopped at, and partial responses are never cached or stored.
+"""
+
+import io
+
+import pytest
+
+import deadlines
+import vcf_parser
+from analysis import analyze_file, analyze_variants, is_complete, response_headers
+from deadlines import Deadline, DeadlineExceeded, request_deadline
+from knowledge_base import current as current_kb
+
+DRUGS = ["CODEINE", "CLOPIDOGREL"]
+
+
+class Countdown:
+    """A deadline that expires after `checks` calls to expired()."""
+
+    def __init__(self, checks: int):
+        self.checks = checks
+
+    def expired(self) -> bool:
+        self.checks -= 1
+        return self.checks < 0
+
+
+def steps(payload: dict) -> list:
+    return [(r["drug"], r["analysis_status"], r.get("deadline_exceeded_at")) for r in payload["results"]]
+
+
+@pytest.fixture
+def vcf_path(tmp_path, sample_vcf):
+    path = tmp_path / "s.vcf"
+    path.write_bytes(sample_vcf)
+    return str(path)
+
+
+@pytest.mark.parametrize("value", ["abc", "0", "-5", "nan"])
+def test_request_deadline_rejects_non_positive_values(value):
+    deadline, (payload, status) = request_deadline(value)
+    assert deadline is None
+    assert status == 400
+    assert "deadline_ms" in payload["error"]
+
+
+def test_request_deadline_defaults_and_caps(monkeypatch):
+    monkeypatch.setattr(deadlines, "ANALYSIS_DEADLINE", 30.0)
+    monkeypatch.setattr(deadlines, "ANALYSIS_DEADLINE_MAX", 120.0)
+    assert request_deadline(None)[0].budget == 30.0
+    assert request_deadline(" 250 ")[0].budget == 0.25
+    assert request_deadline("9999999")[0].budget == 120.0
+    monkeypatch.setattr(deadlines, "ANALYSIS_DEADLINE", 0.0)
+    assert request_deadline("") == (None, None)
+
+
+def test_check_names_the_step():
+    with pytest.raises(DeadlineExceeded) as e:
+        Deadline(0).check("analysis")
+    assert e.value.step == "analysis"
+    Deadline(60).check("analysis")
+
+
+def test_expired_before_analysis_leaves_every_drug_partial(vcf_path):
+    payload = analyze_file(vcf_path, DRUGS, "P1", current_kb(), window_filter=False, deadline=Deadline(0))
+    assert steps(payload) == [("CODEINE", "partial", "analysis"), ("CLOPIDOGREL", "partial", "analysis")]
+    assert "risk_assessment" not in payload["results"][0]
+    assert payload["summary"]["partial_count"] == 2
+    assert response_headers(payload) == deadlines.PARTIAL_HEADERS
+
+
+def test_deadline_during_parse_marks_every_drug_partial(vcf_path, monkeypatch):
+    monkeypatch.setattr(vcf_parser, "DEADLINE_CHECK_LINES", 1)
+    payload = analyze_file(vcf_path, DRUGS, "P1", current_kb(), window_filter=False, deadline=Deadline(0))
+    assert steps(payload) == [("CODEINE", "partial", "parse"), ("CLOPIDOGREL", "partial", "parse")]
+    assert payload["interaction_warnings"] is not None
+
+
+def test_finished_drugs_are_kept_when_the_deadline_hits_midway(vcf_path):
+    variants = vcf_parser.parse_vcf(vcf_path, current_kb(), False)
+    # First drug: evaluated, then out of time for its explanation; second: never evaluated
+    payload  = analyze_variants(variants, DRUGS, "P1", current_kb(), deadline=Countdown(1))
+    assert steps(payload) == [("CODEINE", "partial", "explanation"), ("CLOPIDOGREL", "partial", "analysis")]
+    codeine = payload["results"][0]
+    assert "risk_assessment" in codeine and "llm_generated_explanation" not in codeine
+
+    payload = analyze_variants(variants, DRUGS, "P1", current_kb(), deadline=Countdown(2))
+    assert steps(payload) == [("CODEINE", "complete", None), ("CLOPIDOGREL", "partial", "analysis")]
+    assert "llm_generated_explanation" in payload["results"][0]
+    assert not is_complete(payload)
+
+
+def test_flask_partial_response_is_marked_and_not_stored(flask_client, patient_store, sample_vcf):
+    r = flask_client.post("/api/analyze?deadline_ms=0.001", headers={"X-Patient-Token": "s3cret"},
+                          data={"drug": ",".join(DRUGS), "patient_id": "P1",
+                                "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    assert r.status_code == 200
+    assert r.headers["X-Analysis-Status"] == "partial"
+    assert r.headers["Cache-Control"] == "no-store"
+    assert {x["analysis_status"] for x in r.get_json()["results"]} == {"partial"}
+    (digest,) = patient_store.file_hashes("P1")
+    assert patient_store.results("P1", digest) == []
+
+
+def test_flask_complete_response_is_not_marked(flask_client, sample_vcf):
+    r = flask_client.post("/api/analyze?deadline_ms=60000",
+                          data={"drug": "CODEINE", "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    assert r.status_code == 200
+    assert "X-Analysis-Status" not in r.headers
+
+
+def test_flask_bad_deadline_is_a_400(flask_client, sample_vcf):
+    r = flask_client.post("/api/analyze?deadline_ms=soon",
+                          data={"drug": "CODEINE", "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    assert r.status_code == 400
@@ -0,0 +1,92 @@
+"""
+fields= projection (analysis.parse_fields): only the selected response
+sections come back, and an unknown name is a 400 before any work is done.
+"""
+
+import io
+
+import pytest
+
+from analysis import PAYLOAD_FIELDS, RESULT_FIELDS, parse_fields
+
+# Keys every per-drug result carries whatever fields= selects
+RESULT_BASE = {"patient_id", "drug", "timestamp", "knowledge_base_version", "no_variants_detected",
+               "analysis_status"}
+
+
+def analyze(client, vcf: bytes, fields: str | None, drug: str = "CODEINE,CLOPIDOGREL", path: str = "/api/analyze"):
+    query = f"?fields={fields}" if fields is not None else ""
+    return client.post(path + query, data={"drug": drug, "file": (io.BytesIO(vcf), "s.vcf")})
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None,                                  None),
+    ("",                                    None),
+    (" , ",                                 None),
+    ("risk,summary",                        {"risk", "summary"}),
+    (" Risk , SUMMARY ",                    {"risk", "summary"}),
+    ("risk_assessment,interaction_warnings", {"risk", "interactions"}),
+    ("detected_variants",                   {"variants"}),
+    ("pharmacogenomic_profile",             {"profile", "variants"}),
+])
+def test_parse_fields_accepts_short_names_and_payload_keys(value, expected):
+    fields, error = parse_fields(value)
+    assert error is None
+    assert fields == (None if expected is None else frozenset(expected))
+
+
+def test_parse_fields_rejects_unknown_names():
+    fields, (payload, status) = parse_fields("risk,colour,summary,size")
+    assert fields is None
+    assert status == 400
+    assert payload["error"] == "Unknown field(s): colour, size"
+    assert payload["supported_fields"] == [*RESULT_FIELDS, *PAYLOAD_FIELDS]
+
+
+@pytest.mark.parametrize("path", ["/api/analyze", "/api/panel"])
+def test_unknown_field_is_a_400(flask_client, sample_vcf, path):
+    r = analyze(flask_client, sample_vcf, "risk,bogus", path=path)
+    assert r.status_code == 400
+    assert r.get_json()["error"] == "Unknown field(s): bogus"
+
+
+def test_projection_keeps_only_the_selected_sections(flask_client, sample_vcf):
+    body = analyze(flask_client, sample_vcf, "risk,summary").get_json()
+    assert set(body) == {"results", "summary"}
+    assert [r["drug"] for r in body["results"]] == ["CODEINE", "CLOPIDOGREL"]
+    for r in body["results"]:
+        assert set(r) == RESULT_BASE | {"risk_assessment"}
+
+
+def test_unselected_risk_is_dropped_from_the_results(flask_client, sample_vcf):
+    full = analyze(flask_client, sample_vcf, None).get_json()
+    body = analyze(flask_client, sample_vcf, "recommendation,interactions").get_json()
+    assert set(body) == {"results", "interaction_warnings"}
+    assert body["interaction_warnings"] == full["interaction_warnings"]
+    for r, whole in zip(body["results"], full["results"]):
+        assert set(r) == RESULT_BASE | {"clinical_recommendation"}
+        assert r["clinical_recommendation"] == whole["clinical_recommendation"]
+
+
+def test_variants_and_profile_split_the_pharmacogenomic_profile(flask_client, sample_vcf):
+    full     = analyze(flask_client, sample_vcf, None).get_json()["results"][0]["pharmacogenomic_profile"]
+    variants = analyze(flask_client, sample_vcf, "variants").get_json()["results"][0]["pharmacogenomic_profile"]
+    profile  = analyze(flask_client, sample_vcf, "profile").get_json()["results"][0]["pharmacogenomic_profile"]
+    assert variants == {"detected_variants": full["detected_variants"]}
+    assert "detected_variants" not in profile
+    assert profile == {k: v for k, v in full.items() if k != "detected_variants"}
+
+
+def test_pharmacogenes_is_selectable_on_plain_analyze(flask_client, sample_vcf):
+    body = analyze(flask_client, sample_vcf, "pharmacogenes").get_json()
+    assert set(body) == {"results", "pharmacogenes"}
+    assert "CYP2C19" in {g["gene"] for g in body["pharmacogenes"]}
+
+
+def test_projected_results_are_not_stored(flask_client, patient_store, sample_vcf):
+    token = {"X-Patient-Token": "s3cret"}
+    r = flask_client.post("/api/analyze?fields=risk", headers=token,
+                          data={"drug": "CODEINE", "patient_id": "P1", "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    assert r.status_code == 200
+    (digest,) = patient_store.file_hashes("P1")
+    assert patient_store.results("P1", digest) == []
@@ -0,0 +1,62 @@
+import pytest
+
+from gene_windows import GeneWindows
+from vcf_parser import VcfParser
+
+# ##contig lines give the chromosome order that makes early exit safe
+HEADER = (["##fileformat=VCFv4.2\n"]
+          + [f"##contig=<ID=chr{c}>\n" for c in ("1", "6", "10", "12", "22", "X")]
+          + ["#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"])
+
+
+def record(chrom: str, pos: int, info: str = ".", gt: str = "0/1") -> str:
+    return f"{chrom}\t{pos}\t.\tC\tT\t.\tPASS\t{info}\tGT\t{gt}\n"
+
+
+CYP2D6_STAR4 = record("chr22", 42128945, "GENE=CYP2D6;STAR=*4")
+CYP2C19_STAR2 = record("chr10", 94781859, "GENE=CYP2C19;STAR=*2")
+
+
+def parse(lines: list, window_filter: bool = True) -> VcfParser:
+    parser = VcfParser(window_filter=window_filter)
+    parser.feed_lines(HEADER + lines)
+    parser.finish()
+    return parser
+
+
+def test_overlapping_windows_are_merged():
+    windows = GeneWindows({"genes": {"A": {"chrom": "chr1", "start": 100, "end": 200},
+                                     "B": {"chrom": "1", "start": 150, "end": 300},
+                                     "C": {"chrom": "1", "start": 400, "end": 500}}})
+    assert windows.last_end == {"1": 500}
+    assert [windows.contains("1", p) for p in (99, 100, 250, 300, 301, 450, 501)] == \
+        [False, True, True, True, False, True, False]
+    assert not windows.contains("2", 150)
+
+
+def test_records_outside_the_windows_are_dropped():
+    tagged_elsewhere = record("chr3", 1000, "GENE=CYP2D6;STAR=*10")
+    parser = parse([tagged_elsewhere, CYP2D6_STAR4])
+    assert [v["allele"] for v in parser.variants] == ["*4"]
+    assert parser.stats["outside_windows"] == 1
+    assert [v["allele"] for v in parse([tagged_elsewhere, CYP2D6_STAR4], window_filter=False).variants] == ["*10", "*4"]
+
+
+def test_sorted_input_stops_after_the_last_window():
+    lines  = [CYP2C19_STAR2, CYP2D6_STAR4, record("chr22", 50_000_000)]
+    lines += [record("chrX", p) for p in range(1, 1001)]
+    parser = parse(lines)
+    assert parser.stats["early_exit"] and parser.done
+    assert parser.stats["records"] == 3
+    assert sorted(v["allele"] for v in parser.variants) == ["*2", "*4"]
+
+
+@pytest.mark.parametrize("lines", [
+    [CYP2C19_STAR2, CYP2D6_STAR4, record("chr22", 42128000), record("chr22", 50_000_000)],  # position goes back
+    [CYP2D6_STAR4, CYP2C19_STAR2, record("chr22", 50_000_000)],                            # against ##contig order
+])
+def test_unsorted_input_is_read_to_the_end(lines):
+    parser = parse(lines + [record("chrX", 1)])
+    assert not parser.stats["early_exit"]
+    assert parser.stats["records"] == len(lines) + 1
+    assert sorted(v["allele"] for v in parser.variants) == ["*2", "*4"]
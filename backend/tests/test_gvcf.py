@@ -0,0 +1,40 @@
+import vcf_parser
+from vcf_parser import VcfParser, validate_vcf_content
+
+GVCF_HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "##ALT=<ID=NON_REF,Description=\"Represents any possible alternative allele\">\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+)
+
+
+def reference_block(pos: int) -> str:
+    return f"chr22\t{pos}\t.\tC\t<NON_REF>\t.\tPASS\tEND={pos + 99}\tGT:DP\t0/0:30\n"
+
+
+VARIANT = "chr22\t42128945\trs3892097\tC\tT,<NON_REF>\t50\tPASS\tGENE=CYP2D6;STAR=*4\tGT\t0/1\n"
+
+
+def test_reference_blocks_are_skipped():
+    parser = VcfParser()
+    parser.feed_lines(GVCF_HEADER.splitlines(True) + [reference_block(100), VARIANT, reference_block(42129000)])
+    assert parser.gvcf
+    assert parser.stats["reference_blocks"] == 2
+    assert [(v["allele"], v["copies"]) for v in parser.finish()] == [("*4", 1)]
+
+
+def test_symbolic_alts_are_only_skipped_in_gvcf_files():
+    parser = VcfParser()
+    parser.feed_lines(GVCF_HEADER.replace("##ALT=<ID=NON_REF", "##ALT=<ID=DEL").splitlines(True) + [reference_block(100)])
+    assert not parser.gvcf
+    assert parser.stats["reference_blocks"] == 0
+
+
+def test_validator_looks_past_reference_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(vcf_parser, "VALIDATE_MAX_DATA_LINES", 10)
+    path = tmp_path / "sample.g.vcf"
+    path.write_text(GVCF_HEADER + "".join(reference_block(100 * i) for i in range(1, 51)) + VARIANT)
+    result = validate_vcf_content(str(path))
+    assert result["valid"]
+    assert result["stats"]["gvcf"] and result["stats"]["reference_blocks"] == 50
+    assert result["stats"]["parseable_variants"] == 1
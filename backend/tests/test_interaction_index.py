@@ -0,0 +1,46 @@
+import itertools
+
+import pytest
+
+from interaction_index import InteractionIndex
+from knowledge_base import current as current_kb
+
+RULES = [
+    ("cyp2d6", "codeine", "tramadol", "pair"),
+    ("CYP2C19", ("CLOPIDOGREL", "OMEPRAZOLE", "ESOMEPRAZOLE"), "three-way"),
+    ("CYP2C9", "WARFARIN", "FLUCONAZOLE", "warfarin"),
+    ("CYP2C9", "FLUCONAZOLE", "WARFARIN", "same drugs, second rule"),
+]
+
+
+def test_match_needs_every_drug_of_a_rule():
+    index = InteractionIndex(RULES)
+    assert index.match(["CODEINE", "TRAMADOL"]) == [0]
+    assert index.match(["CLOPIDOGREL", "OMEPRAZOLE"]) == []
+    assert index.match(["ESOMEPRAZOLE", "OMEPRAZOLE", "CLOPIDOGREL", "ASPIRIN"]) == [1]
+    assert index.match(["FLUCONAZOLE", "WARFARIN", "CODEINE", "TRAMADOL"]) == [0, 2, 3]
+
+
+def test_match_agrees_with_a_scan_of_the_knowledge_base_rules():
+    kb    = current_kb()
+    drugs = sorted(kb.drug_gene_map)
+    for n in (2, 3):
+        for combo in itertools.combinations(drugs, n):
+            expected = [i for i, (_, rule_drugs, _) in enumerate(kb.interactions.rules)
+                        if set(rule_drugs) <= set(combo)]
+            assert kb.interactions.match(combo) == expected
+
+
+def test_check_escalates_only_for_known_non_normal_phenotypes():
+    index = InteractionIndex(RULES)
+    plain = index.check(["CODEINE", "TRAMADOL"])
+    assert plain == [{"gene": "CYP2D6", "drugs": ["CODEINE", "TRAMADOL"], "message": "pair"}]
+    assert index.check(["CODEINE", "TRAMADOL"], {"CYP2D6": "PM"})[0]["escalated"] is True
+    unknown = index.check(["CODEINE", "TRAMADOL"], {})[0]
+    assert (unknown["patient_phenotype"], unknown["escalated"]) == ("Normal", False)
+
+
+@pytest.mark.parametrize("rule", [("CYP2D6", "CODEINE", "msg"), ("CYP2D6", ("CODEINE", "codeine"), "msg")])
+def test_malformed_rules_are_rejected(rule):
+    with pytest.raises(ValueError):
+        InteractionIndex([rule])
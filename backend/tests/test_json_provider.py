@@ -0,0 +1,26 @@
+import io
+
+import json_provider
+from json_provider import dumps_bytes, static_text
+
+
+def test_dumps_bytes_is_compact_and_sorted():
+    assert dumps_bytes({"b": 1, "a": "é"}) == '{"a":"é","b":1}'.encode()
+
+
+def test_static_text_round_trips():
+    assert dumps_bytes({"t": static_text("same text")}) == b'{"t":"same text"}'
+
+
+def test_debug_response_encodes_static_blocks(flask_client, sample_vcf):
+    # Debug output is pretty-printed; pre-encoded blocks must still serialize
+    app = flask_client.application
+    app.debug = True
+    try:
+        r = flask_client.post("/api/analyze", data={"drug": "CODEINE", "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    finally:
+        app.debug = False
+    assert r.status_code == 200
+    if json_provider.HAS_ORJSON:
+        assert b'\n  "' in r.data
+    assert r.get_json()["results"][0]["clinical_recommendation"]["recommendation_text"]
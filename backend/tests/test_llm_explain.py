@@ -0,0 +1,24 @@
+import gc
+import weakref
+
+import llm_explain
+from knowledge_base import current as current_kb, load
+
+
+def test_explanations_do_not_keep_replaced_snapshots_alive():
+    old = load(current_kb().source)
+    ref = weakref.ref(old)
+    text = llm_explain.explain("CYP2D6", "*4", "CODEINE", "Adjust Dosage", "IM", kb=old)
+    del old
+    gc.collect()
+    assert ref() is None
+    # Same version, same text — served from the cache
+    assert llm_explain.explain("CYP2D6", "*4", "CODEINE", "Adjust Dosage", "IM", kb=current_kb()) is text
+
+
+def test_explanation_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(llm_explain, "EXPLAIN_CACHE_SIZE", 2)
+    monkeypatch.setattr(llm_explain, "_cache", llm_explain.OrderedDict())
+    for drug in ("CODEINE", "WARFARIN", "CLOPIDOGREL"):
+        llm_explain.explain("CYP2D6", "*4", drug, "Safe")
+    assert [k[3] for k in llm_explain._cache] == ["WARFARIN", "CLOPIDOGREL"]
@@ -0,0 +1,15 @@
+import asgi_app
+from shared_cache import MemoryBackend, SharedCache
+
+
+def test_asgi_metrics_count_the_pool_workers_cache(workdir, sample_vcf, monkeypatch):
+    from starlette.testclient import TestClient
+    # Spawned pool workers open their own cache from the environment
+    monkeypatch.setenv("PHARMAGUARD_CACHE_URL", "memory://")
+    monkeypatch.setattr(asgi_app, "cache", SharedCache(MemoryBackend(1024 * 1024, 60)))
+    with TestClient(asgi_app.app) as client:    # lifespan: real process pool
+        r = client.post("/api/analyze", data={"drug": "CODEINE"}, files={"file": ("s.vcf", sample_vcf)})
+        assert r.status_code == 200
+        stats = client.get("/api/metrics").json()["shared_cache"]
+    assert stats["backend"] == "memory"
+    assert stats["misses"] > 0 and stats["writes"] > 0
@@ -0,0 +1,76 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import profile_store
+
+
+def test_store_is_off_by_default(workdir):
+    assert profile_store.PROFILE_DB == ""
+    assert profile_store.profiles is None
+    assert not os.path.exists(workdir / "profiles.db")
+
+
+def test_patient_endpoints_are_404_without_a_store(flask_client):
+    assert flask_client.get("/api/patients/P1").status_code == 404
+
+
+def test_patient_endpoints_are_shut_without_a_configured_token(patient_store, flask_client, monkeypatch):
+    monkeypatch.setattr(profile_store, "PATIENT_TOKEN", "")
+    r = flask_client.get("/api/patients/P1", headers={"X-Patient-Token": ""})
+    assert r.status_code == 403
+
+
+def test_patient_endpoints_require_the_token(patient_store, flask_client, sample_vcf):
+    ok, wrong = {"X-Patient-Token": "s3cret"}, {"X-Patient-Token": "guess"}
+    r = flask_client.post("/api/analyze", headers=ok, data={"drug": "CODEINE", "patient_id": "P1",
+                                                            "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    assert r.status_code == 200
+
+    assert flask_client.get("/api/patients/P1").status_code == 403
+    assert flask_client.get("/api/patients/P1", headers=wrong).status_code == 403
+    assert flask_client.get("/api/patients/P1/analyze?drug=CODEINE", headers=wrong).status_code == 403
+    assert flask_client.delete("/api/patients/P1", headers=wrong).status_code == 403
+
+    assert flask_client.get("/api/patients/P1", headers=ok).status_code == 200
+    assert flask_client.get("/api/patients/P1/analyze?drug=CODEINE", headers=ok).status_code == 200
+    assert flask_client.delete("/api/patients/P1", headers=ok).status_code == 200
+
+
+OTHER_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "22\t42130692\trs1065852\tG\tA\t.\tPASS\tGENE=CYP2D6;STAR=*10\tGT\t1/1\n"
+).encode()
+
+
+def diplotype(client, headers) -> str:
+    r = client.get("/api/patients/P1/analyze?drug=CODEINE", headers=headers)
+    return r.get_json()["results"][0]["pharmacogenomic_profile"]["diplotype"]
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Patient-Token": "guess"}])
+def test_uploads_without_the_token_are_not_stored(patient_store, flask_client, sample_vcf, headers):
+    ok = {"X-Patient-Token": "s3cret"}
+    flask_client.post("/api/analyze", headers=ok, data={"drug": "CODEINE", "patient_id": "P1",
+                                                        "file": (io.BytesIO(sample_vcf), "s.vcf")})
+    before = diplotype(flask_client, ok)
+
+    r = flask_client.post("/api/analyze", headers=headers, data={"drug": "CODEINE", "patient_id": "P1",
+                                                                 "file": (io.BytesIO(OTHER_VCF), "o.vcf")})
+    assert r.status_code == 200
+    assert r.get_json()["results"][0]["pharmacogenomic_profile"]["diplotype"] != before
+    assert diplotype(flask_client, ok) == before
+    assert len(patient_store.file_hashes("P1")) == 1
+
+
+def test_upload_sessions_without_the_token_are_not_stored(patient_store, flask_client, sample_vcf):
+    session = flask_client.post("/api/uploads", data={"patient_id": "P1", "filename": "s.vcf"}).get_json()
+    flask_client.put(f"/api/uploads/{session['upload_id']}/chunks/0", data=sample_vcf,
+                     headers={"X-Chunk-SHA256": hashlib.sha256(sample_vcf).hexdigest()})
+    r = flask_client.post(f"/api/uploads/{session['upload_id']}/finalize",
+                          data={"drug": "CODEINE", "total_chunks": "1"})
+    assert r.status_code == 200
+    assert patient_store.file_hashes("P1") == []
@@ -0,0 +1,119 @@
+"""
+reevaluate_version (reevaluate.py) recomputes only the stored patient ×
+drug results a knowledge-base diff can reach; everything else is
+re-tagged with the new version untouched.
+"""
+
+import copy
+
+import pytest
+
+from analysis import analyze_file
+from kb_diff import self_contained
+from knowledge_base import KnowledgeBase, current as current_kb
+from profile_store import ProfileStore
+from reevaluate import reevaluate_version
+
+DRUGS = ["CODEINE", "CLOPIDOGREL"]
+
+# CYP2D6 only: CYP2C19 stays at its reference (Normal) call
+CYP2D6_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "22\t42128945\trs3892097\tC\tT\t.\tPASS\tGENE=CYP2D6;STAR=*4\tGT\t0/1\n"
+).encode()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles.db"))
+
+
+@pytest.fixture
+def stored(tmp_path, store, sample_vcf):
+    """Two patients analysed for DRUGS under the current knowledge base."""
+    kb = current_kb()
+    digests = {}
+    for patient_id, data in (("poor", sample_vcf), ("normal", CYP2D6_VCF)):
+        path = tmp_path / f"{patient_id}.vcf"
+        path.write_bytes(data)
+        analyze_file(str(path), DRUGS, patient_id, kb, window_filter=False, store=store)
+        digests[patient_id] = store.file_hashes(patient_id)[0]
+    return kb, digests
+
+
+def edited(kb, version: str, edit) -> KnowledgeBase:
+    data = copy.deepcopy(self_contained(kb))
+    data["kb_version"] = version
+    edit(data)
+    return KnowledgeBase(data, source=f"<test {version}>")
+
+
+def by_drug(store, patient_id, digest) -> dict:
+    return {r["drug"]: r for r in store.results(patient_id, digest)}
+
+
+def test_only_the_changed_phenotype_row_is_recomputed(store, stored):
+    old, digests = stored
+    before = {p: by_drug(store, p, h) for p, h in digests.items()}
+    assert before["poor"]["CLOPIDOGREL"]["risk_assessment"]["risk_label"] == "Toxic"
+
+    def edit(data):
+        data["drug_risk"]["CLOPIDOGREL"]["Poor_Metabolizer"] = ["Ineffective", 0.9]
+    new = edited(old, "test-2", edit)
+
+    report = reevaluate_version(store, old.version, new)
+    assert report["diff"]["drug_phenotypes"] == {"CLOPIDOGREL": ["Poor_Metabolizer"]}
+    assert report["affected_results"] == 1
+    assert report["affected_profiles"] == 0
+    assert report["removed_results"] == 0
+    assert report["retagged_results"] == 2 * len(DRUGS) - 1
+    assert store.stored_versions() == {"test-2": 2 * len(DRUGS)}
+
+    after = {p: by_drug(store, p, h) for p, h in digests.items()}
+    assert after["poor"]["CLOPIDOGREL"]["risk_assessment"]["risk_label"] == "Ineffective"
+    for patient_id, drug in (("poor", "CODEINE"), ("normal", "CODEINE"), ("normal", "CLOPIDOGREL")):
+        unchanged = {k: v for k, v in after[patient_id][drug].items() if k != "knowledge_base_version"}
+        assert unchanged == {k: v for k, v in before[patient_id][drug].items() if k != "knowledge_base_version"}
+
+
+def test_dry_run_reports_without_writing(store, stored):
+    old, digests = stored
+
+    def edit(data):
+        data["drug_risk"]["CLOPIDOGREL"]["Poor_Metabolizer"] = ["Ineffective", 0.9]
+
+    report = reevaluate_version(store, old.version, edited(old, "test-2", edit), dry_run=True)
+    assert report["affected_results"] == 1
+    assert "retagged_results" not in report
+    assert store.stored_versions() == {old.version: 2 * len(DRUGS)}
+    assert by_drug(store, "poor", digests["poor"])["CLOPIDOGREL"]["risk_assessment"]["risk_label"] == "Toxic"
+
+
+def test_removed_drug_results_are_deleted(store, stored):
+    old, digests = stored
+
+    def edit(data):
+        del data["drug_gene_map"]["CODEINE"]
+        del data["drug_risk"]["CODEINE"]
+
+    report = reevaluate_version(store, old.version, edited(old, "test-2", edit))
+    assert report["affected_results"] == 2
+    assert report["removed_results"] == 2
+    assert store.stored_versions() == {"test-2": 2}
+    assert set(by_drug(store, "normal", digests["normal"])) == {"CLOPIDOGREL"}
+
+
+def test_gene_window_change_is_skipped(store, stored):
+    old, _ = stored
+
+    def edit(data):
+        data["gene_windows"]["genes"]["CYP2D6"]["start"] -= 1000
+
+    report = reevaluate_version(store, old.version, edited(old, "test-2", edit))
+    assert "skipped" in report
+    assert store.stored_versions() == {old.version: 2 * len(DRUGS)}
+
+
+def test_missing_snapshot_is_an_error(store):
+    assert "error" in reevaluate_version(store, "never-stored", current_kb())
@@ -0,0 +1,46 @@
+import pytest
+
+from analysis import call_gene
+from knowledge_base import current as current_kb
+from vcf_parser import parse_vcf
+
+HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+
+
+@pytest.fixture
+def index():
+    return current_kb().star_index
+
+
+def test_lookup_by_position_then_rsid(index):
+    assert index.lookup("chr22", 42128945, "c", "t").key == "rs3892097"
+    # GRCh37 coordinates: the position misses, the rsID still matches
+    assert index.lookup("22", 42524947, "C", "T", "rs3892097").key == "rs3892097"
+    assert index.lookup("22", 42524947, "C", "T", "rs0;rs3892097").key == "rs3892097"
+    assert index.lookup("22", 42524947, "C", "G", "rs3892097") is None     # different ALT
+    assert index.lookup("22", 1, "C", "T", ".") is None
+
+
+@pytest.mark.parametrize("observed, expected", [
+    ({"rs1065852": 1, "rs3892097": 1}, [("*4", 1)]),                # 100C>T is used up by *4
+    ({"rs1065852": 2, "rs3892097": 1}, [("*4", 1), ("*10", 1)]),
+    ({"rs16947": 1, "rs28371725": 1}, [("*41", 1)]),
+    ({"rs3892097": 1}, []),                                         # no definition fully covered
+])
+def test_most_specific_definitions_are_matched_first(index, observed, expected):
+    sample = index.new_sample()
+    for key, copies in observed.items():
+        sample.add(index.by_rsid[key], copies)
+    assert [(allele, copies) for _, allele, _, copies in sample.call()] == expected
+
+
+def test_unannotated_vcf_is_called_from_genotypes(tmp_path):
+    path = tmp_path / "raw.vcf"
+    path.write_text(HEADER
+                    + "chr22\t42130692\t.\tG\tA\t.\tPASS\t.\tGT\t1/1\n"
+                    + "chr22\t99\trs3892097\tC\tT\t.\tPASS\t.\tGT\t0|1\n"     # by rsID only
+                    + "chr10\t94781859\trs4244285\tG\tA\t.\tPASS\t.\tGT\t0/0\n")  # reference call
+    variants = parse_vcf(str(path))
+    assert sorted((v["gene"], v["allele"], v["copies"]) for v in variants) == [("CYP2D6", "*10", 1), ("CYP2D6", "*4", 1)]
+    call = call_gene("CYP2D6", variants)
+    assert (call.diplotype, call.phenotype) == ("*4/*10", "Intermediate")
@@ -0,0 +1,88 @@
+import hashlib
+import os
+
+import pytest
+
+import upload_sessions
+from knowledge_base import current as current_kb
+from deadlines import Deadline
+from upload_limits import UploadLimitExceeded
+from upload_sessions import MIN_CHUNK_BYTES, UploadSessions
+
+CHUNK = MIN_CHUNK_BYTES
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_sessions, "SESSION_MAX_BYTES", 4 * CHUNK)
+    return UploadSessions(str(tmp_path / "sessions"))
+
+
+def spooled_bytes(session) -> int:
+    return sum(os.path.getsize(os.path.join(session.spool_dir, f)) for f in os.listdir(session.spool_dir))
+
+
+def test_out_of_order_chunks_cannot_spool_past_the_session_limit(sessions):
+    session = sessions.create(current_kb(), "", "big.vcf", chunk_size=CHUNK)
+    data    = b"#" * CHUNK
+    with pytest.raises(UploadLimitExceeded):
+        sessions.put_chunk(session.id, 5, data, sha(data))
+    assert len(sessions) == 0
+
+    session = sessions.create(current_kb(), "", "big.vcf", chunk_size=CHUNK)
+    for index in (1, 2, 3, 4):
+        sessions.put_chunk(session.id, index, data, sha(data))
+    assert spooled_bytes(session) == 4 * CHUNK
+    with pytest.raises(UploadLimitExceeded):
+        sessions.put_chunk(session.id, 0, data, sha(data))
+    assert len(sessions) == 0
+
+
+def test_gzip_chunk_is_metered_while_it_inflates(sessions, monkeypatch):
+    import gzip
+    monkeypatch.setattr(upload_sessions, "INFLATE_STEP", 16 * 1024)
+    bomb    = gzip.compress(b"##padding\n" * (1024 * 1024), 9)     # 10 MB from a few KB
+    session = sessions.create(current_kb(), "", "bomb.vcf.gz", chunk_size=CHUNK)
+    inflated = []
+    feed = session._meter.feed
+    monkeypatch.setattr(session._meter, "feed", lambda data: (inflated.append(len(data)), feed(data)))
+    with pytest.raises(UploadLimitExceeded):
+        sessions.put_chunk(session.id, 0, bomb, sha(bomb))
+    assert sum(inflated) <= upload_sessions.SESSION_MAX_BYTES + upload_sessions.INFLATE_STEP
+
+
+def test_bgzip_members_are_all_decompressed(sessions, sample_vcf):
+    import gzip
+    lines = sample_vcf.splitlines(keepends=True)
+    data  = b"".join(gzip.compress(line) for line in lines)     # one member per line, as bgzip writes blocks
+    session = sessions.create(current_kb(), "", "s.vcf.gz", chunk_size=CHUNK)
+    sessions.put_chunk(session.id, 0, data, sha(data))
+    variants, _ = session.finish(1)
+    assert {v["gene"] for v in variants} == {"CYP2D6", "CYP2C19"}
+
+
+def test_deadline_during_chunk_parse_is_reported(sessions, sample_vcf):
+    session = sessions.create(current_kb(), "", "s.vcf", chunk_size=CHUNK)
+    status  = sessions.put_chunk(session.id, 0, sample_vcf, sha(sample_vcf), Deadline(0))
+    assert status["analysis_status"] == "partial"
+    assert status["deadline_exceeded_at"] == "parse"
+    assert session.status()["analysis_status"] == "partial"
+
+    payload = sessions.finalize(session.id, ["CODEINE", "CLOPIDOGREL"], 1, deadline=Deadline(30))
+    assert [(r["analysis_status"], r["deadline_exceeded_at"]) for r in payload["results"]] == [("partial", "parse")] * 2
+
+
+def test_chunk_put_takes_the_request_deadline(flask_client, sample_vcf):
+    upload_id = flask_client.post("/api/uploads", data={"filename": "s.vcf"}).get_json()["upload_id"]
+    r = flask_client.put(f"/api/uploads/{upload_id}/chunks/0?deadline_ms=0.001", data=sample_vcf,
+                         headers={"X-Chunk-SHA256": sha(sample_vcf)})
+    assert r.status_code == 200
+    assert r.get_json()["deadline_exceeded_at"] == "parse"
+
+    r = flask_client.post(f"/api/uploads/{upload_id}/finalize", data={"drug": "CODEINE", "total_chunks": "1"})
+    assert r.status_code == 200
+    assert r.headers["X-Analysis-Status"] == "partial"
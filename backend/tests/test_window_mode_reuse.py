@@ -0,0 +1,82 @@
+"""
+Window-mode parses skip records (vcf_parser.py); they must never stand in
+for a full parse of the same file in the profile store or the shared
+cache, nor the other way round.
+"""
+
+import hashlib
+
+import pytest
+
+from analysis import analyze_file
+from knowledge_base import current as current_kb
+from profile_store import ProfileStore
+from shared_cache import MemoryBackend, SharedCache
+from upload_sessions import UploadSessions
+
+# Placeholder coordinates: outside every pharmacogene window, so window
+# mode drops both records; a full parse calls CYP2D6 *4/*10 from the tags.
+PLACEHOLDER_VCF = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n"
+    "22\t1\trs3892097\tC\tT\t.\tPASS\tGENE=CYP2D6;STAR=*4\tGT\t0/1\n"
+    "22\t2\trs1065852\tG\tA\t.\tPASS\tGENE=CYP2D6;STAR=*10\tGT\t0/1\n"
+).encode()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles.db"))
+
+
+@pytest.fixture
+def cache():
+    return SharedCache(MemoryBackend(1024 * 1024, 60))
+
+
+@pytest.fixture
+def vcf_path(tmp_path):
+    path = tmp_path / "p.vcf"
+    path.write_bytes(PLACEHOLDER_VCF)
+    return str(path)
+
+
+def codeine(payload: dict) -> tuple:
+    r = payload["results"][0]
+    return r["risk_assessment"]["risk_label"], r["pharmacogenomic_profile"]["diplotype"]
+
+
+def test_full_upload_after_window_upload_is_parsed_again(store, vcf_path):
+    kb = current_kb()
+    windowed = analyze_file(vcf_path, ["CODEINE"], "P9", kb, window_filter=True, store=store)
+    assert codeine(windowed) == ("Safe", "*1/*1")
+    assert store.get("P9") is None
+
+    full = analyze_file(vcf_path, ["CODEINE"], "P9", kb, window_filter=False, store=store)
+    assert codeine(full) == ("Adjust Dosage", "*4/*10")
+
+
+def test_window_mode_upload_session_is_not_stored(store, tmp_path):
+    sessions = UploadSessions(str(tmp_path / "sessions"))
+    session  = sessions.create(current_kb(), "P9", "p.vcf", window_filter=True)
+    sessions.put_chunk(session.id, 0, PLACEHOLDER_VCF, hashlib.sha256(PLACEHOLDER_VCF).hexdigest())
+    sessions.finalize(session.id, ["CODEINE"], 1, store)
+    assert store.get("P9") is None
+
+
+@pytest.mark.parametrize("first, second", [(True, False), (False, True)])
+def test_window_and_full_parses_are_cached_apart(cache, vcf_path, first, second):
+    kb       = current_kb()
+    expected = {True: ("Safe", "*1/*1"), False: ("Adjust Dosage", "*4/*10")}
+    assert codeine(analyze_file(vcf_path, ["CODEINE"], "P9", kb, window_filter=first, cache=cache)) == expected[first]
+    assert codeine(analyze_file(vcf_path, ["CODEINE"], "P9", kb, window_filter=second, cache=cache)) == expected[second]
+
+
+def test_window_mode_upload_session_is_cached_apart(cache, vcf_path, tmp_path):
+    sessions = UploadSessions(str(tmp_path / "sessions"))
+    session  = sessions.create(current_kb(), "P9", "p.vcf", window_filter=True)
+    sessions.put_chunk(session.id, 0, PLACEHOLDER_VCF, hashlib.sha256(PLACEHOLDER_VCF).hexdigest())
+    assert codeine(sessions.finalize(session.id, ["CODEINE"], 1, cache=cache)) == ("Safe", "*1/*1")
+
+    full = analyze_file(vcf_path, ["CODEINE"], "P9", current_kb(), window_filter=False, cache=cache)
+    assert codeine(full) == ("Adjust Dosage", "*4/*10")
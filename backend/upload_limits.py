@@ -0,0 +1,118 @@
+"""
+upload_limits.py — PharmaGuard
+Incremental enforcement of upload limits while the request body streams in.
+
+Werkzeug's multipart parser writes each uploaded file into a stream object
+chunk by chunk as it reads the socket. `LimitedRequest` hands it a
+`LimitedUploadStream`, which counts bytes and tracks the current line
+length on every write and raises 413 the moment either limit is exceeded,
+so an oversized or single-giant-line upload is abandoned after at most one
+read buffer past the limit instead of after the whole body has been
+buffered.
+
+Limits come from the Flask config:
+    MAX_UPLOAD_FILE_BYTES  per-file size limit
+    MAX_UPLOAD_LINE_BYTES  longest permitted line in an uploaded file
+(MAX_CONTENT_LENGTH still caps the whole request body.)
+
+`UploadMeter` is the framework-free core; the ASGI app (asgi_app.py)
+applies it to the raw request body as it is received. Flask is only
+imported when `LimitedRequest` is first used, so the ASGI app and the
+batch tools start without it.
+"""
+
+from tempfile import SpooledTemporaryFile
+
+SPOOL_MAX_MEMORY = 512 * 1024
+
+
+class UploadLimitExceeded(Exception):
+    """413 raised mid-stream; `description` names the limit that was hit."""
+
+    code = 413
+
+    def __init__(self, description: str):
+        super().__init__(description)
+        self.description = description
+
+
+def _fmt_bytes(n: int) -> str:
+    if n >= 1024 * 1024:
+        return f"{n / (1024 * 1024):g} MB"
+    return f"{n / 1024:g} KB"
+
+
+class UploadMeter:
+    """Running byte count and line-length tracker over a stream of chunks."""
+
+    def __init__(self, max_bytes: int | None, max_line_bytes: int | None):
+        self.max_bytes      = max_bytes
+        self.max_line_bytes = max_line_bytes
+        self.bytes_seen     = 0
+        self._line_len      = 0
+
+    def feed(self, data: bytes) -> None:
+        """Account for the next chunk; raises UploadLimitExceeded on the first violation."""
+        self.bytes_seen += len(data)
+        if self.max_bytes is not None and self.bytes_seen > self.max_bytes:
+            raise UploadLimitExceeded(
+                f"File too large. Maximum allowed size is {_fmt_bytes(self.max_bytes)}."
+            )
+        if self.max_line_bytes is not None:
+            self._check_lines(data)
+
+    def _check_lines(self, data: bytes) -> None:
+        last_nl = data.rfind(b"\n")
+        if last_nl == -1:
+            self._line_len += len(data)
+            longest = self._line_len
+        else:
+            first_nl = data.find(b"\n")
+            longest  = self._line_len + first_nl
+            if first_nl != last_nl:
+                longest = max(longest, max(map(len, data[first_nl + 1:last_nl].split(b"\n"))))
+            self._line_len = len(data) - last_nl - 1
+            longest = max(longest, self._line_len)
+        if longest > self.max_line_bytes:
+            raise UploadLimitExceeded(
+                f"Line too long. Maximum allowed line length is {_fmt_bytes(self.max_line_bytes)}."
+            )
+
+
+class LimitedUploadStream(SpooledTemporaryFile):
+    """Spooled temp file that rejects writes past size / line-length limits."""
+
+    def __init__(self, max_bytes: int | None, max_line_bytes: int | None):
+        super().__init__(max_size=SPOOL_MAX_MEMORY, mode="rb+")
+        self.meter = UploadMeter(max_bytes, max_line_bytes)
+
+    @property
+    def bytes_written(self) -> int:
+        return self.meter.bytes_seen
+
+    def write(self, data: bytes) -> int:
+        self.meter.feed(data)
+        return super().write(data)
+
+
+def _limited_request_class():
+    from flask import Request, current_app
+
+    class LimitedRequest(Request):
+        """Flask request class whose file uploads are limit-checked while streaming."""
+
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            config = current_app.config
+            return LimitedUploadStream(
+                config.get("MAX_UPLOAD_FILE_BYTES"),
+                config.get("MAX_UPLOAD_LINE_BYTES"),
+            )
+
+    return LimitedRequest
+
+
+def __getattr__(name: str):
+    if name == "LimitedRequest":
+        globals()[name] = cls = _limited_request_class()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
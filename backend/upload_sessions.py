@@ -0,0 +1,365 @@
+"""
+upload_sessions.py — PharmaGuard
+Resumable, chunked uploads for large VCFs.
+
+    POST   /api/uploads                      create a session → upload_id, chunk_size
+    PUT    /api/uploads/<id>/chunks/<index>  one chunk (raw body, X-Chunk-SHA256 header)
+    GET    /api/uploads/<id>                 chunks received so far (for resuming)
+    POST   /api/uploads/<id>/finalize        drug=..., total_chunks=N → /api/analyze payload
+    DELETE /api/uploads/<id>                 abandon the session
+
+Chunks are numbered from 0 and are at most `chunk_size` bytes. Each one is
+checked against its SHA-256 and then fed straight into an incremental
+`VcfParser`, so by the time the last chunk lands the file is parsed and
+finalize only runs the (cheap) risk evaluation. The file is never
+reassembled: the parser, the upload meter (size and line-length limits,
+see upload_limits.py) and a running SHA-256 of the whole file — the
+profile-store key — all consume chunks in order. A chunk that arrives
+ahead of a missing one is spooled to disk until the gap is filled.
+
+Re-sending an accepted chunk with the same checksum is acknowledged, so a
+client that lost a response simply retries; a different checksum for an
+accepted index is a 409. gzip/bgzip uploads are detected from the first
+chunk and decompressed incrementally.
+
+Spooled chunks count against the session's size limit too: a chunk whose
+index could only lie past PHARMAGUARD_UPLOAD_SESSION_MAX_BYTES, or that
+would take the bytes received past it, is refused with 413 before
+anything is written.
+
+Parsing runs under each request's deadline (deadlines.py): a chunk PUT
+or finalize that runs out of time stops parsing the session for good.
+The PUT still accepts the chunk and reports "analysis_status": "partial"
+with `deadline_exceeded_at`. Later chunks are only hashed and metered,
+and finalize returns the same every-drug-partial payload that
+/api/analyze returns for a file whose parse ran out of time.
+
+Sessions live in the memory of the process that created them (run one
+worker, or route /api/uploads/<id> stickily) and expire after
+UPLOAD_SESSION_TTL seconds without a request.
+
+Environment:
+    PHARMAGUARD_UPLOAD_CHUNK_BYTES        default / largest chunk size
+    PHARMAGUARD_UPLOAD_SESSION_MAX_BYTES  decompressed size limit per session
+    PHARMAGUARD_UPLOAD_SESSION_TTL        idle seconds before a session expires
+    PHARMAGUARD_UPLOAD_SESSIONS_MAX       concurrent sessions
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+
+from analysis import analyze_parsed, unparsed_payload
+from deadlines import DeadlineExceeded
+from upload_limits import UploadLimitExceeded, UploadMeter
+from vcf_parser import VCF_WINDOW_FILTER, VcfParser
+
+# ──────────────────────────────────────────────
+# Config
+# ──────────────────────────────────────────────
+CHUNK_BYTES         = int(os.environ.get("PHARMAGUARD_UPLOAD_CHUNK_BYTES", 1024 * 1024))
+MIN_CHUNK_BYTES     = 64 * 1024
+SESSION_MAX_BYTES   = int(os.environ.get("PHARMAGUARD_UPLOAD_SESSION_MAX_BYTES", 1024 * 1024 * 1024))
+UPLOAD_SESSION_TTL  = float(os.environ.get("PHARMAGUARD_UPLOAD_SESSION_TTL", 3600))
+MAX_UPLOAD_SESSIONS = int(os.environ.get("PHARMAGUARD_UPLOAD_SESSIONS_MAX", 64))
+INFLATE_STEP        = 1024 * 1024   # most decompressed bytes produced before the meter sees them
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class UploadSessionError(Exception):
+    """Client-facing session error; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status  = status
+
+
+# ──────────────────────────────────────────────
+# Session
+# ──────────────────────────────────────────────
+class UploadSession:
+    """One chunked upload, parsed as its chunks arrive in order."""
+
+    def __init__(self, upload_id: str, spool_dir: str, kb, patient_id: str, filename: str,
+                 chunk_size: int, window_filter: bool | None, max_line_bytes: int | None):
+        self.id         = upload_id
+        self.kb         = kb
+        self.patient_id = patient_id
+        self.filename   = filename
+        self.chunk_size = chunk_size
+        self.spool_dir  = spool_dir
+        self.touched    = time.monotonic()
+        self.lock       = threading.Lock()
+
+        self.window_filter  = VCF_WINDOW_FILTER if window_filter is None else bool(window_filter)
+        self.checksums      = {}      # index → sha256 of every accepted chunk
+        self.next_index     = 0       # first chunk not yet fed to the parser
+        self.bytes_received = 0
+        self._spooled       = set()
+        self._sha           = hashlib.sha256()
+        self._inflate       = None
+        self._tail          = b""
+        self._meter         = UploadMeter(SESSION_MAX_BYTES, max_line_bytes)
+        self._parser        = VcfParser(kb, self.window_filter)
+        self.deadline_step  = None    # where a request deadline cut parsing short (then abandoned)
+
+    # ── chunks ────────────────────────────────
+    def put_chunk(self, index: int, data: bytes, checksum: str, deadline=None) -> bool:
+        """
+        Accept chunk `index`; False when it was already accepted (a retry).
+        Parsing it and any spooled chunks it unblocks runs under `deadline`.
+        """
+        checksum = (checksum or "").strip().lower()
+        if not checksum:
+            raise UploadSessionError("Missing X-Chunk-SHA256 header.")
+        if index < 0:
+            raise UploadSessionError("Chunk index must be 0 or greater.")
+        if len(data) > self.chunk_size:
+            raise UploadSessionError(f"Chunk larger than the session chunk size ({self.chunk_size} bytes).")
+        if hashlib.sha256(data).hexdigest() != checksum:
+            raise UploadSessionError(f"Checksum mismatch for chunk {index}; re-send it.")
+        if index > SESSION_MAX_BYTES // self.chunk_size:
+            raise UploadLimitExceeded(f"Chunk {index} lies beyond the session size limit "
+                                      f"({SESSION_MAX_BYTES // (1024 * 1024)} MB).")
+
+        with self.lock:
+            accepted = self.checksums.get(index)
+            if accepted is not None:
+                if accepted != checksum:
+                    raise UploadSessionError(f"Chunk {index} was already received with different content.", 409)
+                return False
+            # The meter only sees chunks consumed in order; this also bounds the spool
+            if self.bytes_received + len(data) > SESSION_MAX_BYTES:
+                raise UploadLimitExceeded(f"File too large. Maximum allowed size is "
+                                          f"{SESSION_MAX_BYTES // (1024 * 1024)} MB.")
+            self.checksums[index] = checksum
+            self.bytes_received  += len(data)
+            if index == self.next_index:
+                self._parser.deadline = deadline
+                try:
+                    self._consume(data)
+                    self._drain()
+                finally:
+                    self._parser.deadline = None
+            else:
+                with open(self._spool_path(index), "wb") as f:
+                    f.write(data)
+                self._spooled.add(index)
+        return True
+
+    def _spool_path(self, index: int) -> str:
+        return os.path.join(self.spool_dir, f"{index}.part")
+
+    def _drain(self) -> None:
+        while self.next_index in self._spooled:
+            path = self._spool_path(self.next_index)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.remove(path)
+            self._spooled.discard(self.next_index)
+            self._consume(data)
+
+    def _consume(self, data: bytes) -> None:
+        self.next_index += 1
+        self._sha.update(data)
+        if self._inflate is None and self.next_index == 1 and data.startswith(_GZIP_MAGIC):
+            self._inflate = zlib.decompressobj(wbits=47)
+        try:
+            for text in self._decompress(data):
+                self._feed(text)
+        except zlib.error as e:
+            raise UploadSessionError(f"Could not decompress upload: {e}", 422) from e
+
+    def _decompress(self, data: bytes):
+        """
+        Yield `data` decompressed in pieces of at most INFLATE_STEP bytes, so
+        the meter stops a compression bomb after one step past the limit.
+        """
+        if self._inflate is None:
+            yield data
+            return
+        while True:
+            # bgzip files are a series of gzip members
+            if self._inflate.eof and data:
+                self._inflate = zlib.decompressobj(wbits=47)
+            out  = self._inflate.decompress(data, INFLATE_STEP)
+            data = self._inflate.unused_data if self._inflate.eof else self._inflate.unconsumed_tail
+            if out:
+                yield out
+            if not data and len(out) < INFLATE_STEP:
+                return
+
+    def _feed(self, text: bytes) -> None:
+        self._meter.feed(text)
+        if self._parser.done or self.deadline_step:
+            return
+        buf = self._tail + text
+        cut = buf.rfind(b"\n") + 1
+        self._tail = buf[cut:]
+        if cut:
+            try:
+                if self._parser.deadline is not None:
+                    self._parser.deadline.check("parse")
+                self._parser.feed_lines(buf[:cut].decode("utf-8", "replace").splitlines(keepends=True))
+            except DeadlineExceeded as e:
+                # The parser stopped mid-chunk: its variants can no longer be trusted
+                self.deadline_step = e.step
+                self._tail = b""
+
+    # ── finish ────────────────────────────────
+    def finish(self, total_chunks: int, deadline=None) -> tuple:
+        """
+        (variants, file hash) once chunks 0..total_chunks-1 have all been fed;
+        variants is None if a deadline abandoned the parse.
+        """
+        with self.lock:
+            if total_chunks < 1:
+                raise UploadSessionError("total_chunks must be at least 1.")
+            missing = [i for i in range(total_chunks) if i not in self.checksums]
+            if missing:
+                raise UploadSessionError(
+                    f"{len(missing)} chunk(s) missing, first {missing[0]}; upload them and finalize again.", 409,
+                )
+            extra = [i for i in self.checksums if i >= total_chunks]
+            if extra:
+                raise UploadSessionError(f"Chunk {min(extra)} is beyond total_chunks={total_chunks}.")
+            self._parser.deadline = deadline
+            try:
+                if self._inflate is not None:
+                    self._feed(self._inflate.flush())
+            finally:
+                self._parser.deadline = None
+            if self.deadline_step:
+                return None, self._sha.hexdigest()
+            if self._tail and not self._parser.done:
+                self._parser.feed_line(self._tail.decode("utf-8", "replace"))
+            self._tail = b""
+            return self._parser.finish(), self._sha.hexdigest()
+
+    def analyze(self, target_drugs: list, total_chunks: int, store=None, cache=None,
+                fields: frozenset | None = None, deadline=None) -> dict:
+        """
+        Finish parsing and build the /api/analyze payload (saved to `store`
+        and `cache` if given). Window-mode parses are not stored as the
+        patient's profile and are cached apart: they skip records (see
+        analysis.analyze_file). If a deadline abandoned the parse, every drug
+        comes back partial.
+        """
+        variants, digest = self.finish(total_chunks, deadline)
+        patient_id = self.patient_id or "PATIENT_001"
+        if variants is None:
+            return unparsed_payload(target_drugs, patient_id, self.kb, fields, self.deadline_step)
+        if not self.patient_id:
+            store = None
+        return analyze_parsed(variants, target_drugs, patient_id, self.kb,
+                              store, digest, cache, fields, deadline, self.window_filter)
+
+    def parse_status(self) -> dict:
+        """The partial marker once a deadline has abandoned parsing, else nothing."""
+        if not self.deadline_step:
+            return {}
+        return {"analysis_status": "partial", "deadline_exceeded_at": self.deadline_step}
+
+    def status(self) -> dict:
+        return {
+            "upload_id":      self.id,
+            "filename":       self.filename,
+            "chunk_size":     self.chunk_size,
+            "received":       sorted(self.checksums),
+            "next_index":     self.next_index,
+            "bytes_received": self.bytes_received,
+            "variants_found": len(self._parser.variants),
+            "expires_in":     round(max(UPLOAD_SESSION_TTL - (time.monotonic() - self.touched), 0)),
+            **self.parse_status(),
+        }
+
+
+# ──────────────────────────────────────────────
+# Registry
+# ──────────────────────────────────────────────
+class UploadSessions:
+    """Process-local registry of open sessions with idle expiry."""
+
+    def __init__(self, spool_root: str):
+        self.spool_root = spool_root
+        self._sessions  = {}
+        self._lock      = threading.Lock()
+
+    def create(self, kb, patient_id: str, filename: str, chunk_size: int | None = None,
+               window_filter: bool | None = None, max_line_bytes: int | None = None) -> UploadSession:
+        if not filename.lower().endswith((".vcf", ".vcf.gz", ".vcf.bgz")):
+            raise UploadSessionError("Invalid file type. Please upload a .vcf file.")
+        chunk_size = min(max(chunk_size or CHUNK_BYTES, MIN_CHUNK_BYTES), CHUNK_BYTES)
+        self.expire()
+        with self._lock:
+            if len(self._sessions) >= MAX_UPLOAD_SESSIONS:
+                raise UploadSessionError("Too many open upload sessions; try again later.", 503)
+            upload_id = uuid.uuid4().hex
+            spool_dir = os.path.join(self.spool_root, upload_id)
+            os.makedirs(spool_dir)
+            session = UploadSession(upload_id, spool_dir, kb, patient_id, filename,
+                                    chunk_size, window_filter, max_line_bytes)
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        self.expire()
+        session = self._sessions.get(upload_id)
+        if session is None:
+            raise UploadSessionError(f"No upload session '{upload_id}' (finished or expired).", 404)
+        session.touched = time.monotonic()
+        return session
+
+    def put_chunk(self, upload_id: str, index: int, data: bytes, checksum: str, deadline=None) -> dict:
+        """
+        Accept one chunk; a session that hits a limit or can't be decoded is
+        closed. Once a deadline has abandoned the session's parse, the
+        status says so (analysis_status "partial", deadline_exceeded_at).
+        """
+        session = self.get(upload_id)
+        try:
+            fresh = session.put_chunk(index, data, checksum, deadline)
+        except UploadLimitExceeded:
+            self.close(upload_id)
+            raise
+        except UploadSessionError as e:
+            if e.status == 422:
+                self.close(upload_id)
+            raise
+        return {
+            "upload_id":       upload_id,
+            "index":           index,
+            "duplicate":       not fresh,
+            "next_index":      session.next_index,
+            "chunks_received": len(session.checksums),
+            "bytes_received":  session.bytes_received,
+            **session.parse_status(),
+        }
+
+    def finalize(self, upload_id: str, target_drugs: list, total_chunks: int,
+                 store=None, cache=None, fields: frozenset | None = None, deadline=None) -> dict:
+        """The /api/analyze payload for a complete session, which is then closed."""
+        payload = self.get(upload_id).analyze(target_drugs, total_chunks, store, cache, fields, deadline)
+        self.close(upload_id)
+        return payload
+
+    def close(self, upload_id: str) -> bool:
+        with self._lock:
+            session = self._sessions.pop(upload_id, None)
+        if session is not None:
+            shutil.rmtree(session.spool_dir, ignore_errors=True)
+        return session is not None
+
+    def expire(self) -> None:
+        cutoff = time.monotonic() - UPLOAD_SESSION_TTL
+        for upload_id in [s.id for s in list(self._sessions.values()) if s.touched < cutoff]:
+            self.close(upload_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,445 @@
+"""
+vcf_parser.py — PharmaGuard
+VCF parsing and validation.
+
+Variants are taken from, in order of preference per record:
+  1. GENE=/STAR= INFO annotations
+  2. SnpEff ANN= annotations
+  3. VEP CSQ= annotations
+  4. the built-in genotype caller (star_caller.py), which matches the
+     record's position/rsID against the knowledge base's defining variants
+     — this is what lets raw, un-annotated VCFs be analysed directly.
+
+`VcfParser` is incremental: feed it lines as they become available and
+call `finish()` once; `parse_vcf()` is the file-based wrapper and reads
+plain or gzip/bgzip-compressed files.
+
+Window mode (`window_filter=True`) checks CHROM/POS against the knowledge
+base's pharmacogene windows before anything else is split or inspected,
+so records elsewhere in the genome cost one partial split and an integer
+comparison. On coordinate-sorted input the parser also sets `done` once it
+is past the last window of every relevant chromosome (chromosomes are
+expected in ##contig header order when the header lists them, as GATK and
+bcftools write them); callers stop reading there. If records are
+seen out of order, early exit is disabled for the rest of the file —
+filtering by window stays correct regardless of order.
+
+SnpEff and VEP write one ANN/CSQ entry per overlapping transcript, so a
+single record routinely repeats the same gene and allele ten or more
+times. Entries are collapsed per record on (gene, allele) with a small
+seen-set: each allele is reported once, with the record's copies, so
+duplicates neither inflate the payload nor count twice towards a
+diplotype. `transcripts` optionally keeps what was collapsed —
+"count" adds `transcript_count` (entries seen) and "list" adds
+`transcripts` (distinct transcript IDs: ANN Feature_ID, or CSQ Feature
+when the ##INFO=<ID=CSQ> header gives the field order).
+
+gVCFs are recognised from their header (##GVCFBlock, or a NON_REF / <*>
+symbolic ALT definition). Their reference blocks — records whose only
+ALT is <NON_REF> or <*> — are identified by a substring test on the raw
+line and dropped without splitting it; they are counted in `stats`.
+"""
+
+import gzip
+import logging
+import os
+
+from deadlines import DEADLINE_CHECK_LINES, DeadlineExceeded
+from knowledge_base import current as current_kb
+from star_caller import normalise_chrom
+
+log = logging.getLogger(__name__)
+
+# Default for window mode; requests can override it.
+VCF_WINDOW_FILTER = os.environ.get("PHARMAGUARD_VCF_WINDOW_FILTER", "0") == "1"
+
+# What to keep of collapsed ANN/CSQ transcript entries: "" (nothing),
+# "count" or "list"; callers can override it.
+VCF_TRANSCRIPTS  = os.environ.get("PHARMAGUARD_VCF_TRANSCRIPTS", "").lower()
+TRANSCRIPT_MODES = ("", "count", "list")
+
+# Records whose INFO column is longer than this are skipped (and counted)
+# so one giant ANN/CSQ block can't fan out into thousands of variant dicts.
+MAX_INFO_BYTES = int(os.environ.get("PHARMAGUARD_MAX_INFO_BYTES", 128 * 1024))
+
+# Validation scans this many informative data lines; gVCF reference blocks
+# don't count against it but the total is still capped.
+VALIDATE_MAX_DATA_LINES  = 2000
+VALIDATE_MAX_TOTAL_LINES = 500_000
+
+_GVCF_HEADER_MARKERS = ("##GVCFBlock", "##ALT=<ID=NON_REF", "##ALT=<ID=*,")
+_REF_BLOCK_ALTS      = ("\t<NON_REF>\t", "\t<*>\t")
+
+
+def is_gvcf_header(line: str) -> bool:
+    return line.startswith(_GVCF_HEADER_MARKERS)
+
+
+def is_reference_block(line: str) -> bool:
+    """True when a data line's ALT column is only a symbolic reference allele."""
+    return _REF_BLOCK_ALTS[0] in line or _REF_BLOCK_ALTS[1] in line
+
+
+def genotype_copies(cols: list) -> int | None:
+    """Non-reference allele count in the first sample's GT, or None if not called."""
+    calls = _gt_calls(cols)
+    if calls is None:
+        return None
+    return sum(1 for c in calls if c not in ("0", "."))
+
+
+def _gt_calls(cols: list) -> list | None:
+    if len(cols) < 10 or not cols[8].startswith("GT"):
+        return None
+    calls = cols[9].split(":", 1)[0].replace("|", "/").split("/")
+    if all(c == "." for c in calls):
+        return None
+    return calls
+
+
+def has_annotation(info: str) -> bool:
+    info_upper = info.upper()
+    return ("GENE=" in info_upper and "STAR=" in info_upper) or "ANN=" in info or "CSQ=" in info
+
+
+# ──────────────────────────────────────────────
+# Parser
+# ──────────────────────────────────────────────
+class VcfParser:
+    """Line-at-a-time VCF → variant list parser for one sample."""
+
+    def __init__(self, kb=None, window_filter: bool = False, transcripts: str | None = None,
+                 deadline=None):
+        transcripts = VCF_TRANSCRIPTS if transcripts is None else (transcripts or "").lower()
+        if transcripts not in TRANSCRIPT_MODES:
+            raise ValueError(f"transcripts must be one of {TRANSCRIPT_MODES}, got {transcripts!r}")
+        self.kb          = kb or current_kb()
+        self.transcripts = transcripts
+        self.deadline    = deadline   # deadlines.Deadline, checked by feed_lines
+        self.variants    = []
+        self.genotypes   = self.kb.star_index.new_sample()
+        self.done        = False
+        self.gvcf        = False
+        self.stats       = {
+            "records":               0,
+            "outside_windows":       0,
+            "reference_blocks":      0,
+            "oversized_info":        0,
+            "collapsed_annotations": 0,
+            "early_exit":            False,
+            "sorted":                True,
+        }
+
+        self.windows = self.kb.gene_windows if window_filter and self.kb.gene_windows else None
+        self._contig_order = {}
+        self._raw_chrom    = None
+        self._chrom        = None
+        self._pos          = -1
+        self._seen_chroms  = set()
+        self._finished     = set()
+        self._csq_feature  = None     # index of Feature in CSQ entries, from the header
+
+    def _add(self, gene: str, allele: str, rsid: str, copies: int) -> None:
+        self.variants.append({
+            "gene":      gene,
+            "allele":    allele,
+            "rsid":      rsid,
+            "phenotype": self.kb.infer_phenotype(gene, allele),
+            "copies":    copies,
+        })
+
+    def feed_lines(self, lines) -> None:
+        """Feed lines in order; raises DeadlineExceeded once the parser's deadline has passed."""
+        check = self.deadline.check if self.deadline is not None else None
+        for n, line in enumerate(lines, 1):
+            self.feed_line(line)
+            if self.done:
+                break
+            if check is not None and not n % DEADLINE_CHECK_LINES:
+                check("parse")
+
+    def feed_line(self, line: str) -> None:
+        if line.startswith("#"):
+            if self.windows is not None and line.startswith("##contig=<ID="):
+                contig = normalise_chrom(line[13:].split(",", 1)[0].rstrip(">\n"))
+                self._contig_order.setdefault(contig, len(self._contig_order))
+            elif not self.gvcf and is_gvcf_header(line):
+                self.gvcf = True
+            elif line.startswith("##INFO=<ID=CSQ,") and "Format: " in line:
+                fields = line.split("Format: ", 1)[1].split('"', 1)[0].split("|")
+                if "Feature" in fields:
+                    self._csq_feature = fields.index("Feature")
+            return
+        if self.gvcf and is_reference_block(line):
+            self.stats["reference_blocks"] += 1
+            return
+        if self.windows is not None and not self._in_window(line):
+            return
+        if not line.strip():
+            return
+        cols = line.strip().split("\t")
+        if len(cols) < 8:
+            return
+        rsid = cols[2] if len(cols) > 2 else "."
+        info = cols[7]
+        if len(info) > MAX_INFO_BYTES:
+            self.stats["oversized_info"] += 1
+            if self.stats["oversized_info"] == 1:
+                log.warning(f"Skipping VCF record(s) with INFO longer than {MAX_INFO_BYTES} bytes")
+            return
+
+        if not has_annotation(info):
+            self._observe_genotype(cols, rsid)
+            return
+
+        copies = genotype_copies(cols)
+        if copies == 0:
+            return    # homozygous reference: allele not carried
+        copies = copies or 1
+
+        if "GENE=" in info.upper() and "STAR=" in info.upper():
+            fields = {}
+            for item in info.split(";"):
+                if "=" in item:
+                    k, v = item.split("=", 1)
+                    fields[k.strip().upper()] = v.strip()
+            gene = fields.get("GENE", "").upper()
+            star = fields.get("STAR", "")
+            if gene and star:
+                self._add(gene, star, rsid, copies)
+            return
+
+        if "ANN=" in info:
+            ann_block = info.split("ANN=", 1)[1].split(";")[0]
+            hits = []
+            for entry in ann_block.split(","):
+                parts = entry.split("|")
+                if len(parts) >= 4:
+                    gene = parts[3].strip().upper()
+                    if gene:
+                        hits.append((gene, parts[0].strip() or ".", parts[6] if len(parts) > 6 else ""))
+            self._add_collapsed(hits, rsid, copies)
+            return
+
+        if "CSQ=" in info:
+            csq_block = info.split("CSQ=", 1)[1].split(";")[0]
+            feature   = self._csq_feature
+            hits = []
+            for entry in csq_block.split(","):
+                parts = entry.split("|")
+                if len(parts) >= 2:
+                    gene = parts[1].strip().upper()
+                    if gene:
+                        transcript = parts[feature] if feature is not None and len(parts) > feature else ""
+                        hits.append((gene, parts[0].strip(), transcript))
+            self._add_collapsed(hits, rsid, copies)
+
+    def _add_collapsed(self, hits: list, rsid: str, copies: int) -> None:
+        """One variant per distinct (gene, allele) among a record's ANN/CSQ entries."""
+        mode = self.transcripts
+        seen = {}
+        for gene, allele, transcript in hits:
+            variant = seen.get((gene, allele))
+            if variant is None:
+                self._add(gene, allele, rsid, copies)
+                variant = seen[(gene, allele)] = self.variants[-1]
+                if mode == "count":
+                    variant["transcript_count"] = 0
+                elif mode == "list":
+                    variant["transcripts"] = []
+            if mode == "count":
+                variant["transcript_count"] += 1
+            elif mode == "list":
+                transcript = transcript.strip()
+                if transcript and transcript not in variant["transcripts"]:
+                    variant["transcripts"].append(transcript)
+        self.stats["collapsed_annotations"] += len(hits) - len(seen)
+
+    # ── window mode ──────────────────────────
+    def _in_window(self, line: str) -> bool:
+        parts = line.split("\t", 2)
+        if len(parts) < 3:
+            return False
+        if parts[0] != self._raw_chrom:
+            self._enter_chrom(parts[0])
+        try:
+            pos = int(parts[1])
+        except ValueError:
+            return False
+
+        self.stats["records"] += 1
+        if pos < self._pos:
+            self._mark_unsorted()
+        self._pos = pos
+
+        chrom = self._chrom
+        if self.windows.contains(chrom, pos):
+            return True
+        self.stats["outside_windows"] += 1
+        if (
+            self.stats["sorted"]
+            and chrom in self.windows.chroms
+            and chrom not in self._finished
+            and pos > self.windows.last_end[chrom]
+        ):
+            self._finished.add(chrom)
+            self._check_done()
+        return False
+
+    def _enter_chrom(self, raw_chrom: str) -> None:
+        chrom = normalise_chrom(raw_chrom)
+        if self._chrom is not None and self._chrom in self.windows.chroms:
+            self._finished.add(self._chrom)      # sorted input never comes back
+        order = self._contig_order.get(chrom)
+        prev  = self._contig_order.get(self._chrom)
+        if chrom in self._seen_chroms or (order is not None and prev is not None and order < prev):
+            self._mark_unsorted()
+        self._seen_chroms.add(chrom)
+        self._raw_chrom, self._chrom, self._pos = raw_chrom, chrom, -1
+
+        if order is not None:
+            self._finished.update(
+                c for c in self.windows.chroms
+                if self._contig_order.get(c, order) < order
+            )
+        self._check_done()
+
+    def _mark_unsorted(self) -> None:
+        if self.stats["sorted"]:
+            self.stats["sorted"] = False
+            log.info("VCF is not coordinate-sorted; window early exit disabled")
+
+    def _check_done(self) -> None:
+        if self.stats["sorted"] and self._finished >= self.windows.chroms:
+            self.done = True
+            self.stats["early_exit"] = True
+
+    # ── genotype caller ──────────────────────
+    def _observe_genotype(self, cols: list, rsid: str) -> None:
+        index = self.kb.star_index
+        try:
+            pos = int(cols[1])
+        except ValueError:
+            return
+        calls = _gt_calls(cols)
+        for i, alt in enumerate(cols[4].split(",")):
+            dv = index.lookup(cols[0], pos, cols[3], alt, rsid)
+            if dv is None:
+                continue
+            copies = 1 if calls is None else sum(1 for c in calls if c == str(i + 1))
+            if copies:
+                self.genotypes.add(dv, copies)
+
+    def finish(self) -> list:
+        """Append genotype-called star alleles and return all variants."""
+        if self.genotypes:
+            for gene, allele, keys, copies in self.genotypes.call():
+                self._add(gene, allele, ",".join(keys), copies)
+            self.genotypes = self.kb.star_index.new_sample()
+        return self.variants
+
+
+def open_vcf(filepath: str):
+    """Open a plain or gzip/bgzip-compressed VCF as text (detected from the magic bytes)."""
+    with open(filepath, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(filepath, "rt", errors="replace")
+    return open(filepath, "r", errors="replace")
+
+
+def parse_vcf(filepath: str, kb=None, window_filter: bool | None = None,
+              transcripts: str | None = None, deadline=None) -> list:
+    if window_filter is None:
+        window_filter = VCF_WINDOW_FILTER
+    parser = VcfParser(kb, window_filter, transcripts, deadline)
+    try:
+        with open_vcf(filepath) as f:
+            parser.feed_lines(f)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        log.error(f"VCF parse error: {e}")
+    return parser.finish()
+
+
+# ──────────────────────────────────────────────
+# Validator
+# ──────────────────────────────────────────────
+def validate_vcf_content(filepath: str, kb=None) -> dict:
+    kb       = kb or current_kb()
+    errors   = []
+    warnings = []
+    has_format_header = False
+    gvcf              = False
+    data_lines        = 0
+    reference_blocks  = 0
+    parseable_lines   = 0
+    genotype_lines    = 0
+
+    try:
+        with open_vcf(filepath) as f:
+            for i, line in enumerate(f):
+                if i >= VALIDATE_MAX_TOTAL_LINES or data_lines - reference_blocks > VALIDATE_MAX_DATA_LINES:
+                    break
+                if line.startswith("#"):
+                    if line.startswith("##fileformat=VCF"):
+                        has_format_header = True
+                    elif is_gvcf_header(line):
+                        gvcf = True
+                    continue
+                if gvcf and is_reference_block(line):
+                    data_lines       += 1
+                    reference_blocks += 1
+                    continue
+                line = line.rstrip()
+                if not line:
+                    continue
+                data_lines += 1
+                cols = line.split("\t")
+                if len(cols) < 8:
+                    warnings.append(f"Line {i+1}: fewer than 8 columns.")
+                    continue
+                if has_annotation(cols[7]):
+                    parseable_lines += 1
+                elif _matches_defining_variant(kb, cols):
+                    parseable_lines += 1
+                    genotype_lines  += 1
+    except Exception as e:
+        errors.append(f"Could not read file: {e}")
+        return {"valid": False, "errors": errors, "warnings": warnings, "stats": {}}
+
+    if not has_format_header:
+        warnings.append("Missing ##fileformat=VCFv4.x header.")
+    if data_lines == 0:
+        errors.append("No data lines found. File appears empty or header-only.")
+    if parseable_lines == 0 and data_lines > 0:
+        errors.append(
+            "No parseable pharmacogenomic variants found. "
+            "INFO fields must contain GENE=/STAR=, ANN=, or CSQ= annotations, "
+            "or records must match a known pharmacogene defining variant."
+        )
+
+    return {
+        "valid":    len(errors) == 0,
+        "errors":   errors,
+        "warnings": warnings,
+        "stats": {
+            "total_data_lines":   data_lines,
+            "parseable_variants": parseable_lines,
+            "genotype_matches":   genotype_lines,
+            "gvcf":               gvcf,
+            "reference_blocks":   reference_blocks,
+        },
+    }
+
+
+def _matches_defining_variant(kb, cols: list) -> bool:
+    try:
+        pos = int(cols[1])
+    except ValueError:
+        return False
+    return any(
+        kb.star_index.lookup(cols[0], pos, cols[3], alt, cols[2]) is not None
+        for alt in cols[4].split(",")
+    )
@@ -1,4 +1,4 @@
-import { useState, useRef, useCallback } from "react";
+import { useState, useRef, useCallback, useEffect } from "react";
 
 /* ─────────────────────────────────────────────
    CONSTANTS
@@ -19,6 +19,119 @@ const RISK_META = {
 const getRisk = (label) =>
   RISK_META[label] || { color:"#6b7280", bg:"#f3f4f6", border:"#d1d5db", icon:"?" };
 
+const formatBytes = (n) =>
+  n >= 1048576 ? `${(n/1048576).toFixed(1)} MB` : n >= 1024 ? `${(n/1024).toFixed(1)} KB` : `${n} B`;
+
+/* ─────────────────────────────────────────────
+   VCF PRE-FILTER  (runs in vcfFilter.worker.js)
+   Resolves { blob, errors, warnings, stats } — the header plus the
+   records for `genes` only.
+───────────────────────────────────────────── */
+function runPrefilter(source, genes, geneFilter, onProgress) {
+  return new Promise((resolve, reject) => {
+    const worker = new Worker(new URL("./vcfFilter.worker.js", import.meta.url), { type:"module" });
+    worker.onmessage = ({ data }) => {
+      if (data.type === "progress") { onProgress?.(data.bytesRead, data.total); return; }
+      worker.terminate();
+      if (data.type === "done") resolve(data);
+      else reject(new Error(data.message));
+    };
+    worker.onerror = (e) => { worker.terminate(); reject(e); };
+    worker.postMessage({ id:1, source, genes, geneFilter });
+  });
+}
+
+/* ─────────────────────────────────────────────
+   CHUNKED, RESUMABLE UPLOAD  (backend: upload_sessions.py)
+   Files above CHUNKED_UPLOAD_THRESHOLD are sent as numbered, checksummed
+   chunks; the server parses them as they arrive. The session ID is kept
+   in localStorage under the picked file's identity, so re-running the
+   analysis after a dropped connection or a reload only sends the chunks
+   the server doesn't have yet.
+───────────────────────────────────────────── */
+const CHUNKED_UPLOAD_THRESHOLD = 4 * 1024 * 1024;
+const CHUNK_RETRIES            = 5;
+
+const sleep = (ms) => new Promise(r => setTimeout(r, ms));
+
+async function sha256Hex(buf) {
+  const digest = await crypto.subtle.digest("SHA-256", buf);
+  return [...new Uint8Array(digest)].map(b => b.toString(16).padStart(2, "0")).join("");
+}
+
+class UploadError extends Error {
+  constructor(message, status) { super(message); this.status = status; }
+}
+
+async function apiJSON(url, options) {
+  const res  = await fetch(url, options);
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new UploadError(data.error || `Server error (${res.status})`, res.status);
+  return data;
+}
+
+// One chunk, retried with backoff on network errors, 5xx and 429.
+async function putChunk(uploadId, index, body, checksum) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await apiJSON(`${API}/api/uploads/${uploadId}/chunks/${index}`, {
+        method:"PUT", body, headers:{ "X-Chunk-SHA256": checksum },
+      });
+    } catch (e) {
+      const retryable = !e.status || e.status >= 500 || e.status === 429;
+      if (!retryable || attempt >= CHUNK_RETRIES) throw e;
+      await sleep(500 * 2 ** attempt);
+    }
+  }
+}
+
+async function openSession(key, upload, patientId) {
+  const saved = localStorage.getItem(key);
+  if (saved) {
+    try { return await apiJSON(`${API}/api/uploads/${saved}`); }
+    catch { localStorage.removeItem(key); }   // finished or expired: start over
+  }
+  const fd = new FormData();
+  fd.append("filename", upload.name);
+  if (patientId) fd.append("patient_id", patientId);
+  const session = await apiJSON(`${API}/api/uploads`, { method:"POST", body:fd });
+  localStorage.setItem(key, session.upload_id);
+  return session;
+}
+
+// Same response as POST /api/analyze. `identity` is the file the user picked
+// (the upload itself may be a pre-filtered copy of it).
+async function chunkedAnalyze(upload, identity, drug, patientId, onProgress, restarted = false) {
+  const key = `pharmaguard-upload:${identity.name}:${identity.size}:${identity.lastModified}:${upload.size}:${patientId}`;
+  const session = await openSession(key, upload, patientId);
+  const { upload_id, chunk_size } = session;
+  const total = Math.max(1, Math.ceil(upload.size / chunk_size));
+  const have  = new Set(session.received || []);
+
+  try {
+    for (let i = 0; i < total; i++) {
+      if (!have.has(i)) {
+        const body = await upload.slice(i * chunk_size, (i + 1) * chunk_size).arrayBuffer();
+        await putChunk(upload_id, i, body, await sha256Hex(body));
+      }
+      onProgress?.(i + 1, total);
+    }
+    const fd = new FormData();
+    fd.append("drug", drug);
+    fd.append("total_chunks", String(total));
+    const data = await apiJSON(`${API}/api/uploads/${upload_id}/finalize`, { method:"POST", body:fd });
+    localStorage.removeItem(key);
+    return data;
+  } catch (e) {
+    // 409: the stored session holds different content; 404: it expired mid-way.
+    if ((e.status === 409 || e.status === 404) && !restarted) {
+      localStorage.removeItem(key);
+      return chunkedAnalyze(upload, identity, drug, patientId, onProgress, true);
+    }
+    throw e;
+  }
+}
+
 /* ─────────────────────────────────────────────
    PDF REPORT GENERATOR  (#1)
 ───────────────────────────────────────────── */
@@ -495,7 +608,20 @@ export default function App() {
   const [darkMode,    setDarkMode]    = useState(false);
   const [activeNav,   setActiveNav]   = useState(null);
   const [vcfStatus,   setVcfStatus]   = useState(null);         // #5: null|"checking"|"ok"|"error"
+  const [drugInfo,    setDrugInfo]    = useState(null);         // /api/drugs: drug_genes + gene_filter
+  const [prefiltered, setPrefiltered] = useState(null);         // worker result for the picked file
+  const [scanned,     setScanned]     = useState(0);
+  const [uploadPct,   setUploadPct]   = useState(null);         // chunked upload progress
   const fileInputRef  = useRef();
+  const pickRef       = useRef(0);                              // latest file pick, for stale worker results
+
+  /* ── drug → gene data for the client-side pre-filter ── */
+  useEffect(() => {
+    fetch(`${API}/api/drugs`)
+      .then(res => res.ok ? res.json() : null)
+      .then(data => { if (data?.gene_filter) setDrugInfo(data); })
+      .catch(() => {});   // no pre-filter: the full file is uploaded instead
+  }, []);
 
   /* ── theme ── */
   const bg        = darkMode ? "linear-gradient(135deg,#0d1117,#161d27,#1a2433)" : "linear-gradient(135deg,#f0f4f8,#e8eef4,#dde5ef)";
@@ -534,12 +660,39 @@ export default function App() {
     }
   }, []);
 
+  /* ── Local validation + pre-filter on file pick ──
+     The whole file is read once, in a worker, keeping only records for
+     the knowledge base's pharmacogenes; the reduced file is what gets
+     uploaded. Falls back to /api/validate when the worker can't run. */
+  const prefilterFile = useCallback(async (f) => {
+    if (!drugInfo || typeof Worker === "undefined") return validateFile(f);
+    const pick = ++pickRef.current;
+    setVcfStatus("checking");
+    setScanned(0);
+    try {
+      const genes  = Object.keys(drugInfo.gene_filter);
+      const result = await runPrefilter(f, genes, drugInfo.gene_filter, (n) => setScanned(n));
+      if (pick !== pickRef.current) return;
+      if (result.errors.length > 0) {
+        setVcfStatus("error");
+        setError(result.errors[0]);
+      } else {
+        setPrefiltered(result);
+        setVcfStatus("ok");
+        setError(null);
+      }
+    } catch {
+      validateFile(f);
+    }
+  }, [drugInfo, validateFile]);
+
   const handleFilePick = (f) => {
     if (!f) return;
     if (!f.name.endsWith(".vcf")) { setError("Please upload a .vcf file."); return; }
     setFile(f);
+    setPrefiltered(null);
     setError(null);
-    validateFile(f);
+    prefilterFile(f);
   };
 
   const handleDrag = (e) => {
@@ -570,24 +723,52 @@ export default function App() {
     setError(null); setResults(null); setSummary(null); setWarnings([]);
     setLoading(true);
 
-    const fd = new FormData();
-    fd.append("file", file);
-    fd.append("drug", drug);
-    if (patientId.trim()) fd.append("patient_id", patientId.trim());
-
+    let chunked = false;
     try {
-      const res  = await fetch(`${API}/api/analyze`, { method:"POST", body:fd });
-      const data = await res.json();
-      if (!res.ok) { setError(data.error || `Server error (${res.status})`); return; }
+      // Upload the pre-filtered file when there is one. A stored patient
+      // profile (patient ID given) keeps every pharmacogene so later
+      // queries for other drugs still see them; otherwise narrow it to
+      // the selected drugs' genes.
+      let upload = file;
+      if (prefiltered) {
+        upload = prefiltered.blob;
+        if (!patientId.trim()) {
+          const drugs = drug.split(",").map(d=>d.trim().toUpperCase()).filter(Boolean);
+          const genes = [...new Set(drugs.flatMap(d => drugInfo.drug_genes[d] || []))];
+          upload = (await runPrefilter(upload, genes, drugInfo.gene_filter)).blob;
+        }
+        upload = new File([upload], file.name, { type:"text/plain" });
+      }
+
+      let data;
+      if (upload.size > CHUNKED_UPLOAD_THRESHOLD) {
+        chunked = true;
+        setUploadPct(0);
+        data = await chunkedAnalyze(upload, file, drug, patientId.trim(),
+          (done, total) => setUploadPct(Math.round(done / total * 100)));
+      } else {
+        const fd = new FormData();
+        fd.append("file", upload);
+        fd.append("drug", drug);
+        if (patientId.trim()) fd.append("patient_id", patientId.trim());
+
+        const res = await fetch(`${API}/api/analyze`, { method:"POST", body:fd });
+        data = await res.json();
+        if (!res.ok) { setError(data.error || `Server error (${res.status})`); return; }
+      }
 
       // Backend always returns { results, summary, interaction_warnings }
       setResults(data.results || [data]);
       setSummary(data.summary || null);
       setWarnings(data.interaction_warnings || []);
-    } catch {
-      setError("Unable to reach the backend. Is Flask running on port 5000?");
+    } catch (e) {
+      const interrupted = !e.status || e.status >= 500 || e.status === 429;
+      if (chunked && interrupted) setError(`Upload interrupted (${e.message}) — press Analyse again to resume.`);
+      else if (e instanceof UploadError) setError(e.message);
+      else setError("Unable to reach the backend. Is Flask running on port 5000?");
     } finally {
       setLoading(false);
+      setUploadPct(null);
     }
   };
 
@@ -690,14 +871,14 @@ export default function App() {
             <span style={{ fontSize:"26px", display:"block", marginBottom:"6px" }}>{vcfIcon}</span>
             <span style={{ fontSize:"13px", fontWeight:file?600:400, color:vcfStatus==="ok"?"#10b981":vcfStatus==="error"?"#ef4444":textMuted }}>
               {file
-                ? vcfStatus==="checking" ? `Validating ${file.name}…`
-                  : vcfStatus==="ok"   ? `✓ ${file.name}`
+                ? vcfStatus==="checking" ? `Validating ${file.name}…${scanned ? ` ${Math.round(scanned/file.size*100)}%` : ""}`
+                  : vcfStatus==="ok"   ? `✓ ${file.name}${prefiltered ? ` · ${formatBytes(prefiltered.stats.bytes_in)} → ${formatBytes(prefiltered.stats.bytes_out)}` : ""}`
                   : vcfStatus==="error"? `✕ ${file.name} — invalid VCF`
                   : file.name
                 : "Drag & drop .vcf file here, or click to browse"}
             </span>
             {file && (
-              <button onClick={e=>{e.preventDefault();setFile(null);setVcfStatus(null);}} style={{ display:"block", margin:"6px auto 0", fontSize:"11px", color:textMuted, background:"none", border:"none", cursor:"pointer", textDecoration:"underline" }}>
+              <button onClick={e=>{e.preventDefault();pickRef.current++;setFile(null);setPrefiltered(null);setVcfStatus(null);}} style={{ display:"block", margin:"6px auto 0", fontSize:"11px", color:textMuted, background:"none", border:"none", cursor:"pointer", textDecoration:"underline" }}>
                 Remove
               </button>
             )}
@@ -750,7 +931,7 @@ export default function App() {
             transition:"all 0.3s", display:"flex", alignItems:"center", justifyContent:"center", gap:"10px",
           }}>
             {loading && <span style={{ width:"16px", height:"16px", borderRadius:"50%", border:"2.5px solid #ffffff50", borderTopColor:"#fff", display:"inline-block", animation:"spin 0.8s linear infinite" }}/>}
-            {loading ? "Analysing…" : "Analyse →"}
+            {loading ? (uploadPct !== null && uploadPct < 100 ? `Uploading… ${uploadPct}%` : "Analysing…") : "Analyse →"}
           </button>
 
           {/* Loading skeletons */}
@@ -0,0 +1,129 @@
+/* ─────────────────────────────────────────────
+   VCF PRE-FILTER WORKER
+   Streams a VCF (File / Blob) with .stream(), keeps the header plus the
+   records that belong to the requested genes, and runs the same hard
+   checks as the backend validator (vcf_parser.validate_vcf_content).
+
+   A record belongs to a gene when its INFO mentions the gene (GENE=,
+   ANN=, CSQ=), its ID is one of the gene's defining rsIDs, or its
+   CHROM/POS is a defining position or falls inside the gene window —
+   the gene data comes from /api/drugs ("gene_filter").
+
+   in:  { id, source, genes:[...], geneFilter:{gene:{windows,rsids,positions}} }
+   out: { id, type:"progress", bytesRead, total }
+        { id, type:"done", blob, errors, warnings, stats }
+        { id, type:"error", message }
+───────────────────────────────────────────── */
+
+const PROGRESS_EVERY  = 4 * 1024 * 1024;
+const GVCF_MARKERS    = ["##GVCFBlock", "##ALT=<ID=NON_REF", "##ALT=<ID=*,"];
+const REF_BLOCK_ALTS  = ["\t<NON_REF>\t", "\t<*>\t"];
+
+const normaliseChrom = (c) => (c.slice(0, 3).toLowerCase() === "chr" ? c.slice(3) : c).toUpperCase();
+
+const hasAnnotation = (info) => {
+  const upper = info.toUpperCase();
+  return (upper.includes("GENE=") && upper.includes("STAR=")) || info.includes("ANN=") || info.includes("CSQ=");
+};
+
+function compile(genes, geneFilter) {
+  const windows = {}, rsids = new Set(), positions = new Set();
+  for (const gene of genes) {
+    const spec = geneFilter[gene];
+    if (!spec) continue;
+    for (const [chrom, start, end] of spec.windows) (windows[chrom] ||= []).push([start, end]);
+    spec.rsids.forEach(r => rsids.add(r));
+    spec.positions.forEach(p => positions.add(p));
+  }
+  const inWindow = (chrom, pos) => (windows[chrom] || []).some(([s, e]) => pos >= s && pos <= e);
+  return { names: genes.map(g => g.toUpperCase()), rsids, positions, inWindow };
+}
+
+async function prefilter({ source, genes, geneFilter }, onProgress) {
+  const wanted = compile(genes, geneFilter);
+  const known  = compile(Object.keys(geneFilter), geneFilter);
+
+  const out      = [];
+  const errors   = [];
+  const warnings = [];
+  const stats    = { bytes_in:0, bytes_out:0, data_lines:0, kept_lines:0, parseable_variants:0, reference_blocks:0 };
+  let hasFormatHeader = false;
+  let gvcf = false;
+
+  const keep = (line) => out.push(line, "\n");
+
+  const handleLine = (line) => {
+    if (line.endsWith("\r")) line = line.slice(0, -1);
+    if (line.startsWith("#")) {
+      if (line.startsWith("##fileformat=VCF")) hasFormatHeader = true;
+      else if (GVCF_MARKERS.some(m => line.startsWith(m))) gvcf = true;
+      keep(line);
+      return;
+    }
+    if (!line.trim()) return;
+    stats.data_lines++;
+    if (gvcf && REF_BLOCK_ALTS.some(a => line.includes(a))) { stats.reference_blocks++; return; }
+
+    const cols = line.split("\t", 8);
+    if (cols.length < 8) return;
+    const chrom = normaliseChrom(cols[0]);
+    const pos   = parseInt(cols[1], 10);
+    const rsid  = cols[2].toLowerCase();
+    const info  = cols[7];
+    const key   = `${chrom}:${pos}`;
+
+    if (hasAnnotation(info) || known.rsids.has(rsid) || known.positions.has(key)) stats.parseable_variants++;
+
+    const infoUpper = info.toUpperCase();
+    if (
+      wanted.names.some(g => infoUpper.includes(g)) ||
+      wanted.rsids.has(rsid) || wanted.positions.has(key) || wanted.inWindow(chrom, pos)
+    ) {
+      keep(line);
+      stats.kept_lines++;
+    }
+  };
+
+  const reader  = source.stream().getReader();
+  const decoder = new TextDecoder();
+  let rest = "", nextProgress = PROGRESS_EVERY;
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    stats.bytes_in += value.byteLength;
+    const lines = (rest + decoder.decode(value, { stream:true })).split("\n");
+    rest = lines.pop();
+    lines.forEach(handleLine);
+    if (stats.bytes_in >= nextProgress) {
+      onProgress(stats.bytes_in, source.size);
+      nextProgress += PROGRESS_EVERY;
+    }
+  }
+  rest += decoder.decode();
+  if (rest) handleLine(rest);
+
+  if (!hasFormatHeader) warnings.push("Missing ##fileformat=VCFv4.x header.");
+  if (stats.data_lines === 0) {
+    errors.push("No data lines found. File appears empty or header-only.");
+  } else if (stats.parseable_variants === 0) {
+    errors.push(
+      "No parseable pharmacogenomic variants found. " +
+      "INFO fields must contain GENE=/STAR=, ANN=, or CSQ= annotations, " +
+      "or records must match a known pharmacogene defining variant."
+    );
+  }
+  const blob = new Blob(out, { type:"text/plain" });
+  stats.bytes_out = blob.size;
+  return { blob, errors, warnings, stats };
+}
+
+self.onmessage = async ({ data }) => {
+  const { id } = data;
+  try {
+    const result = await prefilter(data, (bytesRead, total) =>
+      self.postMessage({ id, type:"progress", bytesRead, total }));
+    self.postMessage({ id, type:"done", ...result });
+  } catch (e) {
+    self.postMessage({ id, type:"error", message: e?.message || String(e) });
+  }
+};